@@ -0,0 +1,207 @@
+#! /bin/python
+"""
+Measures the overhead of executing functions via pynisher. Each measurement is written as a single JSON line, either to
+stdout or to the file given via --output, to allow tracking regressions across releases.
+
+Usage: python benchmarks/pynisher_overhead.py --output results.jsonl
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, List, TextIO
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from dswizard import pynisher  # noqa: E402
+
+BENCHMARKS = ['payload', 'startup', 'concurrency', 'limits']
+
+
+def noop():
+    return None
+
+
+def consume(X):
+    return X.nbytes
+
+
+def produce(n_bytes):
+    return np.ones(n_bytes, dtype=np.uint8)
+
+
+def workload(n_iterations):
+    # deterministic mix of interpreter and BLAS work
+    A = np.random.RandomState(0).rand(200, 200)
+    total = 0
+    for i in range(n_iterations):
+        total += float((A @ A).sum()) + sum(range(1000))
+    return total
+
+
+def measure(func: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {
+        'n': repeat,
+        'mean_in_s': statistics.mean(times),
+        'median_in_s': statistics.median(times),
+        'min_in_s': min(times),
+        'max_in_s': max(times),
+        'stdev_in_s': statistics.stdev(times) if repeat > 1 else 0.
+    }
+
+
+def call(wrapper, *args):
+    wrapper(*args)
+    if wrapper.exit_status != 0:
+        raise RuntimeError(f'Benchmark call failed with {wrapper.exit_status}: {wrapper.result}')
+
+
+def benchmark_payload(args) -> List[Dict]:
+    """Latency depending on the size of arguments and return values"""
+    results = []
+    for size in args.sizes:
+        X = np.ones(size, dtype=np.uint8)
+        for share_args in (False, True):
+            wrapper = pynisher.enforce_limits(wall_time_in_s=args.timeout, share_args=share_args)(consume)
+            results.append(dict(measure(lambda: call(wrapper, X), args.repeat), direction='argument',
+                                payload_in_b=size, share_args=share_args))
+
+        wrapper = pynisher.enforce_limits(wall_time_in_s=args.timeout)(produce)
+        results.append(dict(measure(lambda: call(wrapper, size), args.repeat), direction='result',
+                            payload_in_b=size, share_args=False))
+    return results
+
+
+def benchmark_startup(args) -> List[Dict]:
+    """Latency of an empty function call per start method"""
+    results = []
+    for start_method in multiprocessing.get_all_start_methods():
+        wrapper = pynisher.enforce_limits(wall_time_in_s=args.timeout, start_method=start_method)(noop)
+        # the first call includes starting the fork server
+        call(wrapper)
+        results.append(dict(measure(lambda: call(wrapper), args.repeat), start_method=start_method))
+
+    with pynisher.WorkerPool(n_workers=1) as pool:
+        wrapper = pynisher.enforce_limits(wall_time_in_s=args.timeout, pool=pool)(noop)
+        results.append(dict(measure(lambda: call(wrapper), args.repeat), start_method='pool'))
+
+    wrapper = pynisher.enforce_limits()(noop)
+    results.append(dict(measure(lambda: call(wrapper), args.repeat), start_method='unlimited'))
+    return results
+
+
+def benchmark_concurrency(args) -> List[Dict]:
+    """Throughput of concurrent function calls"""
+    results = []
+    for n_concurrent in range(1, args.max_concurrency + 1):
+        n_calls = args.repeat * n_concurrent
+
+        def run():
+            wrapper = pynisher.enforce_limits(wall_time_in_s=args.timeout)(workload)
+            call(wrapper, args.iterations)
+
+        def run_all():
+            with ThreadPoolExecutor(n_concurrent) as executor:
+                for future in [executor.submit(run) for _ in range(n_calls)]:
+                    future.result()
+
+        res = measure(run_all, 1)
+        results.append(dict(res, concurrency=n_concurrent, calls=n_calls,
+                            throughput_per_s=n_calls / res['mean_in_s']))
+    return results
+
+
+def benchmark_limits(args) -> List[Dict]:
+    """Overhead of enforcing the different limits on a fixed workload"""
+    mem_in_mb = 4096
+    configurations = {
+        'none': None,
+        'wall_time': dict(wall_time_in_s=args.timeout),
+        'cpu_time': dict(cpu_time_in_s=int(args.timeout)),
+        'memory_rlimit': dict(mem_in_mb=mem_in_mb),
+        'memory_rss': dict(mem_in_mb=mem_in_mb, mem_mode='rss'),
+        'memory_pss': dict(mem_in_mb=mem_in_mb, mem_mode='pss'),
+        'all': dict(wall_time_in_s=args.timeout, cpu_time_in_s=int(args.timeout), mem_in_mb=mem_in_mb,
+                    mem_mode='rss')
+    }
+
+    results = []
+    baseline = None
+    for name, limits in configurations.items():
+        if limits is None:
+            res = measure(lambda: workload(args.iterations), args.repeat)
+            baseline = res['median_in_s']
+        else:
+            wrapper = pynisher.enforce_limits(**limits)(workload)
+            res = measure(lambda: call(wrapper, args.iterations), args.repeat)
+        results.append(dict(res, limits=name, overhead_in_s=res['median_in_s'] - baseline))
+    return results
+
+
+def environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'available_cores': len(os.sched_getaffinity(0)),
+        'timestamp': time.time()
+    }
+
+
+def write(fh: TextIO, benchmark: str, env: Dict[str, Any], result: Dict[str, Any]):
+    fh.write(json.dumps(dict(result, benchmark=benchmark, **env)) + '\n')
+    fh.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measures the overhead of pynisher')
+    parser.add_argument('--benchmarks', nargs='+', choices=BENCHMARKS, default=BENCHMARKS)
+    parser.add_argument('--repeat', type=int, default=10, help='number of repetitions per measurement')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[0, 1024, 1024 ** 2, 16 * 1024 ** 2, 128 * 1024 ** 2],
+                        help='payload sizes in bytes')
+    parser.add_argument('--max-concurrency', type=int, default=len(os.sched_getaffinity(0)),
+                        help='maximum number of concurrent calls')
+    parser.add_argument('--iterations', type=int, default=50, help='size of the workload')
+    parser.add_argument('--timeout', type=float, default=600, help='wall-clock time limit of each call')
+    parser.add_argument('--output', type=str, default=None, help='JSONL file the results are appended to')
+    args = parser.parse_args()
+
+    functions = {
+        'payload': benchmark_payload,
+        'startup': benchmark_startup,
+        'concurrency': benchmark_concurrency,
+        'limits': benchmark_limits
+    }
+
+    env = environment()
+    fh = open(args.output, 'a') if args.output is not None else sys.stdout
+    try:
+        for benchmark in args.benchmarks:
+            for result in functions[benchmark](args):
+                write(fh, benchmark, env, result)
+    finally:
+        if fh is not sys.stdout:
+            fh.close()
+
+
+if __name__ == '__main__':
+    main()
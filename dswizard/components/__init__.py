@@ -1,3 +1,10 @@
-import dswizard.components.classification
-import dswizard.components.data_preprocessing
-import dswizard.components.feature_preprocessing
+import importlib
+
+# component packages are imported on first access to keep importing dswizard.components cheap
+_PACKAGES = ('classification', 'data_preprocessing', 'feature_preprocessing')
+
+
+def __getattr__(name: str):
+    if name in _PACKAGES:
+        return importlib.import_module(f'{__name__}.{name}')
+    raise AttributeError(f'module {__name__} has no attribute {name}')
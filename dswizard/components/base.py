@@ -4,7 +4,7 @@ import pkgutil
 import sys
 from abc import ABC
 from collections import OrderedDict
-from typing import Type, Dict, Optional, List
+from typing import Type, Dict, Optional, List, Union
 
 import numpy as np
 import pandas as pd
@@ -12,6 +12,7 @@ from ConfigSpace import ConfigurationSpace
 from sklearn.base import BaseEstimator, ClassifierMixin
 from sklearn.utils import check_random_state, check_array
 
+from dswizard.components.registry import LazyComponent, resolve_components
 from dswizard.components.util import HANDLES_NOMINAL, HANDLES_NUMERIC, HANDLES_MISSING
 
 
@@ -314,6 +315,10 @@ class ComponentChoice(EstimatorComponent):
     def get_components(self) -> Dict[str, Type[EstimatorComponent]]:
         raise NotImplementedError()
 
+    def _get_lazy_components(self) -> Dict[str, Union[Type[EstimatorComponent], LazyComponent]]:
+        # like get_components but components listed in a manifest are only imported once they are used
+        return self.get_components()
+
     def get_available_components(self, mf: Dict[str, float] = None,
                                  include: List = None,
                                  exclude: List = None) -> Dict[str, Type[EstimatorComponent]]:
@@ -321,7 +326,7 @@ class ComponentChoice(EstimatorComponent):
             raise ValueError(
                 "The argument include and exclude cannot be used together.")
 
-        available_comp = self.get_components()
+        available_comp = self._get_lazy_components()
 
         if include is not None:
             for incl in include:
@@ -354,7 +359,8 @@ class ComponentChoice(EstimatorComponent):
 
             components_dict[name] = entry
 
-        return components_dict
+        # components are only filtered based on the manifest, only the remaining components are imported
+        return resolve_components(components_dict)
 
     def set_hyperparameters(self, configuration: dict, init_params=None) -> 'ComponentChoice':
         new_params = {}
@@ -375,7 +381,7 @@ class ComponentChoice(EstimatorComponent):
         new_params['random_state'] = self.random_state
 
         self.new_params = new_params
-        self.estimator = self.get_components()[choice]().set_hyperparameters(new_params)
+        self.estimator = self._get_lazy_components()[choice]().set_hyperparameters(new_params)
 
         return self
 
@@ -1,4 +1,4 @@
-from typing import Dict, Type
+from typing import Dict, Type, Union
 
 __author__ = 'feurerm'
 
@@ -8,16 +8,19 @@ from collections import OrderedDict
 from ConfigSpace.configuration_space import ConfigurationSpace
 from ConfigSpace.hyperparameters import CategoricalHyperparameter
 
-from dswizard.components.base import PredictionAlgorithm, find_components, ComponentChoice, PredictionMixin, \
-    EstimatorComponent
+from dswizard.components.base import PredictionAlgorithm, ComponentChoice, PredictionMixin, EstimatorComponent
+from dswizard.components.registry import load_components, resolve_components, LazyComponent
 
 classifier_directory = os.path.split(__file__)[0]
-_classifiers = find_components(__package__, classifier_directory, PredictionAlgorithm)
+_classifiers = load_components(__package__, classifier_directory, PredictionAlgorithm)
 
 
 class ClassifierChoice(ComponentChoice, PredictionMixin):
 
     def get_components(self) -> Dict[str, Type[EstimatorComponent]]:
+        return resolve_components(_classifiers)
+
+    def _get_lazy_components(self) -> Dict[str, Union[Type[EstimatorComponent], LazyComponent]]:
         components = OrderedDict()
         components.update(_classifiers)
         return components
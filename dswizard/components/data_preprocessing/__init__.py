@@ -1,14 +1,15 @@
 import os
 from collections import OrderedDict
-from typing import Dict, Type
+from typing import Dict, Type, Union
 
 from ConfigSpace.configuration_space import ConfigurationSpace
 from ConfigSpace.hyperparameters import CategoricalHyperparameter
 
-from dswizard.components.base import PreprocessingAlgorithm, find_components, ComponentChoice, EstimatorComponent
+from dswizard.components.base import PreprocessingAlgorithm, ComponentChoice, EstimatorComponent
+from dswizard.components.registry import load_components, resolve_components, LazyComponent
 
 preprocessor_directory = os.path.split(__file__)[0]
-_preprocessors = find_components(__package__,
+_preprocessors = load_components(__package__,
                                  preprocessor_directory,
                                  PreprocessingAlgorithm)
 
@@ -16,6 +17,9 @@ _preprocessors = find_components(__package__,
 class DataPreprocessorChoice(ComponentChoice):
 
     def get_components(self) -> Dict[str, Type[EstimatorComponent]]:
+        return resolve_components(_preprocessors)
+
+    def _get_lazy_components(self) -> Dict[str, Union[Type[EstimatorComponent], LazyComponent]]:
         components = OrderedDict()
         components.update(_preprocessors)
         return components
@@ -5,6 +5,7 @@ from ConfigSpace.hyperparameters import CategoricalHyperparameter
 from sklearn.impute import MissingIndicator
 
 from dswizard.components.base import PreprocessingAlgorithm, NoopComponent
+from dswizard.components.schema import infer_schema
 from dswizard.components.util import HANDLES_MULTICLASS, HANDLES_NUMERIC, HANDLES_NOMINAL, HANDLES_MISSING, \
     HANDLES_NOMINAL_CLASS
 
@@ -47,15 +48,15 @@ class ImputationComponent(PreprocessingAlgorithm):
         from sklearn.impute import SimpleImputer
         from sklearn.compose import ColumnTransformer
 
-        if isinstance(X, np.ndarray):
-            X = pd.DataFrame(data=X, index=range(X.shape[0]), columns=range(X.shape[1]))
-
         if not np.any(pd.isna(X)):
             self.preprocessor = NoopComponent()
+            self.schema_ = None
             return self
-        else:
-            numeric = X.select_dtypes(include=['number']).columns
-            categorical = X.select_dtypes(include=['category', 'object']).columns
+
+        self.schema_ = infer_schema(X, cache=False)
+        X = self.schema_.apply(X)
+        numeric = np.flatnonzero(self.schema_.numeric | self.schema_.missing)
+        categorical = np.flatnonzero(~(self.schema_.numeric | self.schema_.missing))
 
         self.preprocessor = ColumnTransformer(
             transformers=[
@@ -84,6 +85,8 @@ class ImputationComponent(PreprocessingAlgorithm):
 
         if self.preprocessor is None:
             raise NotImplementedError()
+        if self.schema_ is not None:
+            X = self.schema_.apply(X)
         X_new = self.preprocessor.transform(X)
 
         if self.add_indicator:
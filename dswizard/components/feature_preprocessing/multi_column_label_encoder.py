@@ -2,6 +2,7 @@ import numpy as np
 import pandas as pd
 
 from dswizard.components.base import PreprocessingAlgorithm
+from dswizard.components.schema import infer_schema
 from dswizard.components.util import HANDLES_NOMINAL_CLASS, HANDLES_MISSING, HANDLES_NOMINAL, HANDLES_NUMERIC, \
     HANDLES_MULTICLASS
 
@@ -47,17 +48,17 @@ class MultiColumnLabelEncoderComponent(PreprocessingAlgorithm):
         columns in X.
         """
 
-        if isinstance(X, np.ndarray):
-            X = pd.DataFrame(data=X, index=range(X.shape[0]), columns=range(X.shape[1]))
+        schema = infer_schema(X, cache=False)
+        # nominal columns are encoded in-place
+        X = schema.apply(X, copy=schema.nominal.any())
 
-        categorical = X.select_dtypes(include=['category', 'object']).columns
+        categorical = X.columns[schema.nominal]
         if len(categorical) == 0:
             return X.to_numpy()
         else:
             for colname in categorical:
                 missing_vec = pd.isna(X[colname])
-                X[colname] = X[colname].astype('category')
-                X[colname].cat.add_categories(['<MISSING>'], inplace=True)
+                X[colname] = X[colname].astype('category').cat.add_categories(['<MISSING>'])
                 X.loc[missing_vec, colname] = '<MISSING>'
 
                 X[colname] = self.preprocessor.fit_transform(X[colname].astype(str))
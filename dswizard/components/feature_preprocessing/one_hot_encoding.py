@@ -6,6 +6,7 @@ from sklearn.compose import ColumnTransformer
 
 from dswizard.components.base import NoopComponent
 from dswizard.components.base import PreprocessingAlgorithm
+from dswizard.components.schema import infer_schema
 from dswizard.components.util import HANDLES_NOMINAL_CLASS, HANDLES_MISSING, HANDLES_NOMINAL, HANDLES_NUMERIC, \
     HANDLES_MULTICLASS
 
@@ -34,17 +35,14 @@ class OneHotEncoderComponent(PreprocessingAlgorithm):
         super().__init__()
 
     def fit(self, X, y=None):
-        if isinstance(X, np.ndarray):
-            df = pd.DataFrame(data=X, index=range(X.shape[0]), columns=range(X.shape[1])).infer_objects()
-        else:
-            df = X
+        self.schema_ = infer_schema(X, cache=False)
 
-        categorical = (df.dtypes == object).to_numpy()
+        categorical = self.schema_.categorical
         if not categorical.any():
             self.preprocessor = NoopComponent()
         else:
             self.preprocessor = self.to_sklearn(X.shape[0], X.shape[1], categorical=categorical)
-            self.preprocessor.fit(X, y)
+            self.preprocessor.fit(self.schema_.apply(X), y)
         return self
 
     def to_sklearn(self, n_samples: int = 0, n_features: int = 0, categorical: List[bool] = 'auto', **kwargs):
@@ -61,7 +59,9 @@ class OneHotEncoderComponent(PreprocessingAlgorithm):
         # X = pd.get_dummies(X, sparse=False, dummy_na=dummy_na)
         # return X.to_numpy()
 
-        return self.preprocessor.transform(X)
+        if isinstance(self.preprocessor, NoopComponent):
+            return self.preprocessor.transform(X)
+        return self.preprocessor.transform(self.schema_.apply(X))
 
     @staticmethod
     def get_properties():
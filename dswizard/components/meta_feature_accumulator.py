@@ -0,0 +1,432 @@
+import collections
+import os
+import pickle
+import tempfile
+from typing import Optional, Dict, Tuple, Union, List, Iterable, Iterator, Any
+
+import numpy as np
+import pandas as pd
+
+from dswizard.components.meta_features import MetaFeatureFactory
+from dswizard.components.schema import infer_schema
+
+Chunk = Tuple[Union[np.ndarray, pd.DataFrame], np.ndarray]
+
+
+class MetaFeatureAccumulator(object):
+    """
+    Calculates meta-features in a single pass over row chunks of a data set. Only the current chunk and a fixed-size
+    state have to fit into memory:
+
+    - general meta-features from exact counts,
+    - skewness, kurtosis and variance from merged central moments of the observed values of each numeric attribute,
+    - correlation and covariance from a merged co-moment matrix of at most max_cov_attr numeric attributes,
+    - entropy based meta-features from exact value counts of categorical attributes and fine-grained histograms of
+      numeric attributes. Bin edges are determined by the first chunk and merged into equal-frequency bins at the end,
+    - all remaining meta-features from a reservoir sample with sample_size rows.
+
+    The types of all attributes are inferred from the first chunk. Missing values are ignored instead of being filled and
+    categorical attributes are not one-hot encoded for the statistical meta-features.
+
+    The state can be stored via save and restored via load to add new rows later on, e.g. for data sets that grow over
+    time. Updating a restored accumulator only requires processing the new rows. Counts, histograms and the reservoir
+    sample are identical to processing all rows in a single pass, moments agree up to rounding errors.
+    """
+
+    # meta-features that are calculated on the reservoir sample instead of the complete data
+    SAMPLE_FEATURES = ('nr_outliers', 'sparsity_mean', 'sparsity_sd') + MetaFeatureFactory.GROUPS['model_based'] + \
+        MetaFeatureFactory.GROUPS['landmarking']
+
+    # has to be increased whenever the stored state changes to reject incompatible states
+    STATE_VERSION = 1
+
+    def __init__(self, sample_size: int = 10000, fine_bins: int = 256, max_cov_attr: int = 1000,
+                 random_state: int = 42):
+        self.sample_size = sample_size
+        self.fine_bins = fine_bins
+        self.max_cov_attr = max_cov_attr
+        self.random_state = random_state
+        self._rs = np.random.RandomState(random_state)
+
+        self.n = 0
+        self.shape: Optional[Tuple[int, int]] = None
+        self.is_numeric: Optional[np.ndarray] = None
+        self.classes: List[Any] = []
+        self.class_counts = np.zeros(0, dtype=np.int64)
+        self.missing = None
+        self.nr_inst_mv = 0
+
+        # numeric attributes
+        self.count = None
+        self.mean = None
+        self.moments = None
+        self.v_min = None
+        self.v_max = None
+        self.edges = None
+        self.histogram = None
+        self.cov_attr = None
+        self.cov_n = 0
+        self.cov_mean = None
+        self.comoment = None
+
+        # categorical attributes
+        self.value_counts: List[collections.Counter] = []
+
+        self.sample_X: Optional[np.ndarray] = None
+        self.sample_y: Optional[np.ndarray] = None
+
+    def update(self, X: Union[np.ndarray, pd.DataFrame], y: np.ndarray) -> 'MetaFeatureAccumulator':
+        """
+        Adds a chunk of rows to the accumulated statistics.
+        """
+        X = X.to_numpy() if isinstance(X, pd.DataFrame) else np.asarray(X)
+        y = np.asarray(y).ravel()
+        if X.shape[0] == 0:
+            return self
+        if self.is_numeric is None:
+            self._initialize(X)
+        elif X.shape[1] != self.shape[1]:
+            raise ValueError(f'Expected {self.shape[1]} attributes but chunk contains {X.shape[1]}')
+
+        y_idx = self._class_indices(y)
+        missing = pd.isna(X)
+        self.missing += missing.sum(axis=0)
+        self.nr_inst_mv += int(missing.any(axis=1).sum())
+
+        N = self._numeric(X)
+        self._update_moments(N)
+        self._update_histogram(N, y_idx)
+        self._update_comoment(N)
+        for j, column in enumerate(np.flatnonzero(~self.is_numeric)):
+            values = pd.DataFrame({'value': X[:, column], 'class': y_idx}).dropna().value_counts()
+            self.value_counts[j].update(dict(values.items()))
+
+        self._update_sample(X, y)
+        self.n += X.shape[0]
+        self.shape = (self.n, self.shape[1])
+        return self
+
+    def save(self, path: str):
+        """
+        Stores the complete state, including the reservoir sample and the random state, in path. The file is replaced
+        atomically, so readers never observe a partially written state.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                pickle.dump({'version': self.STATE_VERSION, 'state': self.__dict__}, fh,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    @classmethod
+    def load(cls, path: str) -> 'MetaFeatureAccumulator':
+        """
+        Restores an accumulator stored via save. Only load states from trusted sources as they are unpickled.
+        """
+        with open(path, 'rb') as fh:
+            content = pickle.load(fh)
+        if not isinstance(content, dict) or content.get('version') != cls.STATE_VERSION:
+            raise ValueError(f'Incompatible accumulator state in {path}')
+        accumulator = cls.__new__(cls)
+        accumulator.__dict__.update(content['state'])
+        return accumulator
+
+    def result(self, max_nan_percentage: float = 0.9, timeout: float = 30,
+               details: Dict = None) -> Optional[Dict[str, float]]:
+        """
+        Calculates the meta-features of all rows added so far.
+        :param details: optional dictionary that is filled with the names of all meta-features calculated on the
+        reservoir sample in estimated
+        :return: meta-features in the same format as MetaFeatureFactory.calculate or None if the calculation failed
+        """
+        details = {} if details is None else details
+        details['estimated'] = []
+        if self.n == 0:
+            MetaFeatureFactory.logger.warning('Failed to extract MF as no samples were provided')
+            return None
+
+        valid = self.missing / self.n <= max_nan_percentage
+        with np.errstate(invalid='ignore'):
+            numeric = valid[self.is_numeric] & (self.v_max - self.v_min > 1e-7)
+        categorical = valid[~self.is_numeric] & np.array([len({v for v, _ in c}) > 1 for c in self.value_counts],
+                                                         dtype=bool)
+        if numeric.sum() + categorical.sum() == 0:
+            MetaFeatureFactory.logger.warning('Failed to extract MF due to X has no features or only constant values.')
+            return None
+
+        features = self.SAMPLE_FEATURES
+        if not numeric.any():
+            # statistical meta-features are calculated on one-hot encoded categorical attributes
+            features = features + MetaFeatureFactory.GROUPS['statistical']
+        sample = MetaFeatureFactory.calculate_selected(self.sample_X, self.sample_y, features,
+                                                       max_nan_percentage=max_nan_percentage,
+                                                       random_state=self.random_state, timeout=timeout)
+        if sample is None:
+            return None
+
+        nr_attr = int(numeric.sum() + categorical.sum())
+        general = MetaFeatureFactory._general_from_counts(
+            self.shape, int(self.missing.sum()), self.nr_inst_mv, int((self.missing > 0).sum()),
+            self.class_counts[self.class_counts > 0], self.n, int(numeric.sum()), int(categorical.sum()))
+        res = MetaFeatureFactory._merge(general, sample, self._statistical(numeric, nr_attr),
+                                        self._info_theory(numeric, categorical, general['class_ent'], nr_attr))
+
+        if MetaFeatureFactory._check_result(res, 0) is None:
+            return None
+        if self.n > self.sample_X.shape[0]:
+            details['estimated'] = list(features)
+        return res
+
+    def _initialize(self, X: np.ndarray):
+        self.shape = (0, X.shape[1])
+        schema = infer_schema(X)
+        self.is_numeric = schema.numeric | schema.missing
+        self.missing = np.zeros(X.shape[1], dtype=np.int64)
+
+        N = self._numeric(X)
+        d = N.shape[1]
+        self.count = np.zeros(d, dtype=np.int64)
+        self.mean = np.zeros(d)
+        self.moments = np.zeros((3, d))
+        self.v_min = np.full(d, np.nan)
+        self.v_max = np.full(d, np.nan)
+
+        with np.errstate(invalid='ignore'):
+            edges = np.nanquantile(N, np.linspace(0, 1, self.fine_bins + 1)[1:-1], axis=0).T if N.shape[0] > 0 \
+                else np.zeros((d, self.fine_bins - 1))
+        self.edges = np.nan_to_num(edges)
+        self.histogram = np.zeros((d, self.fine_bins, 0), dtype=np.int64)
+
+        self.cov_attr = np.arange(d)
+        if d > self.max_cov_attr:
+            self.cov_attr = np.sort(self._rs.choice(d, self.max_cov_attr, replace=False))
+        self.cov_mean = np.zeros(self.cov_attr.size)
+        self.comoment = np.zeros((self.cov_attr.size, self.cov_attr.size))
+
+        self.value_counts = [collections.Counter() for _ in range(int((~self.is_numeric).sum()))]
+
+    def _numeric(self, X: np.ndarray) -> np.ndarray:
+        N = X[:, self.is_numeric]
+        if N.dtype.kind in 'biuf':
+            return N.astype(float)
+        return pd.DataFrame(N).apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+
+    def _class_indices(self, y: np.ndarray) -> np.ndarray:
+        labels, inverse = np.unique(y, return_inverse=True)
+        index = {c: i for i, c in enumerate(self.classes)}
+        for label in labels:
+            if label not in index:
+                index[label] = len(self.classes)
+                self.classes.append(label)
+        mapping = np.array([index[label] for label in labels], dtype=np.int64)
+
+        k = len(self.classes)
+        self.class_counts = np.pad(self.class_counts, (0, k - self.class_counts.size))
+        self.histogram = np.pad(self.histogram, ((0, 0), (0, 0), (0, k - self.histogram.shape[2])))
+        y_idx = mapping[inverse.ravel()]
+        self.class_counts += np.bincount(y_idx, minlength=k)
+        return y_idx
+
+    def _update_moments(self, N: np.ndarray):
+        """
+        Merges the central moments of the chunk into the accumulated moments, see Pébay: Formulas for Robust, One-Pass
+        Parallel Computation of Covariances and Arbitrary-Order Statistical Moments, 2008
+        """
+        observed = ~np.isnan(N)
+        n_b = observed.sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_b = np.where(n_b > 0, np.nansum(N, axis=0) / n_b, 0)
+        dev = np.where(observed, N - mean_b, 0)
+        m2_b, m3_b, m4_b = (dev ** 2).sum(axis=0), (dev ** 3).sum(axis=0), (dev ** 4).sum(axis=0)
+
+        n_a = self.count
+        m2_a, m3_a, m4_a = self.moments
+        n = n_a + n_b
+        n_safe = np.maximum(n, 1)
+        delta = mean_b - self.mean
+
+        self.mean = self.mean + delta * n_b / n_safe
+        self.moments = np.array([
+            m2_a + m2_b + delta ** 2 * n_a * n_b / n_safe,
+            m3_a + m3_b + delta ** 3 * n_a * n_b * (n_a - n_b) / n_safe ** 2 +
+            3 * delta * (n_a * m2_b - n_b * m2_a) / n_safe,
+            m4_a + m4_b + delta ** 4 * n_a * n_b * (n_a ** 2 - n_a * n_b + n_b ** 2) / n_safe ** 3 +
+            6 * delta ** 2 * (n_a ** 2 * m2_b + n_b ** 2 * m2_a) / n_safe ** 2 +
+            4 * delta * (n_a * m3_b - n_b * m3_a) / n_safe
+        ])
+        self.count = n
+
+        with np.errstate(invalid='ignore'):
+            if N.shape[0] > 0:
+                self.v_min = np.fmin(self.v_min, np.nanmin(np.where(observed, N, np.inf), axis=0))
+                self.v_max = np.fmax(self.v_max, np.nanmax(np.where(observed, N, -np.inf), axis=0))
+        self.v_min[self.count == 0] = np.nan
+        self.v_max[self.count == 0] = np.nan
+
+    def _update_histogram(self, N: np.ndarray, y_idx: np.ndarray):
+        d, _, k = self.histogram.shape
+        for j in range(d):
+            observed = ~np.isnan(N[:, j])
+            bins = np.searchsorted(self.edges[j], N[observed, j], side='right')
+            self.histogram[j] += np.bincount(bins * k + y_idx[observed],
+                                             minlength=self.fine_bins * k).reshape(self.fine_bins, k)
+
+    def _update_comoment(self, N: np.ndarray):
+        if self.cov_attr.size == 0:
+            return
+        # missing values are replaced by the mean of the attribute
+        M = N[:, self.cov_attr]
+        M = np.where(np.isnan(M), self.mean[self.cov_attr], M)
+        n_a, n_b = self.cov_n, M.shape[0]
+        mean_b = M.mean(axis=0)
+        dev = M - mean_b
+        delta = mean_b - self.cov_mean
+
+        self.comoment += dev.T @ dev + np.outer(delta, delta) * n_a * n_b / (n_a + n_b)
+        self.cov_mean += delta * n_b / (n_a + n_b)
+        self.cov_n += n_b
+
+    def _update_sample(self, X: np.ndarray, y: np.ndarray):
+        """
+        Reservoir sampling of complete rows, see Vitter: Random Sampling with a Reservoir, 1985
+        """
+        if self.sample_X is None:
+            self.sample_X = X[:0].copy()
+            self.sample_y = y[:0].copy()
+        if self.sample_X.dtype != X.dtype:
+            self.sample_X = self.sample_X.astype(np.result_type(self.sample_X.dtype, X.dtype))
+
+        free = max(0, self.sample_size - self.sample_X.shape[0])
+        if free > 0:
+            self.sample_X = np.concatenate((self.sample_X, X[:free]))
+            self.sample_y = np.concatenate((self.sample_y, y[:free]))
+
+        if X.shape[0] > free:
+            position = np.arange(self.n + free, self.n + X.shape[0])
+            slots = (self._rs.random_sample(position.size) * (position + 1)).astype(np.int64)
+            replace = np.flatnonzero(slots < self.sample_size)
+            # later rows replace earlier rows assigned to the same slot
+            _, last = np.unique(slots[replace][::-1], return_index=True)
+            replace = replace[::-1][last]
+            self.sample_X[slots[replace]] = X[free + replace]
+            self.sample_y[slots[replace]] = y[free + replace]
+
+    def _statistical(self, numeric: np.ndarray, nr_attr: int) -> Dict[str, float]:
+        if not numeric.any():
+            return {}
+        skewness, kurtosis, var = MetaFeatureFactory._moment_statistics(self.count[numeric], *self.moments[:, numeric])
+
+        in_cov = numeric[self.cov_attr]
+        cov_mat = self.comoment[np.ix_(in_cov, in_cov)] / max(self.cov_n - 1, 1)
+        if cov_mat.shape[0] > 1:
+            std = np.sqrt(np.diag(cov_mat))
+            lower = np.tril_indices(cov_mat.shape[0], k=-1)
+            cov = np.abs(cov_mat[lower])
+            with np.errstate(invalid='ignore', divide='ignore'):
+                cor = np.abs(cov_mat / np.outer(std, std))[lower]
+        else:
+            cor = np.ones(1)
+            cov = np.zeros(1)
+
+        return {
+            'skewness_mean': float(skewness.mean()),
+            'skewness_sd': float(skewness.std(ddof=1)) if nr_attr > 1 and skewness.size > 1 else 0,
+            'kurtosis_mean': float(kurtosis.mean()),
+            'kurtosis_sd': float(kurtosis.std(ddof=1)) if nr_attr > 1 and kurtosis.size > 1 else 0,
+            'cor_mean': float(cor.mean()) if nr_attr > 1 else 1,
+            'cor_sd': float(cor.std(ddof=1)) if nr_attr > 2 and cor.size > 1 else 0,
+            'cov_mean': float(cov.mean()) if nr_attr > 1 else 0,
+            'cov_sd': float(cov.std(ddof=1)) if nr_attr > 2 and cov.size > 1 else 0,
+            'var_mean': float(var.mean()),
+            'var_sd': float(var.std(ddof=1)) if nr_attr > 1 and var.size > 1 else 0
+        }
+
+    def _info_theory(self, numeric: np.ndarray, categorical: np.ndarray, class_ent: float,
+                     nr_attr: int) -> Dict[str, float]:
+        k = len(self.classes)
+        joint = []
+        for j in np.flatnonzero(categorical):
+            counts = collections.defaultdict(lambda: np.zeros(k, dtype=np.int64))
+            for (value, c), count in self.value_counts[j].items():
+                counts[value][c] += count
+            joint.append(np.array(list(counts.values())))
+
+        # merge fine bins into equal frequency bins like pymfe
+        num_bins = max(1, int(self.n ** (1 / 3)))
+        for j in np.flatnonzero(numeric):
+            total = self.histogram[j].sum(axis=1)
+            before = np.cumsum(total) - total
+            coarse = np.minimum(before * num_bins // max(total.sum(), 1), num_bins - 1)
+            merged = np.zeros((num_bins, k), dtype=np.int64)
+            np.add.at(merged, coarse, self.histogram[j])
+            joint.append(merged)
+
+        if len(joint) == 0:
+            return {'attr_ent_mean': 0., 'attr_ent_sd': 0., 'mut_inf_mean': 0., 'mut_inf_sd': 0.,
+                    'eq_num_attr': 0., 'ns_ratio': 0.}
+
+        attr_ent = np.array([self._entropy(counts.sum(axis=1)) for counts in joint])
+        joint_ent = np.array([self._entropy(counts.ravel()) for counts in joint])
+        # missing values are ignored, so the class entropy may differ per attribute
+        observed_class_ent = np.array([self._entropy(counts.sum(axis=0)) for counts in joint])
+        mut_inf = attr_ent + observed_class_ent - joint_ent
+
+        return {
+            'attr_ent_mean': float(attr_ent.mean()),
+            'attr_ent_sd': float(attr_ent.std(ddof=1)) if nr_attr > 1 else 0,
+            'mut_inf_mean': float(mut_inf.mean()),
+            'mut_inf_sd': float(mut_inf.std(ddof=1)) if nr_attr > 1 else 0,
+            'eq_num_attr': float(len(joint) * class_ent / mut_inf.sum()),
+            'ns_ratio': float((attr_ent.sum() - mut_inf.sum()) / mut_inf.sum())
+        }
+
+    @staticmethod
+    def _entropy(counts: np.ndarray) -> float:
+        counts = counts[counts > 0]
+        p = counts / counts.sum()
+        return float(-np.sum(p * np.log2(p)))
+
+
+def iter_chunks(source: Union[str, np.ndarray, pd.DataFrame, Iterable[Chunk]],
+                y: Union[str, np.ndarray] = None,
+                chunk_size: int = 10000) -> Iterator[Chunk]:
+    """
+    Iterates over row chunks of a data set.
+    :param source: path to a .npy file, which is memory mapped, or a Parquet file, an array, a memory map, a DataFrame
+    or an iterable of (X, y) chunks
+    :param y: labels, path to a .npy file containing the labels or name of the label column in a Parquet file. Not used
+    if source is an iterable of chunks
+    :param chunk_size: number of rows per chunk
+    """
+    if isinstance(source, str) and source.endswith('.parquet'):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError('Reading Parquet files requires pyarrow')
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunk_size):
+            df = batch.to_pandas()
+            if isinstance(y, str):
+                yield df.drop(columns=[y]), df[y].to_numpy()
+            else:
+                raise ValueError('y has to be the name of the label column for Parquet files')
+        return
+
+    if isinstance(source, str):
+        if os.path.splitext(source)[1] != '.npy':
+            raise ValueError(f'Unsupported file format {source}')
+        source = np.load(source, mmap_mode='r')
+    if isinstance(y, str):
+        y = np.load(y, mmap_mode='r')
+
+    if isinstance(source, (np.ndarray, pd.DataFrame)):
+        if y is None:
+            raise ValueError('Labels have to be provided')
+        for start in range(0, source.shape[0], chunk_size):
+            X = source.iloc[start:start + chunk_size] if isinstance(source, pd.DataFrame) else \
+                np.asarray(source[start:start + chunk_size])
+            yield X, np.asarray(y[start:start + chunk_size])
+    else:
+        yield from source
@@ -1,70 +1,406 @@
+import json
 import logging
-from typing import Optional, Dict, Tuple
+import os
+import tempfile
+import time
+from typing import Optional, Dict, Tuple, Union, List, Any, Iterable, Mapping
 
 import numpy as np
 import pandas as pd
+import scipy.sparse as sp
 from pymfe import _internal
 from pymfe.general import MFEGeneral
 from pymfe.info_theory import MFEInfoTheory
 from pymfe.model_based import MFEModelBased
 from pymfe.statistical import MFEStatistical
+from sklearn.decomposition import TruncatedSVD
+from sklearn.discriminant_analysis import LinearDiscriminantAnalysis
+from sklearn.model_selection import StratifiedKFold, KFold
+from sklearn.naive_bayes import GaussianNB
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.tree import DecisionTreeClassifier
 
 from dswizard import pynisher
+from dswizard.components.schema import infer_schema
+from dswizard.components.util import fingerprint
 
 MetaFeatures = np.ndarray
 
 
+class MetaFeatureCache(object):
+    """
+    Content addressed cache for meta-features stored on the local disk. Each entry is a small JSON file named after the
+    fingerprint of the data set and the calculation parameters. If the total size of all entries exceeds max_size_in_mb,
+    the least recently used entries are evicted. The cache can be shared by multiple processes.
+    """
+    logger = logging.getLogger('Meta-Features')
+
+    def __init__(self, directory: str = None, max_size_in_mb: float = 64):
+        self.directory = os.path.join(os.path.expanduser('~'), '.cache', 'dswizard', 'meta_features') \
+            if directory is None else directory
+        self.max_size_in_b = max_size_in_mb * 1024 * 1024
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.json')
+
+    def get(self, key: str) -> Optional[Dict[str, float]]:
+        path = self._path(key)
+        try:
+            with open(path) as fh:
+                mf = json.load(fh)
+            # the modification time tracks the last usage
+            os.utime(path)
+            return mf
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key: str, mf: Dict[str, float]):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as fh:
+                json.dump(mf, fh)
+            # readers never observe partially written entries
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            MetaFeatureCache.logger.warning('Failed to store MF in cache', exc_info=True)
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            return
+        self._evict()
+
+    def _entries(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json'):
+                try:
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+                except OSError:
+                    pass
+        return entries
+
+    def _evict(self):
+        entries = self._entries()
+        size = sum(entry[1] for entry in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_size_in_b:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            size -= entry_size
+
+    def clear(self):
+        for _, _, path in self._entries():
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def __len__(self):
+        return len(self._entries())
+
+    def __contains__(self, key: str):
+        return os.path.exists(self._path(key))
+
+
 class MetaFeatureFactory(object):
     logger = logging.getLogger('Meta-Features')
+    # has to be increased whenever the calculated meta-features change to invalidate cached values
+    VERSION = 3
+    # data types of the prepared numeric data. float32 halves the memory of the numeric data at the cost of precision
+    PRECISIONS = {'float64': np.float64, 'float32': np.float32}
+    # meta-features that are always calculated on the complete data set, even if a sample_size is provided
+    EXACT_FEATURES = ('nr_inst', 'nr_attr', 'nr_num', 'nr_cat', 'nr_class', 'nr_missing_values', 'pct_missing_values',
+                      'nr_inst_mv', 'pct_inst_mv', 'nr_attr_mv', 'pct_attr_mv', 'class_prob_mean', 'class_prob_std',
+                      'class_ent')
+    LANDMARKING_FEATURES = ('one_nn_mean', 'one_nn_sd', 'best_node_mean', 'best_node_sd', 'linear_discr_mean',
+                            'linear_discr_sd', 'naive_bayes_mean', 'naive_bayes_sd')
+    # order of all meta-features in the returned vector
+    FEATURES = ('nr_inst', 'nr_attr', 'nr_num', 'nr_cat', 'nr_class', 'nr_missing_values', 'pct_missing_values',
+                'nr_inst_mv', 'pct_inst_mv', 'nr_attr_mv', 'pct_attr_mv',
+                'nr_outliers', 'skewness_mean', 'skewness_sd', 'kurtosis_mean', 'kurtosis_sd', 'cor_mean', 'cor_sd',
+                'cov_mean', 'cov_sd', 'sparsity_mean', 'sparsity_sd', 'var_mean', 'var_sd',
+                'class_prob_mean', 'class_prob_std',
+                'class_ent', 'attr_ent_mean', 'attr_ent_sd', 'mut_inf_mean', 'mut_inf_sd', 'eq_num_attr', 'ns_ratio',
+                'nodes', 'leaves', 'leaves_branch_mean', 'leaves_branch_sd', 'nodes_per_attr', 'leaves_per_class_mean',
+                'leaves_per_class_sd', 'var_importance_mean', 'var_importance_sd',
+                'one_nn_mean', 'one_nn_sd', 'best_node_mean', 'best_node_sd', 'linear_discr_mean', 'linear_discr_sd',
+                'naive_bayes_mean', 'naive_bayes_sd')
+    # meta-features computed together as they share the same precomputations
+    GROUPS = {
+        'general': EXACT_FEATURES,
+        'statistical': ('nr_outliers', 'skewness_mean', 'skewness_sd', 'kurtosis_mean', 'kurtosis_sd', 'cor_mean',
+                        'cor_sd', 'cov_mean', 'cov_sd', 'sparsity_mean', 'sparsity_sd', 'var_mean', 'var_sd'),
+        'info_theory': ('attr_ent_mean', 'attr_ent_sd', 'mut_inf_mean', 'mut_inf_sd', 'eq_num_attr', 'ns_ratio'),
+        'model_based': ('nodes', 'leaves', 'leaves_branch_mean', 'leaves_branch_sd', 'nodes_per_attr',
+                        'leaves_per_class_mean', 'leaves_per_class_sd', 'var_importance_mean', 'var_importance_sd'),
+        'landmarking': LANDMARKING_FEATURES
+    }
 
     @staticmethod
-    def calculate(X: np.ndarray,
-                  y: np.ndarray,
+    def calculate(X: Union[np.ndarray, pynisher.SharedData],
+                  y: Union[np.ndarray, pynisher.SharedData],
                   max_nan_percentage: float = 0.9,
                   max_features: int = 10000,
                   random_state: int = 42,
-                  timeout: int = 30) -> Tuple[Optional[Dict[str, float]], Optional[MetaFeatures]]:
+                  timeout: float = 30,
+                  cache: MetaFeatureCache = None,
+                  sample_size: int = None,
+                  details: Dict = None,
+                  parallel: bool = False,
+                  group_timeout: float = None,
+                  landmarking_rows: Optional[int] = 10000,
+                  precision: str = 'float64') -> Tuple[Optional[Dict[str, float]], Optional[MetaFeatures]]:
         """
         Calculates the meta-features for the given DataFrame. The actual computation is dispatched to another process
         to prevent crashes due to extensive memory usage.
-        :param X:
-        :param y:
+        :param X: data set or handle created via pynisher.share. Passing handles avoids copying the data set into the
+        sandboxed process and allows reusing the same buffers for model fits
+        :param y: labels or handle created via pynisher.share
         :param max_nan_percentage:
         :param max_features:
         :param random_state:
         :param timeout:
-        :param memory:
+        :param cache: optional cache. Meta-features of previously seen data sets are returned without recalculation
+        :param sample_size: if X contains more samples, statistical, information-theoretical and model-based
+        meta-features are estimated on a stratified sample of this size. Simple counts like the number of instances or
+        missing values are always exact
+        :param details: optional dictionary that is filled with additional information about the calculation, e.g. the
+        names of all estimated meta-features in estimated or the names of all meta-features of failed groups in failed
+        :param parallel: compute the statistical, information-theoretical and model-based meta-features concurrently
+        in separate processes. The prepared data is shared read-only between all processes. If a group fails, e.g.
+        because it exceeds group_timeout, its meta-features are set to 0 instead of failing the complete calculation
+        :param group_timeout: wall-clock time limit of each meta-feature group if parallel is set. Defaults to timeout
+        :param landmarking_rows: maximum number of samples used for the landmarking meta-features. Larger data sets are
+        subsampled stratified. None uses all samples
+        :param precision: data type of the numeric data, see PRECISIONS. float32 stores numeric attributes in single
+        precision and one-hot encoded attributes as uint8 before merging them, reducing memory usage on wide data sets
         :return:
         """
+        MetaFeatureFactory._dtype(precision)
+        X_data = X.view() if isinstance(X, pynisher.SharedData) else X
+        estimated = sample_size is not None and X_data.shape[0] > sample_size
+        details = {} if details is None else details
+        details['estimated'] = []
+        details['failed'] = []
+
+        key = None
+        if cache is not None:
+            key = fingerprint(X_data, y.view() if isinstance(y, pynisher.SharedData) else y,
+                              max_nan_percentage=max_nan_percentage, max_features=max_features,
+                              random_state=random_state, sample_size=sample_size if estimated else None,
+                              landmarking_rows=landmarking_rows, precision=precision,
+                              version=MetaFeatureFactory.VERSION)
+            res = cache.get(key)
+            if res is not None:
+                MetaFeatureFactory.logger.debug('Using cached MF')
+                details['estimated'] = MetaFeatureFactory._estimated_features(res, estimated, landmarking_rows)
+                return res, np.atleast_2d(np.fromiter(res.values(), dtype=float))
+
         MetaFeatureFactory.logger.debug('Calculating MF')
-        wrapper = pynisher.enforce_limits(wall_time_in_s=timeout, grace_period_in_s=5,
-                                           logger=MetaFeatureFactory.logger)(MetaFeatureFactory._calculate)
-        res = wrapper(X, y, max_nan_percentage=max_nan_percentage, max_features=max_features,
-                      random_state=random_state)
+        if parallel:
+            res, exit_status = MetaFeatureFactory._calculate_parallel(
+                X, y, max_nan_percentage, max_features, random_state, sample_size, landmarking_rows, precision, timeout,
+                timeout if group_timeout is None else group_timeout, details)
+        else:
+            wrapper = pynisher.enforce_limits(wall_time_in_s=timeout, grace_period_in_s=5,
+                                               logger=MetaFeatureFactory.logger)(MetaFeatureFactory._calculate)
+            res = wrapper(X, y, max_nan_percentage=max_nan_percentage, max_features=max_features,
+                          random_state=random_state, sample_size=sample_size, landmarking_rows=landmarking_rows,
+                          precision=precision)
+            exit_status = wrapper.exit_status
+
+        res = MetaFeatureFactory._check_result(res, exit_status)
+        if res is None:
+            return None, None
+
+        # incomplete results are not cached to allow a complete calculation later on
+        if cache is not None and len(details['failed']) == 0:
+            cache.put(key, res)
+        details['estimated'] = MetaFeatureFactory._estimated_features(res, estimated, landmarking_rows)
+        return res, np.atleast_2d(np.fromiter(res.values(), dtype=float))
+
+    @staticmethod
+    def calculate_streaming(source: Union[str, np.ndarray, pd.DataFrame, Iterable[Tuple[Any, np.ndarray]]],
+                            y: Union[str, np.ndarray] = None,
+                            chunk_size: int = 10000,
+                            sample_size: int = 10000,
+                            max_nan_percentage: float = 0.9,
+                            random_state: int = 42,
+                            timeout: float = 30,
+                            details: Dict = None,
+                            state: str = None) -> Tuple[Optional[Dict[str, float]], Optional[MetaFeatures]]:
+        """
+        Calculates the meta-features in a single pass over row chunks without loading the complete data set into
+        memory. See MetaFeatureAccumulator for the differences to calculate. Only meta-features of the reservoir sample
+        are calculated in another process.
+        :param source: path to a .npy or Parquet file, an array, a memory map, a DataFrame or an iterable of (X, y)
+        chunks
+        :param y: labels, path to a .npy file containing the labels or name of the label column in a Parquet file
+        :param chunk_size: number of rows processed at once
+        :param sample_size: size of the reservoir sample used for model-based and landmarking meta-features
+        :param details: optional dictionary that is filled with the names of all estimated meta-features in estimated
+        :param state: optional path of a stored MetaFeatureAccumulator. If the file exists, source has to contain only
+        the rows added since the state was stored and sample_size and random_state are ignored. The updated state is
+        stored in this file again, so repeated calls only have to process new rows
+        :return:
+        """
+        from dswizard.components.meta_feature_accumulator import MetaFeatureAccumulator, iter_chunks
+
+        if state is not None and os.path.exists(state):
+            accumulator = MetaFeatureAccumulator.load(state)
+        else:
+            accumulator = MetaFeatureAccumulator(sample_size=sample_size, random_state=random_state)
+        for X_chunk, y_chunk in iter_chunks(source, y, chunk_size):
+            accumulator.update(X_chunk, y_chunk)
+        if state is not None:
+            accumulator.save(state)
+        res = accumulator.result(max_nan_percentage=max_nan_percentage, timeout=timeout, details=details)
+        if res is None:
+            return None, None
+        return res, np.atleast_2d(np.fromiter(res.values(), dtype=float))
+
+    @staticmethod
+    def calculate_selected(X: Union[np.ndarray, pynisher.SharedData],
+                           y: Union[np.ndarray, pynisher.SharedData],
+                           features: Iterable[str],
+                           max_nan_percentage: float = 0.9,
+                           max_features: int = 10000,
+                           random_state: int = 42,
+                           timeout: float = 30,
+                           sample_size: int = None,
+                           landmarking_rows: Optional[int] = 10000,
+                           precision: str = 'float64') -> Optional[Dict[str, float]]:
+        """
+        Calculates only the requested meta-features. Only the meta-feature groups containing at least one requested
+        meta-feature are computed. General meta-features, e.g. the number of numeric or categorical attributes, are
+        computed directly in the current process without any data preparation. All other groups are computed in another
+        process like in calculate.
+        :param features: names of the requested meta-features, see FEATURES
+        :return: requested meta-features in the order of FEATURES or None if the calculation failed
+        """
+        MetaFeatureFactory._dtype(precision)
+        features = set(features)
+        unknown = features.difference(MetaFeatureFactory.FEATURES)
+        if len(unknown) > 0:
+            raise ValueError(f'Unknown meta-features {sorted(unknown)}')
+        groups = [group for group, names in MetaFeatureFactory.GROUPS.items() if not features.isdisjoint(names)]
+
+        if groups == ['general']:
+            X_data = X.view() if isinstance(X, pynisher.SharedData) else X
+            y_data = y.view() if isinstance(y, pynisher.SharedData) else y
+            try:
+                res, exit_status = MetaFeatureFactory._structural(X_data, y_data, max_nan_percentage, max_features), 0
+            except ValueError as ex:
+                res, exit_status = (ex, None), pynisher.AnythingException
+        else:
+            MetaFeatureFactory.logger.debug(f'Calculating MF groups {groups}')
+            wrapper = pynisher.enforce_limits(wall_time_in_s=timeout, grace_period_in_s=5,
+                                               logger=MetaFeatureFactory.logger)(MetaFeatureFactory._calculate)
+            res = wrapper(X, y, max_nan_percentage=max_nan_percentage, max_features=max_features,
+                          random_state=random_state, sample_size=sample_size, landmarking_rows=landmarking_rows,
+                          groups=groups, precision=precision)
+            exit_status = wrapper.exit_status
+
+        res = MetaFeatureFactory._check_result(res, exit_status)
+        if res is None:
+            return None
+        return {key: value for key, value in res.items() if key in features}
+
+    @staticmethod
+    def _dtype(precision: str) -> type:
+        try:
+            return MetaFeatureFactory.PRECISIONS[precision]
+        except KeyError:
+            raise ValueError(f'Unknown precision {precision}. Expected one of {list(MetaFeatureFactory.PRECISIONS)}')
+
+    @staticmethod
+    def _check_result(res: Any, exit_status: Any) -> Optional[Dict[str, float]]:
         # TODO improve error handling
-        if wrapper.exit_status is pynisher.TimeoutException or wrapper.exit_status is pynisher.MemorylimitException:
+        if exit_status is pynisher.TimeoutException or exit_status is pynisher.MemorylimitException:
             MetaFeatureFactory.logger.warning('Failed to extract MF due to resource constraints')
-            return None, None
-        elif wrapper.exit_status is pynisher.AnythingException and isinstance(res, Tuple):
+            return None
+        elif exit_status is pynisher.AnythingException and isinstance(res, Tuple):
             MetaFeatureFactory.logger.warning(f'Failed to extract MF due to {res[0]}')
-            return None, None
-        elif wrapper.exit_status == 0 and res is not None:
-            array = np.atleast_2d(np.fromiter(res.values(), dtype=float))
-            if np.isnan(array).any():
+            return None
+        elif exit_status == 0 and res is not None:
+            if np.isnan(np.fromiter(res.values(), dtype=float)).any():
                 MetaFeatureFactory.logger.warning(f'MF are partially NaN: {res}')
-                return None, None
-            return res, array
+                return None
+            return res
         else:
             # Last resort...
             MetaFeatureFactory.logger.warning('Failed to extract MF due to unknown reasons')
-            return None, None
+            return None
+
+    @staticmethod
+    def _calculate_parallel(X: Union[np.ndarray, pynisher.SharedData],
+                            y: Union[np.ndarray, pynisher.SharedData],
+                            max_nan_percentage: float,
+                            max_features: int,
+                            random_state: int,
+                            sample_size: Optional[int],
+                            landmarking_rows: Optional[int],
+                            precision: str,
+                            timeout: float,
+                            group_timeout: float,
+                            details: Dict) -> Tuple[Any, Any]:
+        start = time.monotonic()
+        wrapper = pynisher.enforce_limits(wall_time_in_s=timeout, grace_period_in_s=5,
+                                           logger=MetaFeatureFactory.logger)(MetaFeatureFactory._prepare_shared)
+        res = wrapper(X, y, max_nan_percentage=max_nan_percentage, max_features=max_features,
+                      random_state=random_state, sample_size=sample_size, precision=precision)
+        if wrapper.exit_status != 0:
+            return res, wrapper.exit_status
+
+        # the prepared data is already placed in shared memory by the sandboxed process and owned by this process now
+        general, N, C, X, y = res
+        shared = [N, C, X, y]
+        results = [general]
+        try:
+            nr_attr = general['nr_attr']
+            groups = {
+                'statistical': (MetaFeatureFactory._statistical, (N, X, nr_attr)),
+                'info_theory': (MetaFeatureFactory._info_theory, (C, y, nr_attr)),
+                'model_based': (MetaFeatureFactory._model_based, (N, y, nr_attr, random_state)),
+                'landmarking': (MetaFeatureFactory._landmarking, (N, y, random_state, landmarking_rows))
+            }
+
+            # groups waiting for a free core only get the time remaining until the deadline once they are started
+            limits = {'wall_time_in_s': group_timeout, 'grace_period_in_s': 5}
+            with pynisher.LimitedExecutor(logger=MetaFeatureFactory.logger) as executor:
+                jobs = {executor.submit(func, *args, limits=limits, deadline=start + timeout).id: name
+                        for name, (func, args) in groups.items()}
+                for job_result in executor.as_completed():
+                    if job_result.exit_status == 0:
+                        results.append(job_result.result)
+                    else:
+                        MetaFeatureFactory.logger.warning(f'Failed to extract {jobs[job_result.job.id]} MF due to '
+                                                          f'{job_result.exit_status}')
+        finally:
+            for obj in shared:
+                if isinstance(obj, pynisher.SharedData):
+                    obj.release()
+
+        values = {}
+        for group in results:
+            values.update(group)
+        details['failed'] = [key for key in MetaFeatureFactory.FEATURES if key not in values]
+        return {key: values.get(key, 0) for key in MetaFeatureFactory.FEATURES}, 0
 
     @staticmethod
     def _calculate(X: np.ndarray,
                    y: np.ndarray,
                    max_nan_percentage: float = 0.9,
                    max_features: int = 10000,
-                   random_state: int = 42) -> Optional[Dict[str, float]]:
+                   random_state: int = 42,
+                   sample_size: int = None,
+                   landmarking_rows: Optional[int] = 10000,
+                   groups: List[str] = None,
+                   precision: str = 'float64') -> Optional[Dict[str, float]]:
         """
         Calculates the meta-features for the given DataFrame. _Attention_: Meta-feature calculation can require a lot of
         memory. This method should not be called directly to prevent the caller from crashing.
@@ -73,145 +409,403 @@ class MetaFeatureFactory(object):
         :param max_nan_percentage:
         :param max_features:
         :param random_state:
+        :param sample_size:
+        :param landmarking_rows:
+        :param groups: names of the meta-feature groups to calculate, see GROUPS. General meta-features are always
+        calculated. Defaults to all groups
+        :param precision:
         :return:
         """
+        groups = MetaFeatureFactory.GROUPS.keys() if groups is None else groups
+        general, N, C, X, y = MetaFeatureFactory._prepare(X, y, max_nan_percentage, max_features, random_state,
+                                                          sample_size, precision)
+        nr_attr = general['nr_attr']
+        functions = {
+            'statistical': lambda: MetaFeatureFactory._statistical(N, X, nr_attr),
+            'info_theory': lambda: MetaFeatureFactory._info_theory(C, y, nr_attr),
+            'model_based': lambda: MetaFeatureFactory._model_based(N, y, nr_attr, random_state),
+            'landmarking': lambda: MetaFeatureFactory._landmarking(N, y, random_state, landmarking_rows)
+        }
+        return MetaFeatureFactory._merge(general, *[functions[group]() for group in functions if group in groups])
+
+    @staticmethod
+    def _prepare_shared(X: np.ndarray, y: np.ndarray, **kwargs) -> Tuple[Dict[str, float], Any, Any, Any, Any]:
+        """
+        Like _prepare but places the prepared data in shared memory. The ownership of the shared memory is transferred
+        to the process receiving the result, so the data is neither copied through the result pipe nor copied again.
+        """
+        general, *data = MetaFeatureFactory._prepare(X, y, **kwargs)
+        shared = [pynisher.share(obj) for obj in data]
+        for obj in shared:
+            if isinstance(obj, pynisher.SharedData):
+                obj.transfer()
+        return (general, *shared)
+
+    @staticmethod
+    def _prepare(X: np.ndarray,
+                 y: np.ndarray,
+                 max_nan_percentage: float = 0.9,
+                 max_features: int = 10000,
+                 random_state: int = 42,
+                 sample_size: int = None,
+                 precision: str = 'float64') -> Tuple[Dict[str, float], np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Calculates all general meta-features and prepares the data for the remaining meta-feature groups.
+        :param precision: data type of the numeric data N, see PRECISIONS. Sparse data is always prepared in float64
+        :return: general meta-features, numeric data N, categorical data C, complete data X and labels y
+        """
         # Checks if number of features is bigger than max_features.
         if X.shape[1] > max_features:
             raise ValueError(f'Number of features is bigger then {max_features}')
+        if sp.issparse(X):
+            return MetaFeatureFactory._prepare_sparse(X, y, max_nan_percentage, random_state, sample_size)
 
         missing = pd.isna(X)
-        nr_missing_values = MetaFeatureFactory.ft_nr_missing_val(missing)
-        nr_inst_mv = MetaFeatureFactory.ft_nr_inst_missing_values(missing)
-        nr_attr_mv = MetaFeatureFactory.ft_nr_attr_missing_values(missing)
-        pct_missing_values = (float(nr_missing_values) / float(X.shape[0] * X.shape[1])) * 100
-        pct_inst_mv = (float(nr_inst_mv) / float(X.shape[0])) * 100
-        pct_attr_mv = (float(nr_attr_mv) / float(X.shape[1])) * 100
-        class_prob = MetaFeatureFactory.ft_class_prob(y)
 
         # Meta-Feature calculation does not work with missing data.
-        X = pd.DataFrame(X).infer_objects()
-        cols = X.columns
-        for c in cols:
-            try:
-                X[c] = pd.to_numeric(X[c])
-            except:
-                pass
-
-        numeric = X.select_dtypes(include=['number']).columns
-        n = X.shape[0]
+        schema = infer_schema(X)
+        X = schema.apply(X, copy=True)
+        numeric = X.columns[schema.numeric | schema.missing]
         rs = np.random.RandomState(random_state)
 
-        for i in X.columns:
-            col = X[i]
-            nan = missing[:, i]
-            if not nan.any():
-                continue
-            elif np.sum(nan) / nan.size > max_nan_percentage:
-                X.drop(i, axis=1, inplace=True)
-            elif i in numeric:
-                filler = rs.normal(col.mean(), col.std(), n)
-                X[i] = col.combine_first(pd.Series(filler))
-            else:
-                items = col.dropna().unique()
-                probability = col.value_counts(dropna=True, normalize=True)
-                probability = probability.where(probability > 0).dropna()
-                filler = rs.choice(items, n, p=probability)
-                X[i] = col.combine_first(pd.Series(filler))
-
-        for i in X.columns:
-            col = X[i]
-            if i in numeric:
-                if not (abs(col - col.iloc[0]) > 1e-7).any() or (~np.isfinite(col)).all():
-                    X.drop(i, inplace=True, axis=1)
-            else:
-                if not (col != col.iloc[0]).any():
-                    X.drop(i, inplace=True, axis=1)
+        X = MetaFeatureFactory._fill_missing_values(X, missing, numeric, max_nan_percentage, rs)
+        X = MetaFeatureFactory._drop_constant_columns(X, numeric)
 
         if X.shape[0] == 0 or X.shape[1] == 0:
             raise ValueError('X has no samples, no features or only constant values.')
 
+        nr_num = len(X.columns.intersection(numeric))
+        general = MetaFeatureFactory._general(missing, y, X.shape[0], nr_num, X.shape[1] - nr_num)
+        if sample_size is not None and X.shape[0] > sample_size:
+            idx = MetaFeatureFactory._stratified_sample(y, sample_size, np.random.RandomState(random_state))
+            X = X.iloc[idx].reset_index(drop=True)
+            y = np.asarray(y)[idx]
+
+        dtype = MetaFeatureFactory._dtype(precision)
         C_tmp = X.select_dtypes(exclude=['number'])
         N_tmp = X.select_dtypes(include=['number'])
+        if dtype != np.float64:
+            N_tmp = N_tmp.astype(dtype)
 
         C = MetaFeatureFactory._set_data_categoric(N_tmp, C_tmp, True)
-        N = MetaFeatureFactory._set_data_numeric(N_tmp, C_tmp, True)
+        N = MetaFeatureFactory._set_data_numeric(N_tmp, C_tmp, True, dtype)
         X = X.to_numpy()
+        return general, N, C, X, y
 
-        nr_inst = MFEGeneral.ft_nr_inst(X)
-        nr_attr = MFEGeneral.ft_nr_attr(X)
+    @staticmethod
+    def _prepare_sparse(X: sp.spmatrix,
+                        y: np.ndarray,
+                        max_nan_percentage: float = 0.9,
+                        random_state: int = 42,
+                        sample_size: int = None) -> Tuple[Dict[str, float], sp.csc_matrix, sp.csc_matrix,
+                                                          sp.csc_matrix, np.ndarray]:
+        """
+        Counterpart of _prepare for sparse data. All attributes are numeric and only stored values are processed, so
+        memory usage is proportional to the number of non-zero values. Missing values have to be stored explicitly as
+        NaN.
+        :return: general meta-features, sparse numeric data N, sparse discretized data C, N and labels y
+        """
+        X = sp.csc_matrix(X, dtype=float, copy=True)
+        X.sum_duplicates()
+        missing = MetaFeatureFactory._sparse_missing(X)
+        nan_count = np.asarray(missing.sum(axis=0)).ravel()
 
-        precomp_statistical = MFEStatistical.precompute_statistical_cor_cov(N)
-        skewness = MFEStatistical.ft_skewness(N)
-        kurtosis = MFEStatistical.ft_kurtosis(N)
+        X = MetaFeatureFactory._fill_sparse(X, nan_count, np.random.RandomState(random_state))
+        X.eliminate_zeros()
+        v_min, v_max = MetaFeatureFactory._sparse_min_max(X)
+        constant = ~(v_max - v_min > 1e-7)
+        X = X[:, (nan_count / max(X.shape[0], 1) <= max_nan_percentage) & ~constant]
 
-        if N.shape[1] > 1:
-            cor = MFEStatistical.ft_cor(N, abs_corr_mat=precomp_statistical['abs_corr_mat'])
-            cov = MFEStatistical.ft_cov(N, cov_mat=precomp_statistical['cov_mat'])
-        else:
-            cor = np.ones(1)
-            cov = np.zeros(1)
-        sparsity = MFEStatistical.ft_sparsity(X)
-        var = MFEStatistical.ft_var(N)
+        if X.shape[0] == 0 or X.shape[1] == 0:
+            raise ValueError('X has no samples, no features or only constant values.')
 
-        precomp_info = MFEInfoTheory.precompute_class_freq(y)
-        precomp_info.update(MFEInfoTheory.precompute_entropy(y, C))
-        if C.size > 0:
-            attr_ent = MFEInfoTheory.ft_attr_ent(C, precomp_info['attr_ent'])
-            mut_inf = MFEInfoTheory.ft_mut_inf(C, y, precomp_info['mut_inf'])
-            eq_num_attr = MFEInfoTheory.ft_eq_num_attr(C, y, class_ent=precomp_info['class_ent'],
-                                                       mut_inf=precomp_info['mut_inf'])
-            ns_ratio = MFEInfoTheory.ft_ns_ratio(C, y, attr_ent=precomp_info['attr_ent'],
-                                                 mut_inf=precomp_info['mut_inf'])
+        general = MetaFeatureFactory._general(missing, y, X.shape[0], X.shape[1], 0)
+        if sample_size is not None and X.shape[0] > sample_size:
+            idx = MetaFeatureFactory._stratified_sample(y, sample_size, np.random.RandomState(random_state))
+            X = X.tocsr()[idx].tocsc()
+            y = np.asarray(y)[idx]
+
+        N = X
+        C = MetaFeatureFactory._discretize_sparse(N)
+        return general, N, C, N, y
+
+    @staticmethod
+    def _structural(X: np.ndarray, y: np.ndarray, max_nan_percentage: float = 0.9,
+                    max_features: int = 10000) -> Dict[str, float]:
+        """
+        Calculates the general meta-features without filling missing values. Columns removed by _prepare, i.e. columns
+        with too many missing values or constant observed values, are detected directly on the raw data.
+        """
+        if X.shape[1] > max_features:
+            raise ValueError(f'Number of features is bigger then {max_features}')
+
+        if sp.issparse(X):
+            X = sp.csc_matrix(X, dtype=float)
+            missing = MetaFeatureFactory._sparse_missing(X)
+            v_min, v_max = MetaFeatureFactory._sparse_min_max(X)
+            keep = (np.asarray(missing.sum(axis=0)).ravel() / max(X.shape[0], 1) <= max_nan_percentage) & \
+                (v_max - v_min > 1e-7)
+            if X.shape[0] == 0 or not keep.any():
+                raise ValueError('X has no samples, no features or only constant values.')
+            return MetaFeatureFactory._general(missing, y, X.shape[0], int(keep.sum()), 0)
+
+        missing = pd.isna(X)
+        schema = infer_schema(X)
+        # columns without any observed values are treated as numeric
+        is_numeric = schema.numeric | schema.missing
+        if isinstance(X, np.ndarray) and is_numeric.all() and X.dtype.kind in 'iuf':
+            N, C = X, X[:, []]
         else:
-            attr_ent = np.zeros(2)
-            mut_inf = np.zeros(2)
-            eq_num_attr = 0
-            ns_ratio = 0
+            df = schema.apply(X)
+            N, C = df.loc[:, is_numeric].to_numpy(dtype=float), df.loc[:, ~is_numeric].to_numpy(dtype=object)
 
-        precomp_model = MFEModelBased.precompute_model_based_class(N, y, random_state=random_state)
-        leaves_branch = MFEModelBased.ft_leaves_branch(precomp_model['dt_model'], precomp_model['leaf_nodes'],
-                                                       precomp_model['dt_node_depths'])
-        leaves_per_class = MFEModelBased.ft_leaves_per_class(precomp_model['dt_model'], precomp_model['dt_info_table'])
-        var_importance = MFEModelBased.ft_var_importance(precomp_model['dt_model'])
+        constant = np.zeros(X.shape[1], dtype=bool)
+        if N.shape[0] > 0:
+            # values are compared with the first observed value of each column
+            N_missing = missing[:, is_numeric]
+            first = N[np.argmin(N_missing, axis=0), np.arange(N.shape[1])]
+            constant[is_numeric] = ~(np.abs(N - first) > 1e-7).any(axis=0)
+            constant[~is_numeric] = [pd.Series(C[:, i]).nunique(dropna=True) <= 1 for i in range(C.shape[1])]
+
+        keep = (missing.sum(axis=0) / max(X.shape[0], 1) <= max_nan_percentage) & ~constant
+        if X.shape[0] == 0 or not keep.any():
+            raise ValueError('X has no samples, no features or only constant values.')
 
+        return MetaFeatureFactory._general(missing, y, X.shape[0], int((keep & is_numeric).sum()),
+                                           int((keep & ~is_numeric).sum()))
+
+    @staticmethod
+    def _general(missing: np.ndarray, y: np.ndarray, nr_inst: int, nr_num: int, nr_cat: int) -> Dict[str, float]:
+        return MetaFeatureFactory._general_from_counts(missing.shape,
+                                                       MetaFeatureFactory.ft_nr_missing_val(missing),
+                                                       MetaFeatureFactory.ft_nr_inst_missing_values(missing),
+                                                       MetaFeatureFactory.ft_nr_attr_missing_values(missing),
+                                                       np.unique(y, return_counts=True)[1], nr_inst, nr_num, nr_cat)
+
+    @staticmethod
+    def _general_from_counts(shape: Tuple[int, int], nr_missing_values: int, nr_inst_mv: int, nr_attr_mv: int,
+                             class_counts: np.ndarray, nr_inst: int, nr_num: int, nr_cat: int) -> Dict[str, float]:
+        """
+        General meta-features from counts only
+        :param shape: shape of the raw data set including removed columns
+        :param class_counts: number of samples per class
+        """
+        class_prob = class_counts / class_counts.sum()
         return {
             'nr_inst': int(nr_inst),
-            'nr_attr': int(nr_attr),
-            'nr_num': int(X.shape[1] - C_tmp.shape[1]),
-            'nr_cat': int(C_tmp.shape[1]),
-            'nr_class': int(MFEGeneral.ft_nr_class(y)),
+            'nr_attr': int(nr_num + nr_cat),
+            'nr_num': int(nr_num),
+            'nr_cat': int(nr_cat),
+            'nr_class': int(class_counts.size),
             'nr_missing_values': int(nr_missing_values),
-            'pct_missing_values': float(pct_missing_values),
+            'pct_missing_values': float(nr_missing_values / (shape[0] * shape[1]) * 100),
             'nr_inst_mv': int(nr_inst_mv),
-            'pct_inst_mv': float(pct_inst_mv),
+            'pct_inst_mv': float(nr_inst_mv / shape[0] * 100),
             'nr_attr_mv': int(nr_attr_mv),
-            'pct_attr_mv': float(pct_attr_mv),
+            'pct_attr_mv': float(nr_attr_mv / shape[1] * 100),
+            'class_prob_mean': float(class_prob.mean()),
+            'class_prob_std': float(class_prob.std(ddof=0)),
+            # identical to MFEInfoTheory.ft_class_ent but without recounting the classes
+            'class_ent': float(-np.sum(class_prob * np.log2(class_prob)))
+        }
+
+    @staticmethod
+    def _statistical(N: np.ndarray, X: np.ndarray, nr_attr: int) -> Dict[str, float]:
+        if sp.issparse(N):
+            nr_outliers, skewness, kurtosis, cor, cov, sparsity, var = MetaFeatureFactory._statistical_sparse(N)
+            cor = MetaFeatureFactory._mean_sd(cor.size, cor.mean(), np.sum((cor - cor.mean()) ** 2))
+            cov = MetaFeatureFactory._mean_sd(cov.size, cov.mean(), np.sum((cov - cov.mean()) ** 2))
+        else:
+            skewness = MFEStatistical.ft_skewness(N)
+            kurtosis = MFEStatistical.ft_kurtosis(N)
 
-            'nr_outliers': int(MFEStatistical.ft_nr_outliers(N)),
+            if N.shape[1] > 1:
+                cor, cov = MetaFeatureFactory._cor_cov_summary(N)
+            else:
+                cor = 1., 0.
+                cov = 0., 0.
+            sparsity = MFEStatistical.ft_sparsity(X)
+            var = MFEStatistical.ft_var(N)
+            nr_outliers = MFEStatistical.ft_nr_outliers(N)
+
+        return {
+            'nr_outliers': int(nr_outliers),
             'skewness_mean': float(skewness.mean()),
             'skewness_sd': float(skewness.std(ddof=1)) if nr_attr > 1 else 0,
             'kurtosis_mean': float(kurtosis.mean()),
             'kurtosis_sd': float(kurtosis.std(ddof=1)) if nr_attr > 1 else 0,
-            'cor_mean': float(cor.mean()) if nr_attr > 1 else 1,
-            'cor_sd': float(cor.std(ddof=1)) if nr_attr > 2 else 0,
-            'cov_mean': float(cov.mean()) if nr_attr > 1 else 0,
-            'cov_sd': float(cov.std(ddof=1)) if nr_attr > 2 else 0,
+            'cor_mean': float(cor[0]) if nr_attr > 1 else 1,
+            'cor_sd': float(cor[1]) if nr_attr > 2 else 0,
+            'cov_mean': float(cov[0]) if nr_attr > 1 else 0,
+            'cov_sd': float(cov[1]) if nr_attr > 2 else 0,
             'sparsity_mean': float(sparsity.mean()),
             'sparsity_sd': float(sparsity.std(ddof=1)) if nr_attr > 1 else 0,
             'var_mean': float(var.mean()),
-            'var_sd': float(var.std(ddof=1)) if nr_attr > 1 else 0,
-            'class_prob_mean': float(class_prob.mean()),
-            'class_prob_std': float(class_prob.std(ddof=0)),
+            'var_sd': float(var.std(ddof=1)) if nr_attr > 1 else 0
+        }
 
-            'class_ent': float(
-                MFEInfoTheory.ft_class_ent(y, precomp_info['class_ent'], precomp_info['class_freqs'])),
+    @staticmethod
+    def _info_theory(C: np.ndarray, y: np.ndarray, nr_attr: int) -> Dict[str, float]:
+        if sp.issparse(C):
+            attr_ent, mut_inf, eq_num_attr, ns_ratio = MetaFeatureFactory._info_theory_sparse(C, y)
+        elif C.size > 0:
+            precomp_info = MFEInfoTheory.precompute_class_freq(y)
+            precomp_info.update(MFEInfoTheory.precompute_entropy(y, C))
+            attr_ent = MFEInfoTheory.ft_attr_ent(C, precomp_info['attr_ent'])
+            mut_inf = MFEInfoTheory.ft_mut_inf(C, y, precomp_info['mut_inf'])
+            eq_num_attr = MFEInfoTheory.ft_eq_num_attr(C, y, class_ent=precomp_info['class_ent'],
+                                                       mut_inf=precomp_info['mut_inf'])
+            ns_ratio = MFEInfoTheory.ft_ns_ratio(C, y, attr_ent=precomp_info['attr_ent'],
+                                                 mut_inf=precomp_info['mut_inf'])
+        else:
+            attr_ent = np.zeros(2)
+            mut_inf = np.zeros(2)
+            eq_num_attr = 0
+            ns_ratio = 0
+
+        return {
             'attr_ent_mean': float(attr_ent.mean()),
             'attr_ent_sd': float(attr_ent.std(ddof=1)) if nr_attr > 1 else 0,
             'mut_inf_mean': float(mut_inf.mean()),
             'mut_inf_sd': float(mut_inf.std(ddof=1)) if nr_attr > 1 else 0,
             'eq_num_attr': float(eq_num_attr),
-            'ns_ratio': float(ns_ratio),
+            'ns_ratio': float(ns_ratio)
+        }
+
+    @staticmethod
+    def _statistical_sparse(N: sp.csc_matrix, max_cov_attr: int = 1000, random_state: int = 42) -> Tuple[Any, ...]:
+        """
+        Statistical meta-features of sparse data with the same definitions as in pymfe. All moments are computed from
+        the stored values with the implicit zeros added analytically. Correlation and covariance are calculated on at
+        most max_cov_attr randomly selected attributes to limit the size of the covariance matrix.
+        """
+        n, d = N.shape
+        col = MetaFeatureFactory._sparse_columns(N)
+        zeros = n - np.diff(N.indptr)
+
+        mean = np.bincount(col, weights=N.data, minlength=d) / n
+        centered = N.data - mean[col]
+        m2, m3, m4 = [np.bincount(col, weights=centered ** p, minlength=d) + zeros * (-mean) ** p for p in (2, 3, 4)]
+        skewness, kurtosis, var = MetaFeatureFactory._moment_statistics(n, m2, m3, m4)
+
+        order = np.lexsort((N.data, col))
+        values, sorted_col = N.data[order], col[order]
+        new_value = np.ones(values.size, dtype=bool)
+        new_value[1:] = (values[1:] != values[:-1]) | (sorted_col[1:] != sorted_col[:-1])
+        unique = np.bincount(sorted_col[new_value], minlength=d) + (zeros > 0)
+        sparsity = (n / unique - 1) / (n - 1)
+
+        v_min, q_1, q_3, v_max = MetaFeatureFactory._sparse_percentiles(values, N.indptr, n, (0, 25, 75, 100))
+        whis_iqr = 1.5 * (q_3 - q_1)
+        nr_outliers = np.sum((q_1 - whis_iqr > v_min) | (q_3 + whis_iqr < v_max))
+
+        if d > 1:
+            attr = np.arange(d)
+            if d > max_cov_attr:
+                attr = np.sort(np.random.RandomState(random_state).choice(d, max_cov_attr, replace=False))
+            M = N[:, attr]
+            cov_mat = (np.asarray((M.T @ M).todense()) - n * np.outer(mean[attr], mean[attr])) / (n - 1)
+            std = np.sqrt(np.diag(cov_mat))
+            lower = np.tril_indices(attr.size, k=-1)
+            cov = np.abs(cov_mat[lower])
+            cor = np.abs(cov_mat / np.outer(std, std))[lower]
+        else:
+            cor = np.ones(1)
+            cov = np.zeros(1)
+        return nr_outliers, skewness, kurtosis, cor, cov, sparsity, var
+
+    @staticmethod
+    def _cor_cov_summary(N: np.ndarray, max_block_size: int = 2 ** 22) -> Tuple[Tuple[float, float],
+                                                                               Tuple[float, float]]:
+        """
+        Mean and standard deviation of the absolute correlation and covariance of all attribute pairs with the same
+        definitions as in pymfe. Both matrices are computed in blocks of rows with at most max_block_size entries and
+        are never materialized completely. Products are computed in the data type of N, summaries in float64.
+        :return: (mean, sd) of the absolute correlations and (mean, sd) of the absolute covariances
+        """
+        n, d = N.shape
+        Z = N - N.mean(axis=0)
+        std = np.sqrt(np.einsum('ij,ij->j', Z, Z, dtype=np.float64) / (n - 1))
+
+        # count, mean and sum of squared deviations of absolute correlations and covariances
+        moments = np.zeros((2, 3))
+        block_rows = max(1, max_block_size // d)
+        for start in range(1, d, block_rows):
+            stop = min(start + block_rows, d)
+            # entries (i, j) with start <= i < stop and j < i of the lower triangle
+            cov = (Z[:, start:stop].T @ Z[:, :stop - 1]).astype(np.float64) / (n - 1)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                cor = np.clip(cov / np.outer(std[start:stop], std[:stop - 1]), -1, 1)
+            lower = np.arange(start, stop)[:, None] > np.arange(stop - 1)
+            for i, values in enumerate((np.abs(cor[lower]), np.abs(cov[lower]))):
+                count, mean = values.size, values.mean()
+                delta = mean - moments[i, 1]
+                total = moments[i, 0] + count
+                moments[i, 2] += np.sum((values - mean) ** 2) + delta ** 2 * moments[i, 0] * count / total
+                moments[i, 1] += delta * count / total
+                moments[i, 0] = total
+        return MetaFeatureFactory._mean_sd(*moments[0]), MetaFeatureFactory._mean_sd(*moments[1])
+
+    @staticmethod
+    def _mean_sd(count: int, mean: float, m2: float) -> Tuple[float, float]:
+        return mean, np.sqrt(m2 / (count - 1)) if count > 1 else np.nan
 
+    @staticmethod
+    def _moment_statistics(n: Union[int, np.ndarray], m2: np.ndarray, m3: np.ndarray,
+                           m4: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Skewness, kurtosis and variance from the sums of the 2nd, 3rd and 4th power of the deviations from the mean with
+        the same definitions as in pymfe
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            m2, m3, m4 = m2 / n, m3 / n, m4 / n
+            # bias corrections equivalent to method 3 in pymfe
+            skewness = m3 / m2 ** 1.5 * ((n - 1) / n) ** 1.5
+            kurtosis = m4 / m2 ** 2 * (1 - 1 / n) ** 2 - 3
+            var = m2 * n / (n - 1)
+        return skewness, kurtosis, var
+
+    @staticmethod
+    def _info_theory_sparse(C: sp.csc_matrix, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray, float, float]:
+        """
+        Attribute entropy, mutual information, equivalent number of attributes and noise-signal ratio of sparse
+        discretized data. Frequencies of the zero bin are derived from the number of stored values per attribute.
+        """
+        n, d = C.shape
+        classes, y_idx, class_counts = np.unique(np.asarray(y).ravel(), return_inverse=True, return_counts=True)
+        y_idx = y_idx.ravel()
+        k = classes.size
+        col = MetaFeatureFactory._sparse_columns(C)
+        bins = C.data.astype(np.int64)
+        n_bins = int(bins.max()) + 1 if bins.size > 0 else 1
+
+        def entropy_terms(counts):
+            p = counts / n
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return np.where(counts > 0, -p * np.log2(p), 0)
+
+        keys, counts = np.unique(col * n_bins + bins, return_counts=True)
+        attr_ent = np.bincount(keys // n_bins, weights=entropy_terms(counts), minlength=d) + \
+            entropy_terms(n - np.diff(C.indptr))
+
+        keys, counts = np.unique((col * n_bins + bins) * k + y_idx[C.indices], return_counts=True)
+        zero_counts = class_counts - np.bincount(col * k + y_idx[C.indices], minlength=d * k).reshape(d, k)
+        joint_ent = np.bincount(keys // (n_bins * k), weights=entropy_terms(counts), minlength=d) + \
+            entropy_terms(zero_counts).sum(axis=1)
+
+        class_ent = entropy_terms(class_counts).sum()
+        mut_inf = attr_ent + class_ent - joint_ent
+        return attr_ent, mut_inf, d * class_ent / mut_inf.sum(), (attr_ent.sum() - mut_inf.sum()) / mut_inf.sum()
+
+    @staticmethod
+    def _model_based(N: np.ndarray, y: np.ndarray, nr_attr: int, random_state: int = 42) -> Dict[str, float]:
+        precomp_model = MFEModelBased.precompute_model_based_class(N, y, random_state=random_state)
+        leaves_branch = MFEModelBased.ft_leaves_branch(precomp_model['dt_model'], precomp_model['leaf_nodes'],
+                                                       precomp_model['dt_node_depths'])
+        leaves_per_class = MFEModelBased.ft_leaves_per_class(precomp_model['dt_model'], precomp_model['dt_info_table'])
+        var_importance = MFEModelBased.ft_var_importance(precomp_model['dt_model'])
+
+        return {
             'nodes': float(MFEModelBased.ft_nodes(precomp_model['dt_model'])),
             'leaves': float(MFEModelBased.ft_leaves(precomp_model['dt_model'])),
             'leaves_branch_mean': float(leaves_branch.mean()),
@@ -221,13 +815,277 @@ class MetaFeatureFactory(object):
             'leaves_per_class_sd': float(leaves_per_class.std(ddof=1)) if not np.isnan(
                 leaves_per_class).any() and leaves_per_class.size > 1 else 0,
             'var_importance_mean': float(var_importance.mean()),
-            'var_importance_sd': float(var_importance.std(ddof=1)) if nr_attr > 1 else 0,
+            'var_importance_sd': float(var_importance.std(ddof=1)) if nr_attr > 1 else 0
+        }
+
+    @staticmethod
+    def _landmarking(N: np.ndarray, y: np.ndarray, random_state: int = 42, max_rows: int = None,
+                     n_folds: int = 5, max_dense_attr: int = 100) -> Dict[str, float]:
+        """
+        Accuracy of simple learners in a stratified cross-validation. All learners use the same folds and the same
+        standardized data. If N contains more than max_rows samples, a stratified subsample is used.
 
-            'one_nn_mean': 0, 'one_nn_sd': 0,
-            'best_node_mean': 0, 'best_node_sd': 0,
-            'linear_discr_mean': 0, 'linear_discr_sd': 0,
-            'naive_bayes_mean': 0, 'naive_bayes_sd': 0
+        Sparse data is only scaled to preserve the sparsity. LDA and naive Bayes do not support sparse data, they are
+        trained on a truncated SVD with max_dense_attr components instead. Dense data with more than max_dense_attr
+        attributes is projected the same way for all learners, otherwise fitting the learners, especially LDA, dominates
+        the runtime on wide data sets.
+        """
+        rs = np.random.RandomState(random_state)
+        y = np.asarray(y).ravel()
+        if max_rows is not None and N.shape[0] > max_rows:
+            idx = MetaFeatureFactory._stratified_sample(y, max_rows, rs)
+            N, y = N[idx], y[idx]
+
+        if sp.issparse(N):
+            mean = np.asarray(N.mean(axis=0)).ravel()
+            std = np.sqrt(np.maximum(np.asarray(N.multiply(N).mean(axis=0)).ravel() - mean ** 2, 0))
+            std[std == 0] = 1
+            Z = sp.csr_matrix(N.multiply(1 / std))
+            if Z.shape[1] > max_dense_attr:
+                Z_dense = TruncatedSVD(max_dense_attr, random_state=random_state).fit_transform(Z)
+            else:
+                Z_dense = Z.toarray()
+        else:
+            mean = N.mean(axis=0)
+            std = N.std(axis=0)
+            std[std == 0] = 1
+            Z = Z_dense = (N - mean) / std
+            if Z.shape[1] > max_dense_attr:
+                Z = Z_dense = TruncatedSVD(max_dense_attr, random_state=random_state).fit_transform(Z)
+
+        min_count = np.unique(y, return_counts=True)[1].min()
+        if min_count >= 2:
+            cv = StratifiedKFold(n_splits=min(n_folds, min_count), shuffle=True, random_state=random_state)
+        else:
+            cv = KFold(n_splits=min(n_folds, y.size), shuffle=True, random_state=random_state)
+        folds = list(cv.split(Z, y))
+
+        learners = {
+            # 'auto' selects a tree based index for low-dimensional and chunked brute force search for dense or
+            # sparse data
+            'one_nn': (KNeighborsClassifier(n_neighbors=1, algorithm='auto'), Z),
+            'best_node': (DecisionTreeClassifier(max_depth=1, random_state=random_state), Z),
+            'linear_discr': (LinearDiscriminantAnalysis(), Z_dense),
+            'naive_bayes': (GaussianNB(), Z_dense)
         }
+        res = {}
+        for name, (learner, data) in learners.items():
+            scores = np.array([MetaFeatureFactory._score_fold(learner, data, y, train, test) for train, test in folds])
+            res[f'{name}_mean'] = float(scores.mean())
+            res[f'{name}_sd'] = float(scores.std(ddof=1)) if scores.size > 1 else 0
+        return res
+
+    @staticmethod
+    def _score_fold(learner, Z: np.ndarray, y: np.ndarray, train: np.ndarray, test: np.ndarray) -> float:
+        classes, counts = np.unique(y[train], return_counts=True)
+        if classes.size == 1 or (isinstance(learner, LinearDiscriminantAnalysis) and train.size <= classes.size):
+            # learners require at least two classes, LDA also more samples than classes. Use the majority class instead
+            return float(np.mean(y[test] == classes[np.argmax(counts)]))
+        learner.fit(Z[train], y[train])
+        return float(np.mean(learner.predict(Z[test]) == y[test]))
+
+    @staticmethod
+    def _merge(general: Dict[str, float], *groups: Dict[str, float]) -> Dict[str, float]:
+        values = dict(general)
+        for group in groups:
+            values.update(group)
+        return {key: values[key] for key in MetaFeatureFactory.FEATURES if key in values}
+
+    @classmethod
+    def _fill_missing_values(cls, X: pd.DataFrame, missing: np.ndarray, numeric: pd.Index, max_nan_percentage: float,
+                             rs: np.random.RandomState) -> pd.DataFrame:
+        """
+        Replaces missing values by random samples from the distribution of each column. Numeric columns are sampled from
+        a normal distribution, categorical columns from the observed frequencies. Columns with more than
+        max_nan_percentage missing values are removed. Random numbers are drawn once for each run of consecutive numeric
+        or categorical columns in the same order as sampling each column individually, so results are reproducible.
+        """
+        n = X.shape[0]
+        nan_count = missing.sum(axis=0)
+        nan_percentage = nan_count / max(n, 1)
+        drop = X.columns[nan_percentage > max_nan_percentage]
+        fill = np.flatnonzero((nan_count > 0) & (nan_percentage <= max_nan_percentage))
+        is_numeric = X.columns[fill].isin(numeric)
+
+        start = 0
+        while start < len(fill):
+            end = start + 1
+            while end < len(fill) and is_numeric[end] == is_numeric[start]:
+                end += 1
+            positions = fill[start:end]
+            if is_numeric[start]:
+                cls._fill_numeric(X, missing, positions, rs)
+            else:
+                cls._fill_categorical(X, missing, positions, rs)
+            start = end
+
+        return X.drop(columns=drop)
+
+    @classmethod
+    def _fill_numeric(cls, X: pd.DataFrame, missing: np.ndarray, positions: np.ndarray, rs: np.random.RandomState):
+        columns = X.columns[positions]
+        block = X[columns]
+        mean = block.mean().to_numpy(dtype=float)
+        std = block.std().to_numpy(dtype=float)
+
+        # equivalent to calling rs.normal(mean[i], std[i], n) for each column
+        gauss = rs.standard_normal(len(columns) * X.shape[0]).reshape(len(columns), X.shape[0]).T
+        filler = mean + std * gauss
+        X[columns] = np.where(missing[:, positions], filler, block.to_numpy(dtype=float))
+
+    @classmethod
+    def _fill_categorical(cls, X: pd.DataFrame, missing: np.ndarray, positions: np.ndarray,
+                          rs: np.random.RandomState):
+        # equivalent to calling rs.choice(items, n, p=probability) for each column
+        uniform = rs.random_sample(len(positions) * X.shape[0]).reshape(len(positions), X.shape[0])
+        for j, column in enumerate(X.columns[positions]):
+            col = X[column]
+            items = np.asarray(col.dropna().unique())
+            probability = col.value_counts(dropna=True, normalize=True)
+            cdf = probability[probability > 0].to_numpy(dtype=float).cumsum()
+            cdf /= cdf[-1]
+            filler = items[cdf.searchsorted(uniform[j], side='right')]
+            X[column] = col.combine_first(pd.Series(filler, index=X.index))
+
+    @classmethod
+    def _drop_constant_columns(cls, X: pd.DataFrame, numeric: pd.Index) -> pd.DataFrame:
+        if X.shape[0] == 0:
+            return X
+
+        constant = []
+        by_dtype = {}
+        for column, dtype in X.dtypes.items():
+            if column in numeric:
+                by_dtype.setdefault(dtype, []).append(column)
+        for columns in by_dtype.values():
+            N = X[columns].to_numpy()
+            is_constant = ~(np.abs(N - N[0]) > 1e-7).any(axis=0) | (~np.isfinite(N)).all(axis=0)
+            constant.extend(np.asarray(columns)[is_constant])
+
+        categorical = [column for column in X.columns if column not in numeric]
+        if len(categorical) > 0:
+            C = X[categorical].to_numpy(dtype=object)
+            is_constant = ~(C != C[0]).any(axis=0)
+            constant.extend(np.asarray(categorical, dtype=object)[is_constant])
+
+        return X.drop(columns=constant)
+
+    @classmethod
+    def _sparse_columns(cls, X: sp.csc_matrix) -> np.ndarray:
+        return np.repeat(np.arange(X.shape[1]), np.diff(X.indptr))
+
+    @classmethod
+    def _sparse_missing(cls, X: sp.csc_matrix) -> sp.csc_matrix:
+        nan = np.isnan(X.data)
+        return sp.csc_matrix((np.ones(nan.sum(), dtype=bool), (X.indices[nan], cls._sparse_columns(X)[nan])),
+                             shape=X.shape)
+
+    @classmethod
+    def _sparse_min_max(cls, X: sp.csc_matrix) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Minimum and maximum of each column ignoring missing values. Columns with implicit zeros include 0.
+        """
+        v_min = np.full(X.shape[1], np.nan)
+        v_max = np.full(X.shape[1], np.nan)
+        stored = np.diff(X.indptr)
+        non_empty = stored > 0
+        if X.data.size > 0:
+            v_min[non_empty] = np.fmin.reduceat(X.data, X.indptr[:-1][non_empty])
+            v_max[non_empty] = np.fmax.reduceat(X.data, X.indptr[:-1][non_empty])
+        has_zeros = stored < X.shape[0]
+        v_min[has_zeros] = np.fmin(v_min[has_zeros], 0)
+        v_max[has_zeros] = np.fmax(v_max[has_zeros], 0)
+        return v_min, v_max
+
+    @classmethod
+    def _fill_sparse(cls, X: sp.csc_matrix, nan_count: np.ndarray, rs: np.random.RandomState) -> sp.csc_matrix:
+        """
+        Replaces stored missing values by samples from a normal distribution of each column including implicit zeros.
+        """
+        nan = np.isnan(X.data)
+        if not nan.any():
+            return X
+        col = cls._sparse_columns(X)
+        observed = X.shape[0] - nan_count
+        data = np.where(nan, 0, X.data)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = np.bincount(col, weights=data, minlength=X.shape[1]) / observed
+            centered = np.where(nan, 0, X.data - mean[col])
+            sq = np.bincount(col, weights=centered ** 2, minlength=X.shape[1]) + \
+                (observed - (np.diff(X.indptr) - nan_count)) * mean ** 2
+            std = np.sqrt(sq / (observed - 1))
+        X.data[nan] = mean[col[nan]] + std[col[nan]] * rs.standard_normal(nan.sum())
+        return X
+
+    @classmethod
+    def _discretize_sparse(cls, N: sp.csc_matrix) -> sp.csc_matrix:
+        """
+        Equal frequency discretization of the stored values of each column. Implicit zeros form a separate bin 0, so
+        the result has the same sparsity structure as N.
+        """
+        num_bins = max(1, int(N.shape[0] ** (1 / 3)))
+        col = cls._sparse_columns(N)
+        order = np.lexsort((N.data, col))
+        values, sorted_col = N.data[order], col[order]
+
+        # identical values are assigned to the bin of their first occurrence
+        start = np.ones(values.size, dtype=bool)
+        start[1:] = (values[1:] != values[:-1]) | (sorted_col[1:] != sorted_col[:-1])
+        rank = np.maximum.accumulate(np.where(start, np.arange(values.size), 0)) - N.indptr[sorted_col]
+        stored = np.diff(N.indptr)[sorted_col]
+
+        bins = np.empty(values.size, dtype=np.int64)
+        bins[order] = np.minimum(rank * num_bins // stored, num_bins - 1) + 1
+        return sp.csc_matrix((bins, N.indices.copy(), N.indptr.copy()), shape=N.shape)
+
+    @classmethod
+    def _sparse_percentiles(cls, values: np.ndarray, indptr: np.ndarray, n: int, q: Tuple[float, ...]) -> np.ndarray:
+        """
+        Linear interpolated percentiles of each column like np.percentile. values contains the stored values of each
+        column in ascending order, all remaining entries are implicit zeros.
+        """
+        start = indptr[:-1]
+        stored = np.diff(indptr)
+        negative = np.add.reduceat(np.append(values < 0, False), start) if values.size > 0 else np.zeros_like(stored)
+        negative = np.where(stored > 0, negative, 0)
+        zeros = n - stored
+
+        def value_at(i):
+            # i-th smallest value of each column including implicit zeros
+            pos = np.where(i < negative, i, i - zeros)
+            is_zero = (i >= negative) & (i < negative + zeros)
+            idx = np.clip(start + pos, 0, max(values.size - 1, 0))
+            return np.where(is_zero, 0, values[idx] if values.size > 0 else 0)
+
+        res = []
+        for p in q:
+            pos = (n - 1) * p / 100
+            lower, upper = int(np.floor(pos)), int(np.ceil(pos))
+            low = value_at(np.full(stored.size, lower))
+            high = value_at(np.full(stored.size, upper))
+            res.append(low + (high - low) * (pos - lower))
+        return np.array(res)
+
+    @classmethod
+    def _stratified_sample(cls, y: np.ndarray, sample_size: int, rs: np.random.RandomState) -> np.ndarray:
+        """
+        Selects sample_size indices preserving the class distribution. Each class is represented by at least one sample.
+        """
+        _, y_idx, counts = np.unique(np.asarray(y), return_inverse=True, return_counts=True)
+        allocation = np.minimum(counts, np.maximum(1, np.floor(counts * sample_size / y_idx.size))).astype(int)
+
+        order = np.argsort(y_idx.ravel(), kind='stable')
+        groups = np.split(order, np.cumsum(counts)[:-1])
+        idx = np.concatenate([rs.choice(group, k, replace=False) for group, k in zip(groups, allocation)])
+        return np.sort(idx)
+
+    @classmethod
+    def _estimated_features(cls, mf: Dict[str, float], estimated: bool, landmarking_rows: Optional[int]) -> List[str]:
+        if estimated:
+            return [key for key in mf.keys() if key not in cls.EXACT_FEATURES]
+        if landmarking_rows is not None and mf['nr_inst'] > landmarking_rows:
+            return list(cls.LANDMARKING_FEATURES)
+        return []
 
     @classmethod
     def ft_nr_missing_val(cls, M):
@@ -262,14 +1120,51 @@ class MetaFeatureFactory(object):
     def _set_data_numeric(
             cls,
             N, C,
-            transform_cat: bool) -> np.ndarray:
+            transform_cat: bool,
+            dtype: type = np.float64) -> np.ndarray:
         data_num = N
 
         if transform_cat and not C.empty:
-            categorical_dummies = pd.get_dummies(C)
+            # dummies are created as uint8 to avoid allocating them in full precision before merging
+            categorical_dummies = pd.get_dummies(C) if dtype == np.float64 else pd.get_dummies(C, dtype=np.uint8)
 
             if categorical_dummies is not None:
                 data_num = pd.concat([data_num, categorical_dummies],
-                                     axis=1).astype(float)
+                                     axis=1).astype(dtype)
 
         return data_num.to_numpy()
+
+
+class LazyMetaFeatures(Mapping):
+    """
+    Read-only mapping of meta-features that are calculated on first access via MetaFeatureFactory.calculate_selected.
+    Accessing a single meta-feature calculates its complete group. Can be passed to
+    ComponentChoice.get_available_components instead of the full meta-feature dict to only calculate the general
+    meta-features.
+    """
+
+    def __init__(self, X: Union[np.ndarray, pynisher.SharedData], y: Union[np.ndarray, pynisher.SharedData], **kwargs):
+        """
+        :param kwargs: additional arguments passed to MetaFeatureFactory.calculate_selected
+        """
+        self.X = X
+        self.y = y
+        self.kwargs = kwargs
+        self._values: Dict[str, float] = {}
+
+    def __getitem__(self, key: str) -> float:
+        if key not in self._values:
+            group = next((names for names in MetaFeatureFactory.GROUPS.values() if key in names), None)
+            if group is None:
+                raise KeyError(key)
+            res = MetaFeatureFactory.calculate_selected(self.X, self.y, group, **self.kwargs)
+            if res is None:
+                raise ValueError(f'Failed to calculate meta-feature {key}')
+            self._values.update(res)
+        return self._values[key]
+
+    def __iter__(self):
+        return iter(MetaFeatureFactory.FEATURES)
+
+    def __len__(self) -> int:
+        return len(MetaFeatureFactory.FEATURES)
@@ -0,0 +1,158 @@
+import hashlib
+import importlib
+import importlib.util
+import inspect
+import json
+import os
+import pkgutil
+from collections import OrderedDict
+from typing import Dict, Type, Union, Optional, List
+
+# name of the manifest file in each component package
+MANIFEST = 'components.json'
+# has to be increased whenever the manifest format changes
+MANIFEST_VERSION = 1
+
+
+class LazyComponent(object):
+    """
+    Placeholder for a component class listed in a manifest. Properties and the name are read from the manifest, the
+    component module is only imported on first instantiation or when accessing any other attribute of the class. As
+    the placeholder is not a class, use resolve_components to obtain the actual classes, e.g. for issubclass.
+    """
+
+    def __init__(self, module: str, class_name: str, properties: Dict, choice: bool = False):
+        self.__name__ = class_name
+        self.__qualname__ = class_name
+        self.__module__ = module
+        self._module = module
+        self._class_name = class_name
+        self._properties = properties
+        self._choice = choice
+        self._class: Optional[Type] = None
+
+    def load(self) -> Type:
+        if self._class is None:
+            self._class = getattr(importlib.import_module(self._module), self._class_name)
+        return self._class
+
+    def get_properties(self) -> Dict:
+        return dict(self._properties)
+
+    def name(self, short: bool = False) -> str:
+        return self._class_name if short else '.'.join([self._module, self._class_name])
+
+    def __call__(self, *args, **kwargs):
+        return self.load()(*args, **kwargs)
+
+    def __getattr__(self, item: str):
+        # prevents importing the module when ComponentChoice.get_available_components checks for nested choices
+        if item.startswith('__') or (item == 'get_components' and not self._choice):
+            raise AttributeError(item)
+        return getattr(self.load(), item)
+
+    def __repr__(self):
+        return f'LazyComponent({self._module}.{self._class_name})'
+
+
+def load_components(package: str, directory: str, base_class: Type) -> Dict[str, Union[Type, LazyComponent]]:
+    """
+    Lazy counterpart of find_components. All modules listed in the manifest of directory are represented by a
+    LazyComponent. Modules that are missing in the manifest or have changed since the manifest was generated are
+    imported and inspected directly. Without a manifest, all modules are imported like in find_components.
+    """
+    manifest = _read_manifest(directory)
+    components = OrderedDict()
+    for module_name in _modules(directory):
+        entry = manifest.get(module_name)
+        if entry is None or entry['digest'] != _digest(directory, module_name, entry['digest']):
+            clazz = _find_class(package, module_name, base_class)
+            if clazz is not None:
+                components[module_name] = clazz
+        elif entry['class'] is not None:
+            components[module_name] = LazyComponent(f'{package}.{module_name}', entry['class'], entry['properties'],
+                                                    entry['choice'])
+    return components
+
+
+def resolve_components(components: Dict[str, Union[Type, LazyComponent]]) -> Dict[str, Type]:
+    """
+    Replaces all LazyComponents by the component classes they represent, importing the according modules.
+    """
+    return OrderedDict((name, component.load() if isinstance(component, LazyComponent) else component)
+                       for name, component in components.items())
+
+
+def write_manifest(package: str, directory: str, base_class: Type) -> Dict[str, Dict]:
+    """
+    Imports all component modules in directory and stores their names, classes and properties in the manifest. Has to
+    be called again after adding a component or changing its properties.
+    """
+    manifest = OrderedDict()
+    for module_name in _modules(directory):
+        clazz = _find_class(package, module_name, base_class)
+        if clazz is None:
+            manifest[module_name] = {'class': None}
+        else:
+            manifest[module_name] = {'class': clazz.__name__, 'properties': clazz.get_properties(),
+                                     'choice': hasattr(clazz, 'get_components')}
+        manifest[module_name]['digest'] = _digest(directory, module_name)
+
+    with open(os.path.join(directory, MANIFEST), 'w') as fh:
+        json.dump({'version': MANIFEST_VERSION, 'components': manifest}, fh, indent=2)
+        fh.write('\n')
+    return manifest
+
+
+def component_modules(package: str) -> List[str]:
+    """
+    Returns the full names of all modules in a component package without importing them.
+    """
+    spec = importlib.util.find_spec(package)
+    if spec is None or spec.submodule_search_locations is None:
+        return []
+    return [f'{package}.{module_name}' for directory in spec.submodule_search_locations
+            for module_name in _modules(directory)]
+
+
+def _modules(directory: str):
+    return [module_name for _, module_name, ispkg in pkgutil.iter_modules([directory]) if not ispkg]
+
+
+def _read_manifest(directory: str) -> Dict[str, Dict]:
+    try:
+        with open(os.path.join(directory, MANIFEST)) as fh:
+            content = json.load(fh)
+    except (OSError, ValueError):
+        return {}
+    if content.get('version') != MANIFEST_VERSION:
+        return {}
+    return content['components']
+
+
+def _digest(directory: str, module_name: str, default: str = None) -> str:
+    try:
+        with open(os.path.join(directory, f'{module_name}.py'), 'rb') as fh:
+            return hashlib.sha1(fh.read()).hexdigest()
+    except OSError:
+        # installations without sources can only rely on the manifest
+        return default
+
+
+def _find_class(package: str, module_name: str, base_class: Type) -> Optional[Type]:
+    # same selection as in find_components
+    module = importlib.import_module(f'{package}.{module_name}')
+    clazz = None
+    for _, obj in inspect.getmembers(module):
+        if inspect.isclass(obj) and issubclass(obj, base_class) and obj != base_class:
+            clazz = obj
+    return clazz
+
+
+if __name__ == '__main__':
+    from dswizard.components.base import PredictionAlgorithm, PreprocessingAlgorithm
+
+    root = os.path.dirname(__file__)
+    for subpackage, base in (('classification', PredictionAlgorithm), ('data_preprocessing', PreprocessingAlgorithm),
+                             ('feature_preprocessing', PreprocessingAlgorithm)):
+        write_manifest(f'dswizard.components.{subpackage}', os.path.join(root, subpackage), base)
@@ -0,0 +1,173 @@
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Union, Tuple
+
+import numpy as np
+import pandas as pd
+
+NUMERIC = 'numeric'
+CATEGORICAL = 'categorical'
+BOOLEAN = 'boolean'
+MISSING = 'missing'
+
+# inferred pandas types of object columns that are numeric
+_NUMERIC_TYPES = {'integer', 'floating', 'mixed-integer-float', 'decimal'}
+
+
+class Schema(object):
+    """
+    Type of each column of a data set. Columns are either numeric, categorical, boolean or contain only missing values.
+    Numeric values stored as strings or Python objects are numeric as well.
+    """
+
+    def __init__(self, types: np.ndarray, convert: np.ndarray):
+        """
+        :param types: type of each column
+        :param convert: columns that have to be converted via pd.to_numeric to obtain numeric values
+        """
+        self.types = types
+        self.convert = convert
+
+    @property
+    def numeric(self) -> np.ndarray:
+        return self.types == NUMERIC
+
+    @property
+    def categorical(self) -> np.ndarray:
+        return self.types == CATEGORICAL
+
+    @property
+    def boolean(self) -> np.ndarray:
+        return self.types == BOOLEAN
+
+    @property
+    def missing(self) -> np.ndarray:
+        return self.types == MISSING
+
+    @property
+    def nominal(self) -> np.ndarray:
+        """
+        Columns that have to be encoded before using them in numeric algorithms, i.e. categorical and boolean columns
+        """
+        return self.categorical | self.boolean
+
+    def apply(self, X: Union[np.ndarray, pd.DataFrame], copy: bool = False) -> pd.DataFrame:
+        """
+        Returns X as DataFrame with numeric dtypes for all numeric and all-missing columns. Columns of numpy arrays are
+        labeled by their position. X itself is never modified. Converted columns are new arrays, all other columns
+        share the memory of X unless copy is set.
+        :param copy: copy all columns. Required if the returned DataFrame is modified in-place
+        """
+        if X.shape[1] != self.types.size:
+            raise ValueError(f'Expected {self.types.size} columns but X contains {X.shape[1]}')
+        # a shallow copy is sufficient to replace converted columns without affecting X
+        df = pd.DataFrame(X, copy=copy) if isinstance(X, np.ndarray) else X.copy(deep=copy)
+        for i in np.flatnonzero(self.convert):
+            df[df.columns[i]] = pd.to_numeric(df.iloc[:, i].infer_objects())
+        return df
+
+    def __repr__(self):
+        return f'Schema({list(self.types)})'
+
+
+def infer_schema(X: Union[np.ndarray, pd.DataFrame], cache: bool = True) -> Schema:
+    """
+    Infers the type of each column.
+    :param cache: reuse the schema of previous calls with the same array or DataFrame object. The cache is based on the
+    identity of X, so X must not be modified in-place between calls. Callers that can not guarantee this, e.g.
+    preprocessors receiving arbitrary user data, have to disable the cache
+    """
+    return _cache.get(X) if cache else _infer(X)
+
+
+def _infer(X: Union[np.ndarray, pd.DataFrame]) -> Schema:
+    df = pd.DataFrame(X) if isinstance(X, np.ndarray) else X
+    n_columns = df.shape[1]
+    types = np.full(n_columns, CATEGORICAL, dtype=object)
+    convert = np.zeros(n_columns, dtype=bool)
+    if n_columns == 0:
+        return Schema(types, convert)
+
+    if isinstance(X, np.ndarray) and X.dtype.kind in 'iuf':
+        # homogeneous numeric arrays do not require a column wise inspection
+        types[:] = NUMERIC
+        types[~df.notna().to_numpy().any(axis=0)] = MISSING
+        return Schema(types, convert)
+
+    observed = df.notna().to_numpy().any(axis=0)
+    candidates = []
+    for i, dtype in enumerate(df.dtypes):
+        if not observed[i]:
+            types[i] = MISSING
+            convert[i] = not pd.api.types.is_numeric_dtype(dtype) or pd.api.types.is_bool_dtype(dtype)
+        elif pd.api.types.is_bool_dtype(dtype):
+            types[i] = BOOLEAN
+        elif pd.api.types.is_numeric_dtype(dtype):
+            types[i] = NUMERIC
+        elif isinstance(dtype, pd.CategoricalDtype):
+            types[i] = CATEGORICAL
+        else:
+            inferred = pd.api.types.infer_dtype(df.iloc[:, i], skipna=True)
+            if inferred == 'boolean':
+                types[i] = BOOLEAN
+            elif inferred in _NUMERIC_TYPES:
+                types[i] = NUMERIC
+                convert[i] = True
+            elif inferred in ('string', 'mixed', 'mixed-integer'):
+                candidates.append(i)
+
+    # columns are numeric if all observed values can be parsed. Parsing invalid values is expensive, therefore
+    # candidates are first checked on the leading rows and only the remaining candidates are checked completely
+    candidates = np.array(candidates, dtype=int)
+    for rows in (slice(0, 100), slice(None)):
+        if candidates.size == 0:
+            break
+        candidates = candidates[_parsable(df.iloc[rows, candidates])]
+    types[candidates] = NUMERIC
+    convert[candidates] = True
+
+    return Schema(types, convert)
+
+
+def _parsable(df: pd.DataFrame) -> np.ndarray:
+    block = df.to_numpy(dtype=object)
+    parsed = pd.to_numeric(pd.Series(block.ravel()), errors='coerce').to_numpy().reshape(block.shape)
+    return (pd.isna(parsed) == pd.isna(block)).all(axis=0)
+
+
+class _SchemaCache(object):
+    """
+    Small LRU cache mapping the identity of arrays and DataFrames to their schema.
+    """
+
+    def __init__(self, max_size: int = 16):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[int, Tuple[weakref.ref, Tuple[int, ...], Schema]]' = OrderedDict()
+
+    def get(self, X: Union[np.ndarray, pd.DataFrame]) -> Schema:
+        key = id(X)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0]() is X and entry[1] == X.shape:
+                self._entries.move_to_end(key)
+                return entry[2]
+
+        schema = _infer(X)
+        try:
+            ref = weakref.ref(X)
+        except TypeError:
+            return schema
+        with self._lock:
+            self._entries[key] = (ref, X.shape, schema)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return schema
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = _SchemaCache()
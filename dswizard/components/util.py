@@ -1,8 +1,11 @@
 # -*- encoding: utf-8 -*-
+import hashlib
 import importlib
 from typing import Optional
 
 import numpy as np
+import pandas as pd
+import scipy.sparse as sp
 
 HANDLES_MULTICLASS = 'handles_multiclass'
 HANDLES_NUMERIC = 'handles_numeric'
@@ -106,3 +109,44 @@ def get_object(clazz: str, kwargs=None):
 
 def object_log(X: np.ndarray):
     return np.log(X.astype(float))
+
+
+def fingerprint(*data, **params) -> str:
+    """
+    Content based hash of numpy arrays, scipy sparse matrices and pandas objects. Data with identical values, dtypes and
+    shapes yields the same fingerprint independent of column names or the index. params are hashed as well.
+    """
+    h = hashlib.blake2b(digest_size=20)
+    for obj in data:
+        _update_fingerprint(h, obj)
+    h.update(repr(sorted(params.items())).encode())
+    return h.hexdigest()
+
+
+def _update_fingerprint(h, obj):
+    if obj is None:
+        h.update(b'None')
+        return
+    if isinstance(obj, pd.DataFrame):
+        h.update(f'DataFrame{obj.shape}'.encode())
+        for _, column in obj.items():
+            _update_fingerprint(h, column)
+        return
+    if sp.issparse(obj):
+        obj = sp.csr_matrix(obj)
+        if not obj.has_canonical_format:
+            obj = obj.copy()
+            obj.sum_duplicates()
+        h.update(f'sparse{obj.shape}'.encode())
+        for array in (obj.data, obj.indices, obj.indptr):
+            _update_fingerprint(h, array)
+        return
+    if isinstance(obj, pd.Series):
+        h.update(str(obj.dtype).encode())
+        obj = obj.to_numpy()
+
+    array = np.asarray(obj)
+    h.update(f'{array.dtype.str}{array.shape}'.encode())
+    if array.dtype.hasobject:
+        array = pd.util.hash_array(array.ravel())
+    h.update(np.ascontiguousarray(array).data)
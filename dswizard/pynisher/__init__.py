@@ -1 +1,5 @@
 from dswizard.pynisher.limit_function_call import *
+from dswizard.pynisher.worker_pool import WorkerPool
+from dswizard.pynisher.shared_data import share, SharedData, SharedArray, SharedFrame
+from dswizard.pynisher.executor import LimitedExecutor, Job, JobResult
+from dswizard.pynisher.telemetry import CallTelemetry
@@ -0,0 +1,193 @@
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import traceback
+from typing import Callable, Set, Dict, Any, Iterator, Iterable, List, Optional
+
+from dswizard.pynisher.limit_function_call import enforce_limits, AnythingException, TimeoutException
+
+
+class Job(object):
+    """
+    A single function call submitted to a LimitedExecutor. limits contains the keyword arguments passed to
+    enforce_limits, e.g. mem_in_mb or wall_time_in_s. The optional deadline is an absolute time.monotonic() value the
+    job has to finish by.
+    """
+
+    def __init__(self, id: int, func: Callable, args: tuple, kwargs: dict, limits: Dict[str, Any], n_cores: int,
+                 deadline: float = None):
+        self.id = id
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.limits = limits
+        self.n_cores = n_cores
+        self.deadline = deadline
+
+
+class JobResult(object):
+    """
+    Outcome of a Job with the same semantics as the attributes of a function wrapped by enforce_limits.
+    """
+
+    def __init__(self, job: Job, result: Any, exit_status: Any, wall_clock_time: float, affinity: Set[int],
+                 partial: bool = False):
+        self.job = job
+        self.result = result
+        self.exit_status = exit_status
+        self.wall_clock_time = wall_clock_time
+        self.affinity = affinity
+        self.partial = partial
+
+    def __repr__(self):
+        return f'JobResult(id={self.job.id}, exit_status={self.exit_status}, wall_clock_time={self.wall_clock_time})'
+
+
+class LimitedExecutor(object):
+    """
+    Executes many resource limited function calls concurrently. Each running job is pinned to a dedicated set of CPU
+    cores via its affinity, the number of concurrent jobs is bounded by the available cores. Results are available via
+    as_completed as soon as a job finishes.
+
+    Jobs without any memory or time limit are executed synchronously by enforce_limits and are therefore not pinned.
+    """
+
+    def __init__(self,
+                 cores: Set[int] = None,
+                 cores_per_job: int = 1,
+                 pool: 'WorkerPool' = None,
+                 logger: logging.Logger = None):
+        """
+        :param cores: CPU cores available for job execution. Defaults to all cores available to this process
+        :param cores_per_job: default number of cores assigned to each job
+        :param pool: optional WorkerPool used to execute all jobs. Should contain at least one worker per concurrent job
+        """
+        self.cores = sorted(os.sched_getaffinity(0) if cores is None else cores)
+        self.cores_per_job = cores_per_job
+        self.pool = pool
+        self.logger = logger if logger is not None else multiprocessing.get_logger()
+
+        self._ids = itertools.count()
+        self._free = set(self.cores)
+        self._condition = threading.Condition()
+        self._pending: List[Job] = []
+        self._running = 0
+        self._results = queue.Queue()
+        self._outstanding = 0
+        self._closed = False
+
+        self._dispatcher = threading.Thread(target=self._dispatch, name='pynisher dispatcher', daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, func: Callable, *args, limits: Dict[str, Any] = None, n_cores: int = None,
+               deadline: float = None, **kwargs) -> Job:
+        """
+        :param deadline: optional time.monotonic() value the job has to finish by. Jobs waiting for free cores get
+        only the time remaining when they are started as wall-clock limit. Jobs started after the deadline are not
+        executed and fail with TimeoutException
+        """
+        n_cores = self.cores_per_job if n_cores is None else n_cores
+        if n_cores > len(self.cores):
+            raise ValueError(f'Job requires {n_cores} cores but only {len(self.cores)} cores are available')
+
+        job = Job(next(self._ids), func, args, kwargs, {} if limits is None else limits, n_cores, deadline)
+        with self._condition:
+            if self._closed:
+                raise ValueError('LimitedExecutor is already shut down')
+            self._pending.append(job)
+            self._outstanding += 1
+            self._condition.notify_all()
+        return job
+
+    def map(self, func: Callable, iterable: Iterable[tuple], limits: Dict[str, Any] = None,
+            n_cores: int = None) -> Iterator[JobResult]:
+        """
+        Submits func once for each tuple of arguments and yields the results in order of completion.
+        """
+        for args in iterable:
+            self.submit(func, *args, limits=limits, n_cores=n_cores)
+        return self.as_completed()
+
+    def as_completed(self, timeout: float = None) -> Iterator[JobResult]:
+        """
+        Yields the results of all submitted jobs as soon as they finish.
+        """
+        while True:
+            with self._condition:
+                if self._outstanding == 0 and self._results.empty():
+                    return
+            res = self._results.get(timeout=timeout)
+            with self._condition:
+                self._outstanding -= 1
+            yield res
+
+    def _dispatch(self):
+        while True:
+            with self._condition:
+                job = self._next_job()
+                while job is None:
+                    if self._closed and len(self._pending) == 0:
+                        return
+                    self._condition.wait()
+                    job = self._next_job()
+
+                affinity = set(sorted(self._free)[:job.n_cores])
+                self._free -= affinity
+                self._running += 1
+
+            threading.Thread(target=self._run, args=(job, affinity), name=f'pynisher job {job.id}',
+                             daemon=True).start()
+
+    def _next_job(self) -> Optional[Job]:
+        # jobs are started in order of submission
+        if len(self._pending) > 0 and self._pending[0].n_cores <= len(self._free):
+            return self._pending.pop(0)
+        return None
+
+    def _run(self, job: Job, affinity: Set[int]):
+        start = time.monotonic()
+        try:
+            limits = dict(job.limits, affinity=affinity, logger=self.logger)
+            if self.pool is not None:
+                limits['pool'] = self.pool
+            if job.deadline is not None:
+                remaining = job.deadline - start
+                wall_time_in_s = limits.get('wall_time_in_s')
+                limits['wall_time_in_s'] = remaining if wall_time_in_s is None else min(wall_time_in_s, remaining)
+
+            if limits.get('wall_time_in_s') is not None and limits['wall_time_in_s'] <= 0:
+                res = JobResult(job, None, TimeoutException, 0, affinity)
+            else:
+                wrapper = enforce_limits(**limits)(job.func)
+                wrapper(*job.args, **job.kwargs)
+                res = JobResult(job, wrapper.result, wrapper.exit_status, wrapper.wall_clock_time, affinity,
+                                wrapper.partial)
+        except Exception as ex:
+            self.logger.exception('Unhandled exception')
+            res = JobResult(job, (ex, traceback.format_exc()), AnythingException, time.monotonic() - start, affinity)
+        finally:
+            with self._condition:
+                self._free |= affinity
+                self._running -= 1
+                self._condition.notify_all()
+        self._results.put(res)
+
+    def shutdown(self, wait: bool = True):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if wait:
+            self._dispatcher.join()
+            with self._condition:
+                while self._running > 0:
+                    self._condition.wait()
+
+    def __enter__(self) -> 'LimitedExecutor':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
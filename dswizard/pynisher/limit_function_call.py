@@ -1,19 +1,28 @@
 #! /bin/python
+import asyncio
+import contextlib
+import functools
 import logging
+import math
 import multiprocessing
 import os
 import resource
 import signal
-import sys
-import tempfile
 import threading
 import time
 import traceback
 from multiprocessing import Process, Pipe
-from typing import Callable, Set
+from typing import Callable, Set, Tuple, Any, Optional, Dict, List
 
 import psutil
 
+from dswizard.pynisher.output import OutputCapture, redirect_output
+from dswizard.pynisher.shared_data import share, resolve_args, dump_result, load_result, discard_result, \
+    OutOfBandResult
+from dswizard.pynisher.threads import thread_budget, limited_threads
+from dswizard.pynisher.telemetry import CallTelemetry, build_telemetry, child_stats, cpu_times
+from dswizard.pynisher.watchdog import MemoryWatchdog, MEM_MODE_RLIMIT, MEM_MODES
+
 
 class CpuTimeoutException(Exception):
     pass
@@ -35,11 +44,102 @@ class AnythingException(Exception):
     pass
 
 
+class PartialResult(object):
+    """
+    Best result computed by a sandboxed function before it exceeded its time limit.
+    """
+
+    def __init__(self, value: Any):
+        self.value = value
+
+
+# callback returning the best result computed so far by the currently running sandboxed function
+_partial_result_callback: Optional[Callable[[], Any]] = None
+
+
+def register_partial_result(callback: Optional[Callable[[], Any]]):
+    """
+    Registers a callback returning the best result computed so far, e.g. a random forest with all trees built so far.
+    Has to be called by the function limited via enforce_limits. If the function exceeds the wall-clock or CPU time
+    limit, the callback is invoked and its return value is returned instead of None. The wrapped function indicates
+    such results via partial. The callback is executed during the grace period, so it should be fast.
+    """
+    global _partial_result_callback
+    _partial_result_callback = callback
+
+
+def collect_partial_result(exit_status: Any) -> Tuple[Any, Any]:
+    if _partial_result_callback is None:
+        return None, exit_status
+    try:
+        return PartialResult(_partial_result_callback()), exit_status
+    except BaseException:
+        # partial results are best effort only
+        return None, exit_status
+
+
+def unwrap_partial_result(result: Any) -> Tuple[Any, bool]:
+    if isinstance(result, PartialResult):
+        return result.value, True
+    return result, False
+
+
+# Maximum time the parent waits for a partial result after the wall-clock limit. The sandboxed process handles its
+# own SIGALRM, so the reply is usually immediate. The wait is part of the grace period, the rest of the grace period
+# is left for stopping the process via SIGTERM
+PARTIAL_RESULT_WAIT_IN_S = 1.
+
+
+# Modules imported once by the fork server instead of in every sandboxed process. Neither sklearn nor the component
+# packages import their submodules, so the sklearn modules used by the components are listed explicitly and all
+# component modules are preloaded as well, see default_preload
+DEFAULT_PRELOAD = ['numpy', 'pandas', 'ConfigSpace', 'pymfe', 'sklearn.cluster', 'sklearn.compose',
+                   'sklearn.decomposition', 'sklearn.discriminant_analysis', 'sklearn.ensemble',
+                   'sklearn.feature_selection', 'sklearn.gaussian_process', 'sklearn.impute', 'sklearn.linear_model',
+                   'sklearn.model_selection', 'sklearn.multiclass', 'sklearn.naive_bayes', 'sklearn.neighbors',
+                   'sklearn.neural_network', 'sklearn.preprocessing', 'sklearn.svm', 'sklearn.tree',
+                   'dswizard.components.meta_features']
+COMPONENT_PACKAGES = ['dswizard.components.classification', 'dswizard.components.data_preprocessing',
+                      'dswizard.components.feature_preprocessing']
+
+
+def default_preload() -> List[str]:
+    """
+    Returns DEFAULT_PRELOAD extended by all component packages and their modules. The modules are only listed, not
+    imported.
+    """
+    from dswizard.components.registry import component_modules
+
+    preload = list(DEFAULT_PRELOAD)
+    for package in COMPONENT_PACKAGES:
+        preload.append(package)
+        preload.extend(component_modules(package))
+    return preload
+
+
+def get_context(start_method: str = None, preload: List[str] = None) -> multiprocessing.context.BaseContext:
+    """
+    Returns the multiprocessing context for the given start method. For 'forkserver', the given modules are imported
+    once in the fork server. Sandboxed processes are forked from the fork server, so they start without re-importing
+    these modules and without inheriting the heap of the calling process. As the fork server is shared by all callers,
+    the preloaded modules can only be configured before the first process is started.
+    """
+    context = multiprocessing.get_context(start_method)
+    if context.get_start_method() == 'forkserver':
+        context.set_forkserver_preload(default_preload() if preload is None else preload)
+    return context
+
+
 class FailsafeProcess(Process):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, start_method: str = None, **kwargs):
         Process.__init__(self, *args, **kwargs)
         self._pconn, self._cconn = Pipe()
         self._exception = None
+        self._start_method = start_method
+
+    def _Popen(self, process_obj):
+        # start the process via the configured start method instead of the global default
+        return multiprocessing.get_context(self._start_method).Process._Popen(process_obj)
 
     def run(self):
         try:
@@ -61,38 +161,107 @@ class FailsafeProcess(Process):
         return self._exception
 
 
+# simple signal handler to catch the signals for time limits
+def signal_handler(signum, frame):
+    if signum == signal.SIGXCPU:
+        # when process reaches soft limit --> a SIGXCPU signal is sent (it normally terminates the process)
+        raise CpuTimeoutException
+    elif signum == signal.SIGALRM:
+        # SIGALRM is sent to process when the specified time limit to an alarm function elapses (real or clock time)
+        raise TimeoutException
+    raise AnythingException
+
+
+def execute(func: Callable, *args, **kwargs) -> Tuple[Any, Any]:
+    """
+    Calls func and maps all possible errors to the according pynisher exit status. Has to be called inside the
+    sandboxed process after all limits have been set.
+    :return: tuple of the return value and the exit status
+    """
+    register_partial_result(None)
+    try:
+        args, kwargs = resolve_args(args, kwargs)
+        return func(*args, **kwargs), 0
+    except MemoryError:
+        return None, MemorylimitException
+
+    except OSError as ex:
+        if ex.errno == 11:
+            return None, SubprocessException
+        else:
+            return (ex, traceback.format_exc()), AnythingException
+
+    except CpuTimeoutException:
+        return collect_partial_result(CpuTimeoutException)
+
+    except TimeoutException:
+        return collect_partial_result(TimeoutException)
+
+    except Exception as ex:
+        return (ex, traceback.format_exc()), AnythingException
+
+    finally:
+        register_partial_result(None)
+
+
+def dump_with_stats(return_value: Tuple[Any, Any], stats: Dict[str, Optional[float]]) -> OutOfBandResult:
+    start = time.monotonic()
+    try:
+        payload = dump_result(return_value)
+    except Exception:
+        if not isinstance(return_value[0], PartialResult):
+            raise
+        payload = dump_result((None, return_value[1]))
+    stats['serialization_time_in_s'] = time.monotonic() - start
+    payload.stats = stats
+    return payload
+
+
+def kill_children():
+    # recursively kill all children
+    p = psutil.Process()
+    for child in p.children(recursive=True):
+        child.kill()
+
+
+def kill_process_group(process: multiprocessing.process.BaseProcess, signum: int):
+    """
+    Sends signum to the process group of a sandboxed process. A process that did not move to its own process group yet,
+    e.g. because it is still starting, shares the group of the caller. Such a process is signalled directly, otherwise
+    the caller would be killed as well.
+    """
+    try:
+        pgid = os.getpgid(process.pid)
+        if pgid != os.getpgid(0):
+            os.killpg(pgid, signum)
+            return
+    except ProcessLookupError:
+        pass
+    if signum == signal.SIGKILL:
+        process.kill()
+    else:
+        process.terminate()
+
+
 # create the function the subprocess can execute
 def subprocess_func(func: Callable,
                     pipe,
                     mem_in_mb: float,
                     cpu_time_limit_in_s: int,
-                    wall_time_limit_in_s: int,
-                    grace_period_in_s: int,
+                    wall_time_limit_in_s: float,
+                    grace_period_in_s: float,
                     affinity: Set[int],
-                    tmp_dir: str,
+                    n_threads: int,
+                    output_conns: tuple,
                     *args, **kwargs):
-    # simple signal handler to catch the signals for time limits
-    def handler(signum, frame):
-        if signum == signal.SIGXCPU:
-            # when process reaches soft limit --> a SIGXCPU signal is sent (it normally terminates the process)
-            raise CpuTimeoutException
-        elif signum == signal.SIGALRM:
-            # SIGALRM is sent to process when the specified time limit to an alarm function elapses (real or clock time)
-            raise TimeoutException
-        raise AnythingException
-
-    # temporary directory to store stdout and stderr
-    if tmp_dir is not None:
-        stdout = open(os.path.join(tmp_dir, 'std.out'), 'a', buffering=1)
-        sys.stdout = stdout
-
-        stderr = open(os.path.join(tmp_dir, 'std.err'), 'a', buffering=1)
-        sys.stderr = stderr
+    # stream stdout and stderr to the parent
+    if output_conns is not None:
+        redirect_output(output_conns)
 
     # catching all signals at this point turned out to interfere with the subprocess (e.g. using ROS)
-    signal.signal(signal.SIGALRM, handler)
-    signal.signal(signal.SIGXCPU, handler)
-    signal.signal(signal.SIGQUIT, handler)
+    signal.signal(signal.SIGALRM, signal_handler)
+    signal.signal(signal.SIGXCPU, signal_handler)
+    signal.signal(signal.SIGQUIT, signal_handler)
 
     # code to catch EVERY catchable signal (even X11 related ones ... )
     # only use for debugging/testing as this seems to be too intrusive.
@@ -113,9 +282,9 @@ def subprocess_func(func: Callable,
         # the maximum area (in bytes) of address space which may be taken by the process.
         resource.setrlimit(resource.RLIMIT_AS, (mem_in_b, mem_in_b))
 
-    # schedule an alarm in specified number of seconds
+    # schedule an alarm in specified number of seconds. In contrast to signal.alarm, fractions of seconds are supported
     if wall_time_limit_in_s is not None:
-        signal.alarm(wall_time_limit_in_s)
+        signal.setitimer(signal.ITIMER_REAL, wall_time_limit_in_s)
 
     if cpu_time_limit_in_s is not None:
         # From the Linux man page:
@@ -125,64 +294,129 @@ def subprocess_func(func: Callable,
         # to the main program. If the process continues to consume CPU time,
         # it will be sent SIGXCPU once per second until the hard limit is reached,
         # at which time it is sent SIGKILL.
-        resource.setrlimit(resource.RLIMIT_CPU, (cpu_time_limit_in_s, cpu_time_limit_in_s + grace_period_in_s))
+        resource.setrlimit(resource.RLIMIT_CPU,
+                           (cpu_time_limit_in_s, cpu_time_limit_in_s + int(math.ceil(grace_period_in_s))))
 
     if affinity is not None:
         os.sched_setaffinity(0, affinity)
 
     os.setsid()
     # the actual function call
+    started = time.monotonic()
+    return_value = None, AnythingException
     try:
-        return_value = (func(*args, **kwargs), 0)
-    except MemoryError:
-        return_value = (None, MemorylimitException)
-
-    except OSError as ex:
-        if ex.errno == 11:
-            return_value = (None, SubprocessException)
-        else:
-            return_value = ((ex, traceback.format_exc()), AnythingException)
-
-    except CpuTimeoutException:
-        return_value = (None, CpuTimeoutException)
-
-    except TimeoutException:
-        return_value = (None, TimeoutException)
-
-    except Exception as ex:
-        return_value = ((ex, traceback.format_exc()), AnythingException)
-
+        with limited_threads(n_threads):
+            return_value = execute(func, *args, **kwargs)
+    except (CpuTimeoutException, TimeoutException) as ex:
+        # limit exceeded outside of the function call
+        return_value = None, type(ex)
     finally:
         try:
-            pipe.send(return_value)
+            pipe.send(dump_with_stats(return_value, child_stats(started)))
             pipe.close()
 
         except:
             # this part should only fail if the parent process is already dead, so there is not much to do anymore :)
             pass
         finally:
-            # recursively kill all children
-            p = psutil.Process()
-            for child in p.children(recursive=True):
-                child.kill()
+            kill_children()
+
+
+async def wait_readable(fd: int, timeout: Optional[float]) -> bool:
+    """
+    Waits via the running event loop until fd becomes readable.
+    :return: False if the timeout expired before
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def callback():
+        if not future.done():
+            future.set_result(True)
+
+    loop.add_reader(fd, callback)
+    try:
+        return await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        loop.remove_reader(fd)
 
 
 class enforce_limits(object):
     def __init__(self,
                  mem_in_mb: float = None,
                  cpu_time_in_s: int = None,
-                 wall_time_in_s: int = None,
-                 grace_period_in_s: int = None,
+                 wall_time_in_s: float = None,
+                 grace_period_in_s: float = None,
                  affinity: Set[int] = None,
                  logger: logging.Logger = None,
-                 capture_output: bool = False):
+                 capture_output: bool = False,
+                 pool: 'WorkerPool' = None,
+                 share_args: bool = False,
+                 mem_mode: str = MEM_MODE_RLIMIT,
+                 mem_interval_in_s: float = 0.1,
+                 telemetry_sink: str = None,
+                 start_method: str = None,
+                 preload: List[str] = None,
+                 max_output_in_kb: float = 1024,
+                 output_callback: Callable[[str, str], None] = None,
+                 n_threads: int = None):
+        """
+        :param pool: optional pool of persistent workers. If provided, function calls are executed in an already
+        running worker instead of a freshly spawned process. Output capturing is not supported by pools.
+        :param share_args: place numpy arrays and pandas objects passed as arguments in shared memory for the duration
+        of a single call. The sandboxed function receives read-only views. To reuse the same buffers for multiple
+        calls, pass handles created via pynisher.share instead.
+        :param mem_mode: how the memory limit is enforced. 'rlimit' limits the virtual address space via RLIMIT_AS.
+        'rss' and 'pss' sample the resident memory of the complete process tree every mem_interval_in_s seconds and
+        kill it if the limit is exceeded. The peak memory usage is available via peak_memory_in_mb.
+        :param mem_interval_in_s: sampling interval of the memory usage for mem_mode 'rss' and 'pss'
+        :param telemetry_sink: optional path to a JSONL file. The telemetry of each function call is appended to it
+        :param start_method: multiprocessing start method used for the sandboxed process, defaults to the global
+        default. With 'spawn' or 'forkserver', the sandboxed process does not inherit the heap of the caller but the
+        function and all arguments have to be pickleable.
+        :param preload: modules imported once by the fork server for start_method 'forkserver'. Defaults to all
+        component modules and their dependencies
+        :param max_output_in_kb: only the last max_output_in_kb kilobytes of stdout and stderr are retained if
+        capture_output is set
+        :param output_callback: optional callback invoked with the stream name ('stdout' or 'stderr') and each line
+        printed by the sandboxed process while it is still running. Implies capture_output
+        :param n_threads: maximum number of threads used by BLAS and OpenMP thread pools in the sandboxed process.
+        Defaults to the number of cores in affinity to prevent oversubscription of concurrently running calls
+        """
+        if mem_mode not in MEM_MODES:
+            raise ValueError(f'Unknown memory mode {mem_mode}. Expected one of {MEM_MODES}')
+        capture_output = capture_output or output_callback is not None
+        if pool is not None and capture_output:
+            raise ValueError('Capturing the output is not supported in combination with a WorkerPool')
         self.mem_in_mb = mem_in_mb
         self.cpu_time_in_s = cpu_time_in_s
         self.wall_time_in_s = wall_time_in_s
         self.grace_period_in_s = 0 if grace_period_in_s is None else grace_period_in_s
         self.affinity = affinity
+        self.n_threads = n_threads
         self.logger = logger if logger is not None else multiprocessing.get_logger()
         self.capture_output = capture_output
+        self.max_output_in_kb = max_output_in_kb
+        self.output_callback = output_callback
+        self.pool = pool
+        self.share_args = share_args
+        self.mem_mode = mem_mode
+        self.mem_interval_in_s = mem_interval_in_s
+        self.telemetry_sink = telemetry_sink
+        self.start_method = start_method
+        if pool is None and start_method is not None:
+            get_context(start_method, preload)
+
+    @property
+    def rlimit_mem_in_mb(self) -> Optional[float]:
+        # memory limit enforced inside the sandboxed process
+        return self.mem_in_mb if self.mem_mode == MEM_MODE_RLIMIT else None
+
+    @property
+    def thread_budget(self) -> Optional[int]:
+        return thread_budget(self.n_threads, self.affinity)
 
     def __call__(self, func):
 
@@ -194,12 +428,18 @@ class enforce_limits(object):
             def _reset_attributes(self2):
                 self2.result = None
                 self2.exit_status = None
+                self2.partial = False
                 self2.resources_function = None
                 self2.resources_pynisher = None
                 self2.wall_clock_time = None
+                self2.peak_memory_in_mb = None
+                self2.telemetry: Optional[CallTelemetry] = None
                 self2.stdout = None
                 self2.stderr = None
 
+                self2._stats = None
+                self2._deserialization_time = None
+
                 self2.default_handlers = {
                     signal.SIGINT: signal.getsignal(signal.SIGINT),
                     signal.SIGTERM: signal.getsignal(signal.SIGTERM)
@@ -210,45 +450,174 @@ class enforce_limits(object):
                 self2._reset_attributes()
 
                 # Synchronous shunt if no real limitations are provided
-                if (self.mem_in_mb is None or self.mem_in_mb <= 0) and \
-                        (self.cpu_time_in_s is None or self.cpu_time_in_s <= 0) and \
-                        (self.wall_time_in_s is None or self.wall_time_in_s <= 0):
+                if self2._unlimited():
+                    return self2._call_unlimited(*args, **kwargs)
+
+                with self2._shared_args(args, kwargs) as (args, kwargs):
+                    if self.pool is not None:
+                        return self2._call_pool(*args, **kwargs)
+                    return self2._call_process(*args, **kwargs)
+
+            async def call_async(self2, *args, **kwargs):
+                """
+                Awaitable variant of __call__. Waiting for the result and enforcing the wall-clock time limit is done via
+                the event loop, so many sandboxed function calls can be multiplexed in a single thread. The attributes
+                of this wrapper always reflect the last finished call, use a dedicated wrapper per concurrent call to
+                inspect exit_status and wall_clock_time. In contrast to __call__, SIGINT and SIGTERM are not forwarded
+                to the sandboxed process.
+                """
+                self2._reset_attributes()
+
+                if self2._unlimited():
+                    return self2._call_unlimited(*args, **kwargs)
+
+                with self2._shared_args(args, kwargs) as (args, kwargs):
+                    if self.pool is not None:
+                        loop = asyncio.get_running_loop()
+                        return await loop.run_in_executor(None, functools.partial(self2._call_pool, *args, **kwargs))
+                    return await self2._call_process_async(*args, **kwargs)
+
+            def _unlimited(self2) -> bool:
+                return (self.mem_in_mb is None or self.mem_in_mb <= 0) and \
+                       (self.cpu_time_in_s is None or self.cpu_time_in_s <= 0) and \
+                       (self.wall_time_in_s is None or self.wall_time_in_s <= 0)
+
+            def _call_unlimited(self2, *args, **kwargs):
+                start = time.monotonic()
+                before = cpu_times()
+                try:
+                    args, kwargs = resolve_args(args, kwargs)
+                    self2.result = self2.func(*args, **kwargs)
+                    self2.exit_status = 0
+                except Exception as ex:
+                    self.logger.exception('Unhandled exception')
+                    self2.result = (ex, traceback.format_exc())
+                    self2.exit_status = AnythingException
+                finally:
+                    # there is no time limit, so a registered partial result is never collected
+                    register_partial_result(None)
+                    self2._stats = child_stats(start, before)
+                    self2._record_telemetry(time.monotonic() - start, start)
+                return self2.result
+
+            def _receive(self2, conn):
+                payload = conn.recv()
+                start = time.monotonic()
+                result, self2.exit_status = load_result(payload)
+                self2.result, self2.partial = unwrap_partial_result(result)
+                self2._deserialization_time = time.monotonic() - start
+                self2._stats = payload.stats
+
+            @property
+            def _partial_result_wait_in_s(self2) -> float:
+                return min(self.grace_period_in_s, PARTIAL_RESULT_WAIT_IN_S)
+
+            @property
+            def _termination_wait_in_s(self2) -> float:
+                # remaining grace period after waiting for a partial result
+                return self.grace_period_in_s - self2._partial_result_wait_in_s
+
+            def _receive_after_timeout(self2, conn):
+                # the sandboxed process handled the timeout itself, maybe returning a partial result
+                try:
+                    self2._receive(conn)
+                except EOFError:
+                    self2.result, self2.exit_status = None, TimeoutException
+
+            def _record_telemetry(self2, wall_clock_time: float, reference: float):
+                self2.telemetry = build_telemetry(getattr(self2.func, '__qualname__', str(self2.func)), self2.result,
+                                                  self2.exit_status, wall_clock_time, reference, self2._stats,
+                                                  self2._deserialization_time, self2.peak_memory_in_mb, self2.partial)
+                if self.telemetry_sink is not None:
                     try:
-                        self2.result = self2.func(*args, **kwargs)
-                        self2.exit_status = 0
-                    except Exception as ex:
-                        self.logger.exception('Unhandled exception')
-                        self2.result = (ex, traceback.format_exc())
-                        self2.exit_status = AnythingException
-                    return self2.result
+                        self2.telemetry.write(self.telemetry_sink)
+                    except OSError:
+                        self.logger.exception('Failed to write telemetry')
+
+            @contextlib.contextmanager
+            def _shared_args(self2, args, kwargs):
+                if not self.share_args:
+                    yield args, kwargs
+                    return
+
+                shared_args = tuple(share(a) for a in args)
+                shared_kwargs = {key: share(value) for key, value in kwargs.items()}
+                try:
+                    yield shared_args, shared_kwargs
+                finally:
+                    # only release buffers created for this call
+                    for obj, original in zip(shared_args + tuple(shared_kwargs.values()),
+                                             args + tuple(kwargs.values())):
+                        if obj is not original:
+                            obj.release()
 
+            def _start_process(self2, args, kwargs):
                 # create a pipe to retrieve the return value
                 parent_conn, child_conn = multiprocessing.Pipe(False)
-                # import pdb; pdb.set_trace()
 
                 if self.capture_output:
-                    tmp_dir = tempfile.TemporaryDirectory()
-                    tmp_dir_name = tmp_dir.name
+                    capture = OutputCapture(int(self.max_output_in_kb * 1024), self.output_callback, self.logger)
+                    output_conns = capture.child_conns
                 else:
-                    tmp_dir_name = None
+                    capture = None
+                    output_conns = None
 
                 # create and start the process
                 subproc = FailsafeProcess(target=subprocess_func, name="pynisher function call",
-                                          args=(self2.func, child_conn, self.mem_in_mb, self.cpu_time_in_s,
+                                          start_method=self.start_method,
+                                          args=(self2.func, child_conn, self.rlimit_mem_in_mb, self.cpu_time_in_s,
                                                 self.wall_time_in_s, self.grace_period_in_s, self.affinity,
-                                                tmp_dir_name) + args,
+                                                self.thread_budget, output_conns) + args,
                                           kwargs=kwargs)
-
-                # start the process
-                start = time.time()
                 subproc.start()
                 child_conn.close()
+                if capture is not None:
+                    capture.start()
+
+                if self.mem_mode != MEM_MODE_RLIMIT:
+                    watchdog = MemoryWatchdog(subproc.pid, self.mem_in_mb, self.mem_interval_in_s, self.mem_mode)
+                    watchdog.start()
+                else:
+                    watchdog = None
+                return subproc, parent_conn, capture, watchdog
+
+            def _finish_process(self2, subproc, parent_conn, capture, watchdog, start):
+                if watchdog is not None:
+                    watchdog.stop()
+                    self2.peak_memory_in_mb = watchdog.peak_memory_in_mb
+                    if watchdog.exceeded:
+                        self2.result, self2.exit_status = None, MemorylimitException
+
+                self2.resources_function = resource.getrusage(resource.RUSAGE_CHILDREN)
+                self2.resources_pynisher = resource.getrusage(resource.RUSAGE_SELF)
+                self2.wall_clock_time = time.monotonic() - start
+                self2.exit_status = 5 if self2.exit_status is None else self2.exit_status
+
+                # don't leave zombies behind
+                parent_conn.close()
+                subproc.clean_up()
+                subproc.join()
+                # the process may have been killed after storing its result but before the result was received
+                discard_result(subproc.pid)
+
+                # recover stdout and stderr if requested. The pipes are closed once the process group is gone
+                if capture is not None:
+                    capture.join(max(1., self.grace_period_in_s))
+                    self2.stdout = capture.stdout
+                    self2.stderr = capture.stderr
+
+                self2._record_telemetry(self2.wall_clock_time, start)
+
+            def _call_process(self2, *args, **kwargs):
+                # start the process
+                start = time.monotonic()
+                subproc, parent_conn, capture, watchdog = self2._start_process(args, kwargs)
 
                 # The subprocess runs in a dedicated GID and is therefore not terminated if the parent terminates.
                 # We tap into SIGINT and SIGTERM to terminate the child process and re-raise the original signal
                 def handler(signum, frame):
                     if subproc is not None and subproc.is_alive():
-                        os.killpg(os.getpgid(subproc.pid), signal.SIGTERM)
+                        kill_process_group(subproc, signal.SIGTERM)
                         signal.signal(signum, self2.default_handlers[signum])
                         os.kill(os.getpid(), signum)
 
@@ -260,20 +629,19 @@ class enforce_limits(object):
                     # read the return value
                     if self.wall_time_in_s is not None:
                         if parent_conn.poll(self.wall_time_in_s):
-                            self2.result, self2.exit_status = parent_conn.recv()
+                            self2._receive(parent_conn)
+                        elif parent_conn.poll(self2._partial_result_wait_in_s):
+                            self2._receive_after_timeout(parent_conn)
                         else:
                             self.logger.debug('Timeout reached. Stopping process with SIGTERM')
-                            os.killpg(os.getpgid(subproc.pid), signal.SIGTERM)
-                            subproc.terminate()
-                            subproc.join(self.grace_period_in_s)
+                            kill_process_group(subproc, signal.SIGTERM)
+                            subproc.join(self2._termination_wait_in_s)
                             if subproc.is_alive():
-                                self.logger.debug('Grace period exceeded. Stopping process with SIGKILL')
-                                os.killpg(os.getpgid(subproc.pid), signal.SIGKILL)
-                                subproc.kill()
+                                self2._kill_process(subproc)
                             self2.exit_status = TimeoutException
 
                     else:
-                        self2.result, self2.exit_status = parent_conn.recv()
+                        self2._receive(parent_conn)
 
                 except EOFError:
                     self2.result, self2.exit_status = subproc.exception, AnythingException
@@ -282,29 +650,77 @@ class enforce_limits(object):
                     self2.result = (ex, traceback.format_exc())
                     self2.exit_status = AnythingException
                 finally:
-                    self2.resources_function = resource.getrusage(resource.RUSAGE_CHILDREN)
-                    self2.resources_pynisher = resource.getrusage(resource.RUSAGE_SELF)
-                    self2.wall_clock_time = time.time() - start
-                    self2.exit_status = 5 if self2.exit_status is None else self2.exit_status
-
-                    # recover stdout and stderr if requested
-                    if self.capture_output:
-                        with open(os.path.join(tmp_dir.name, 'std.out'), 'r') as fh:
-                            self2.stdout = fh.read()
-                        with open(os.path.join(tmp_dir.name, 'std.err'), 'r') as fh:
-                            self2.stderr = fh.read()
-
-                        tmp_dir.cleanup()
-
                     # Restore original signal handlers again
                     if threading.current_thread() is threading.main_thread():
                         signal.signal(signal.SIGTERM, self2.default_handlers[signal.SIGTERM])
                         signal.signal(signal.SIGINT, self2.default_handlers[signal.SIGINT])
 
-                    # don't leave zombies behind
-                    parent_conn.close()
-                    subproc.clean_up()
-                    subproc.join()
+                    self2._finish_process(subproc, parent_conn, capture, watchdog, start)
+                return self2.result
+
+            async def _call_process_async(self2, *args, **kwargs):
+                start = time.monotonic()
+                loop = asyncio.get_running_loop()
+                subproc, parent_conn, capture, watchdog = self2._start_process(args, kwargs)
+
+                try:
+                    # read the return value. Receiving a large result blocks, so it is done outside of the event loop
+                    if await wait_readable(parent_conn.fileno(), self.wall_time_in_s):
+                        await loop.run_in_executor(None, self2._receive, parent_conn)
+                    elif self.wall_time_in_s is not None and \
+                            await wait_readable(parent_conn.fileno(), self2._partial_result_wait_in_s):
+                        await loop.run_in_executor(None, self2._receive_after_timeout, parent_conn)
+                    else:
+                        self.logger.debug('Timeout reached. Stopping process with SIGTERM')
+                        kill_process_group(subproc, signal.SIGTERM)
+                        if not await wait_readable(subproc.sentinel, self2._termination_wait_in_s):
+                            self2._kill_process(subproc)
+                        self2.exit_status = TimeoutException
+
+                except EOFError:
+                    self2.result, self2.exit_status = subproc.exception, AnythingException
+                except Exception as ex:
+                    self.logger.exception('Unhandled exception')
+                    self2.result = (ex, traceback.format_exc())
+                    self2.exit_status = AnythingException
+                finally:
+                    # only join the process after it exited. Joining the output capture and the watchdog still
+                    # blocks, so the clean up is done outside of the event loop as well
+                    if not await wait_readable(subproc.sentinel, max(1., self.grace_period_in_s)):
+                        self2._kill_process(subproc)
+                    await loop.run_in_executor(None, self2._finish_process, subproc, parent_conn, capture, watchdog,
+                                               start)
+                return self2.result
+
+            def _kill_process(self2, subproc):
+                self.logger.debug('Grace period exceeded. Stopping process with SIGKILL')
+                kill_process_group(subproc, signal.SIGKILL)
+
+            def _call_pool(self2, *args, **kwargs):
+                start = time.monotonic()
+                details = {}
+                try:
+                    result, self2.exit_status = self.pool.execute(self2.func, args, kwargs, self.mem_in_mb,
+                                                                        self.cpu_time_in_s, self.wall_time_in_s,
+                                                                        self.grace_period_in_s, self.affinity,
+                                                                        mem_mode=self.mem_mode,
+                                                                        mem_interval_in_s=self.mem_interval_in_s,
+                                                                        n_threads=self.thread_budget,
+                                                                        details=details)
+                    self2.result, self2.partial = unwrap_partial_result(result)
+                except Exception as ex:
+                    self.logger.exception('Unhandled exception')
+                    self2.result = (ex, traceback.format_exc())
+                    self2.exit_status = AnythingException
+                finally:
+                    self2.resources_function = resource.getrusage(resource.RUSAGE_CHILDREN)
+                    self2.resources_pynisher = resource.getrusage(resource.RUSAGE_SELF)
+                    self2.wall_clock_time = time.monotonic() - start
+                    self2.exit_status = 5 if self2.exit_status is None else self2.exit_status
+                    self2.peak_memory_in_mb = details.get('peak_memory_in_mb')
+                    self2._stats = details.get('stats')
+                    self2._deserialization_time = details.get('deserialization_time_in_s')
+                    self2._record_telemetry(self2.wall_clock_time, details.get('sent', start))
                 return self2.result
 
         return function_wrapper(func)
@@ -0,0 +1,143 @@
+import logging
+import multiprocessing
+import os
+import selectors
+import threading
+from typing import Callable, Optional, Dict
+
+# Names of the captured streams
+STDOUT = 'stdout'
+STDERR = 'stderr'
+
+
+class RingBuffer(object):
+    """
+    Byte buffer retaining only the last max_size bytes written to it.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.truncated = False
+        self._buffer = bytearray()
+
+    def write(self, data: bytes):
+        self._buffer += data
+        overflow = len(self._buffer) - self.max_size
+        if overflow > 0:
+            del self._buffer[:overflow]
+            self.truncated = True
+
+    def getvalue(self) -> str:
+        return self._buffer.decode('utf-8', errors='replace')
+
+
+class OutputCapture(object):
+    """
+    Captures stdout and stderr of a sandboxed process via pipes. The output is read incrementally by a background thread
+    while the process is still running. Only the last max_size_in_b bytes of each stream are retained. If provided,
+    callback is invoked with the stream name and each complete line as soon as it is available.
+    """
+
+    def __init__(self,
+                 max_size_in_b: int = 1024 * 1024,
+                 callback: Callable[[str, str], None] = None,
+                 logger: logging.Logger = None):
+        self.callback = callback
+        self.logger = logger if logger is not None else multiprocessing.get_logger()
+
+        self._buffers = {STDOUT: RingBuffer(max_size_in_b), STDERR: RingBuffer(max_size_in_b)}
+        self._partial_lines: Dict[str, bytes] = {STDOUT: b'', STDERR: b''}
+
+        stdout_read, stdout_write = multiprocessing.Pipe(False)
+        stderr_read, stderr_write = multiprocessing.Pipe(False)
+        self._read_conns = {STDOUT: stdout_read, STDERR: stderr_read}
+        # has to be passed to the sandboxed process
+        self.child_conns = (stdout_write, stderr_write)
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        """
+        Starts reading the output. Has to be called after the sandboxed process has been started.
+        """
+        # close the write ends in the parent, otherwise EOF is never reached
+        for conn in self.child_conns:
+            conn.close()
+        self._thread = threading.Thread(target=self._read, name='pynisher output capture', daemon=True)
+        self._thread.start()
+
+    def _read(self):
+        selector = selectors.DefaultSelector()
+        for name, conn in self._read_conns.items():
+            selector.register(conn.fileno(), selectors.EVENT_READ, name)
+
+        while len(selector.get_map()) > 0:
+            events = selector.select(0.1)
+            # stop once all pending output is consumed
+            if len(events) == 0 and self._stopped.is_set():
+                break
+            for key, _ in events:
+                data = os.read(key.fd, 65536)
+                if len(data) == 0:
+                    selector.unregister(key.fd)
+                    self._process(key.data, b'', eof=True)
+                else:
+                    self._process(key.data, data)
+        selector.close()
+
+    def _process(self, stream: str, data: bytes, eof: bool = False):
+        self._buffers[stream].write(data)
+        if self.callback is None:
+            return
+
+        lines = (self._partial_lines[stream] + data).split(b'\n')
+        self._partial_lines[stream] = lines.pop()
+        if eof and len(self._partial_lines[stream]) > 0:
+            lines.append(self._partial_lines[stream])
+            self._partial_lines[stream] = b''
+
+        for line in lines:
+            try:
+                self.callback(stream, line.decode('utf-8', errors='replace'))
+            except Exception:
+                self.logger.exception('Output callback failed')
+
+    def join(self, timeout: float = None):
+        """
+        Waits until the output is read completely. Processes started via fork concurrently to the sandboxed process
+        inherit the pipes, so EOF may never be reached. In this case, reading stops after timeout seconds.
+        """
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._stopped.set()
+            self._thread.join()
+        for conn in self._read_conns.values():
+            conn.close()
+
+    @property
+    def stdout(self) -> str:
+        return self._buffers[STDOUT].getvalue()
+
+    @property
+    def stderr(self) -> str:
+        return self._buffers[STDERR].getvalue()
+
+
+def redirect_output(conns):
+    """
+    Redirects stdout and stderr of the current process, including output of C libraries, to the given connections.
+    Has to be called from the sandboxed process.
+    """
+    import sys
+
+    stdout_conn, stderr_conn = conns
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.dup2(stdout_conn.fileno(), 1)
+    os.dup2(stderr_conn.fileno(), 2)
+    stdout_conn.close()
+    stderr_conn.close()
+
+    # line buffering for live output
+    sys.stdout = open(1, 'w', buffering=1, closefd=False)
+    sys.stderr = open(2, 'w', buffering=1, closefd=False)
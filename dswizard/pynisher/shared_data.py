@@ -0,0 +1,290 @@
+import mmap
+import os
+import pickle
+import tempfile
+from typing import Any, Tuple, List, Dict, Optional
+
+import numpy as np
+
+# Buffers smaller than this threshold are pickled in-band
+OUT_OF_BAND_THRESHOLD = 1024 * 1024
+# Alignment of out-of-band buffers in the shared segment
+ALIGNMENT = 64
+
+
+def _shm_dir() -> str:
+    # /dev/shm is a RAM backed file system on Linux, i.e. files are never written to disk
+    return '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+
+class SharedData(object):
+    """
+    Base class for data placed in shared memory. Only a lightweight handle is pickled when passing an instance to
+    another process. The creating process owns the underlying memory and releases it either explicitly, when used as a
+    context manager or during garbage collection.
+    """
+
+    def view(self) -> Any:
+        raise NotImplementedError()
+
+    def release(self):
+        raise NotImplementedError()
+
+    def transfer(self) -> 'SharedData':
+        """
+        Hands the ownership of the underlying memory over to the next process receiving this handle, e.g. when
+        returning it from a sandboxed function. The receiving process becomes responsible for releasing the memory.
+        """
+        raise NotImplementedError()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+    def __del__(self):
+        try:
+            self.release()
+        except Exception:
+            pass
+
+
+class SharedArray(SharedData):
+    """
+    A numpy array stored once in a memory mapped file. Processes receiving this handle get a read-only view on the same
+    memory without copying or pickling the actual data.
+    """
+
+    def __init__(self, array: np.ndarray):
+        array = np.asarray(array)
+        if array.dtype.hasobject:
+            raise ValueError('Arrays with object dtype can not be placed in shared memory')
+
+        self.shape = array.shape
+        self.dtype = array.dtype
+        self._owner = os.getpid()
+        self._transferred = False
+        self._view = None
+
+        fd, self.path = tempfile.mkstemp(prefix='pynisher_', dir=_shm_dir())
+        os.close(fd)
+        if array.size > 0:
+            mm = np.memmap(self.path, dtype=self.dtype, mode='w+', shape=self.shape)
+            mm[...] = array
+            mm.flush()
+            del mm
+
+    @property
+    def nbytes(self) -> int:
+        return int(np.prod(self.shape)) * self.dtype.itemsize
+
+    def view(self) -> np.ndarray:
+        if self._view is None:
+            if self.nbytes == 0:
+                view = np.empty(self.shape, dtype=self.dtype)
+            else:
+                view = np.asarray(np.memmap(self.path, dtype=self.dtype, mode='r', shape=self.shape))
+            view.flags.writeable = False
+            self._view = view
+        return self._view
+
+    def release(self):
+        self._view = None
+        if self._owner == os.getpid() and os.path.exists(self.path):
+            os.unlink(self.path)
+        self._owner = None
+
+    def transfer(self) -> 'SharedArray':
+        if self._owner == os.getpid():
+            self._owner = None
+            self._transferred = True
+        return self
+
+    def __getstate__(self):
+        return {'path': self.path, 'shape': self.shape, 'dtype': self.dtype, 'transferred': self._transferred}
+
+    def __setstate__(self, state):
+        transferred = state.pop('transferred', False)
+        self.__dict__.update(state)
+        self._owner = os.getpid() if transferred else None
+        self._transferred = False
+        self._view = None
+
+
+class SharedFrame(SharedData):
+    """
+    A pandas DataFrame or Series stored in shared memory. Columns with the same numeric dtype are stored as a single
+    block. Columns with object or extension dtypes can not be shared and are pickled as usual. Frames consisting of a
+    single block are reconstructed without copying, mixed frames have to be consolidated by pandas again.
+    """
+
+    def __init__(self, df):
+        import pandas as pd
+
+        self.is_series = isinstance(df, pd.Series)
+        if self.is_series:
+            self.name = df.name
+            df = df.to_frame()
+        self.columns = df.columns
+        self.index = df.index
+        self._view = None
+
+        self.blocks: List[Tuple[List, SharedArray]] = []
+        self.objects: Dict[Any, Any] = {}
+        by_dtype = {}
+        for column, dtype in df.dtypes.items():
+            if isinstance(dtype, np.dtype) and not dtype.hasobject:
+                by_dtype.setdefault(dtype, []).append(column)
+            else:
+                self.objects[column] = df[column]
+        for dtype, columns in by_dtype.items():
+            self.blocks.append((columns, SharedArray(df[columns].to_numpy(dtype=dtype))))
+
+    def view(self):
+        if self._view is None:
+            import pandas as pd
+
+            frames = [pd.DataFrame(array.view(), columns=columns, index=self.index, copy=False)
+                      for columns, array in self.blocks]
+            if len(self.objects) > 0:
+                frames.append(pd.DataFrame(self.objects, index=self.index))
+
+            if len(frames) == 1:
+                df = frames[0]
+            else:
+                df = pd.concat(frames, axis=1)[self.columns]
+
+            self._view = df.iloc[:, 0].rename(self.name) if self.is_series else df
+        return self._view
+
+    def release(self):
+        self._view = None
+        for _, array in self.blocks:
+            array.release()
+
+    def transfer(self) -> 'SharedFrame':
+        for _, array in self.blocks:
+            array.transfer()
+        return self
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_view'] = None
+        return state
+
+
+def share(obj: Any) -> Any:
+    """
+    Places numpy arrays and pandas objects in shared memory. The returned handle can be passed to any function limited
+    by enforce_limits, it is replaced by a read-only view on the shared memory in the sandboxed process. The same handle
+    can be reused for an arbitrary number of function calls. All other objects are returned unchanged.
+    """
+    import pandas as pd
+
+    if isinstance(obj, SharedData):
+        return obj
+    if isinstance(obj, np.ndarray) and not obj.dtype.hasobject:
+        return SharedArray(obj)
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return SharedFrame(obj)
+    return obj
+
+
+def resolve(obj: Any) -> Any:
+    """
+    Replaces handles to shared memory by the actual data.
+    """
+    if isinstance(obj, SharedData):
+        return obj.view()
+    return obj
+
+
+def resolve_args(args: tuple, kwargs: dict) -> Tuple[tuple, dict]:
+    return tuple(resolve(a) for a in args), {key: resolve(value) for key, value in kwargs.items()}
+
+
+class OutOfBandResult(object):
+    """
+    Pickled return value of a sandboxed function. Large buffers, e.g. numpy arrays contained in fitted estimators, are
+    not part of the pickle stream but stored in a memory mapped file. The receiving process maps this file and
+    reconstructs the return value on top of it without copying the buffers again.
+    """
+
+    def __init__(self, data: bytes, path: Optional[str], layout: List[Tuple[int, int]]):
+        self.data = data
+        self.path = path
+        self.layout = layout
+        # resource usage reported by the sandboxed process
+        self.stats: Optional[Dict[str, float]] = None
+
+
+def result_path(pid: int = None) -> str:
+    """
+    Path of the file containing the out-of-band buffers of the result of the process pid. The path is fixed, so the
+    receiving process can remove the file if the sending process is killed before the result is received.
+    """
+    return os.path.join(_shm_dir(), f'pynisher_result_{os.getpid() if pid is None else pid}')
+
+
+def discard_result(pid: int):
+    """
+    Removes the out-of-band buffers of a result of the terminated process pid that has not been received.
+    """
+    try:
+        os.unlink(result_path(pid))
+    except FileNotFoundError:
+        pass
+
+
+def dump_result(obj: Any) -> OutOfBandResult:
+    buffers = []
+
+    def buffer_callback(buffer: pickle.PickleBuffer) -> bool:
+        # returning a truthy value serializes the buffer in-band
+        if buffer.raw().nbytes < OUT_OF_BAND_THRESHOLD:
+            return True
+        buffers.append(buffer)
+        return False
+
+    data = pickle.dumps(obj, protocol=5, buffer_callback=buffer_callback)
+    if len(buffers) == 0:
+        return OutOfBandResult(data, None, [])
+
+    layout = []
+    size = 0
+    for buffer in buffers:
+        nbytes = buffer.raw().nbytes
+        layout.append((size, nbytes))
+        size += (nbytes + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+    path = result_path()
+    fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        os.ftruncate(fd, size)
+        with mmap.mmap(fd, size) as mm:
+            for (offset, nbytes), buffer in zip(layout, buffers):
+                mm[offset:offset + nbytes] = buffer.raw()
+    except BaseException:
+        os.unlink(path)
+        raise
+    finally:
+        os.close(fd)
+    return OutOfBandResult(data, path, layout)
+
+
+def load_result(result: OutOfBandResult) -> Any:
+    if result.path is None:
+        return pickle.loads(result.data)
+
+    fd = os.open(result.path, os.O_RDWR)
+    try:
+        mm = mmap.mmap(fd, 0)
+    finally:
+        os.close(fd)
+        os.unlink(result.path)
+
+    # buffers keep the memory mapping alive as long as the reconstructed objects exist
+    view = memoryview(mm)
+    buffers = [view[offset:offset + nbytes] for offset, nbytes in result.layout]
+    return pickle.loads(result.data, buffers=buffers)
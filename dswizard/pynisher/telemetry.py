@@ -0,0 +1,126 @@
+import json
+import resource
+import threading
+import time
+from dataclasses import dataclass, asdict, field
+from typing import Optional, Dict, Any, Tuple
+
+_sink_lock = threading.Lock()
+
+
+@dataclass
+class CallTelemetry:
+    """
+    Resource usage of a single sandboxed function call. All times are in seconds, memory in megabytes. Values that
+    could not be collected, e.g. because the sandboxed process was killed, are None.
+    """
+    function: str
+    exit_status: str
+    termination_reason: str
+    killed: bool
+    wall_clock_time_in_s: float
+    partial: bool = False
+    startup_latency_in_s: Optional[float] = None
+    user_time_in_s: Optional[float] = None
+    system_time_in_s: Optional[float] = None
+    peak_rss_in_mb: Optional[float] = None
+    serialization_time_in_s: Optional[float] = None
+    deserialization_time_in_s: Optional[float] = None
+    timestamp: float = field(default_factory=time.time)
+
+    @property
+    def overhead_in_s(self) -> Optional[float]:
+        """Time spent in the sandbox instead of the actual function"""
+        if self.startup_latency_in_s is None or self.serialization_time_in_s is None:
+            return None
+        return self.startup_latency_in_s + self.serialization_time_in_s + (self.deserialization_time_in_s or 0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    def write(self, path: str):
+        """Appends this record as a single JSON line to path"""
+        line = json.dumps(self.to_dict())
+        with _sink_lock:
+            with open(path, 'a') as fh:
+                fh.write(line + '\n')
+
+
+def cpu_times() -> Tuple[float, float]:
+    """
+    User and system time of the current process including all terminated children
+    """
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + children.ru_utime, usage.ru_stime + children.ru_stime
+
+
+def child_stats(started: float, before: Tuple[float, float] = (0., 0.)) -> Dict[str, Optional[float]]:
+    """
+    Collects the resource usage inside the sandboxed process since before. Has to be called from the sandboxed process.
+    :param started: point in time (time.monotonic) the function call started
+    :param before: user and system time before the function call started
+    """
+    user_time, system_time = cpu_times()
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {
+        'started': started,
+        'user_time_in_s': user_time - before[0],
+        'system_time_in_s': system_time - before[1],
+        # ru_maxrss is reported in kilobytes on Linux
+        'peak_rss_in_mb': max(usage.ru_maxrss, children.ru_maxrss) / 1024
+    }
+
+
+def termination_reason(result: Any, exit_status: Any) -> str:
+    from dswizard.pynisher.limit_function_call import TimeoutException, CpuTimeoutException, MemorylimitException, \
+        SubprocessException, AnythingException
+
+    if exit_status == 0:
+        return 'success'
+    reasons = {
+        TimeoutException: 'wall_time',
+        CpuTimeoutException: 'cpu_time',
+        MemorylimitException: 'memory',
+        SubprocessException: 'subprocess'
+    }
+    if exit_status in reasons:
+        return reasons[exit_status]
+    if exit_status is AnythingException:
+        # exceptions raised by the function are returned together with the traceback
+        return 'exception' if isinstance(result, tuple) else 'crash'
+    return 'unknown'
+
+
+def build_telemetry(func_name: str,
+                    result: Any,
+                    exit_status: Any,
+                    wall_clock_time: float,
+                    reference: float,
+                    stats: Optional[Dict[str, float]],
+                    deserialization_time: Optional[float],
+                    peak_memory_in_mb: Optional[float] = None,
+                    partial: bool = False) -> CallTelemetry:
+    """
+    Merges the statistics reported by the sandboxed process with the measurements of the parent.
+    :param reference: point in time (time.monotonic) the sandboxed call was dispatched by the parent
+    """
+    telemetry = CallTelemetry(
+        function=func_name,
+        exit_status=exit_status.__name__ if isinstance(exit_status, type) else str(exit_status),
+        termination_reason=termination_reason(result, exit_status),
+        killed=stats is None,
+        wall_clock_time_in_s=wall_clock_time,
+        partial=partial,
+        deserialization_time_in_s=deserialization_time
+    )
+    if stats is not None:
+        telemetry.startup_latency_in_s = max(0., stats['started'] - reference)
+        telemetry.user_time_in_s = stats['user_time_in_s']
+        telemetry.system_time_in_s = stats['system_time_in_s']
+        telemetry.peak_rss_in_mb = stats['peak_rss_in_mb']
+        telemetry.serialization_time_in_s = stats.get('serialization_time_in_s')
+    if peak_memory_in_mb is not None:
+        telemetry.peak_rss_in_mb = peak_memory_in_mb
+    return telemetry
@@ -0,0 +1,44 @@
+import contextlib
+import os
+from typing import Optional, Set
+
+# Environment variables read by native thread pools when they are initialized
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'BLIS_NUM_THREADS',
+                   'VECLIB_MAXIMUM_THREADS', 'NUMEXPR_NUM_THREADS')
+
+
+def thread_budget(n_threads: Optional[int], affinity: Optional[Set[int]]) -> Optional[int]:
+    """
+    Number of threads a sandboxed process may use. Defaults to the number of cores in affinity.
+    """
+    if n_threads is not None:
+        return n_threads
+    return None if affinity is None else len(affinity)
+
+
+@contextlib.contextmanager
+def limited_threads(n_threads: Optional[int]):
+    """
+    Limits the BLAS and OpenMP thread pools of the current process to n_threads. Thread pools of already loaded
+    libraries are resized via threadpoolctl, libraries loaded later on and child processes pick up the limit from the
+    environment. All limits are restored afterwards. Has to be called from the sandboxed process.
+    """
+    if n_threads is None:
+        yield
+        return
+
+    from threadpoolctl import threadpool_limits
+
+    env = {var: os.environ.get(var) for var in THREAD_ENV_VARS}
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(n_threads)
+    try:
+        # the context manager restores the original limits with threadpoolctl 2.x and 3.x
+        with threadpool_limits(limits=n_threads):
+            yield
+    finally:
+        for var, value in env.items():
+            if value is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = value
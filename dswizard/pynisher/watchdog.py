@@ -0,0 +1,76 @@
+import threading
+from typing import List
+
+import psutil
+
+# Supported modes to enforce memory limits
+MEM_MODE_RLIMIT = 'rlimit'
+MEM_MODE_RSS = 'rss'
+MEM_MODE_PSS = 'pss'
+MEM_MODES = (MEM_MODE_RLIMIT, MEM_MODE_RSS, MEM_MODE_PSS)
+
+
+class MemoryWatchdog(threading.Thread):
+    """
+    Monitors the memory usage of a process including all its children. In contrast to RLIMIT_AS only memory actually
+    resident in RAM is counted, so memory maps and thread stacks reserved by BLAS or OpenMP libraries do not trigger the
+    limit. If the memory usage exceeds the limit, the complete process tree is killed with SIGKILL.
+
+    RSS counts shared pages fully for each process while PSS distributes shared pages among all processes using them.
+    Collecting the PSS is considerably slower than the RSS.
+    """
+
+    def __init__(self, pid: int, mem_in_mb: float, interval_in_s: float = 0.1, mode: str = MEM_MODE_RSS):
+        super().__init__(name=f'pynisher memory watchdog {pid}', daemon=True)
+        if mode not in (MEM_MODE_RSS, MEM_MODE_PSS):
+            raise ValueError(f'Unsupported memory mode {mode}')
+        self.pid = pid
+        self.mem_in_mb = mem_in_mb
+        self.interval_in_s = interval_in_s
+        self.mode = mode
+
+        self.exceeded = False
+        self.peak_memory_in_mb = 0.
+        self._stopped = threading.Event()
+
+    def _processes(self) -> List[psutil.Process]:
+        process = psutil.Process(self.pid)
+        return [process] + process.children(recursive=True)
+
+    def _memory(self, process: psutil.Process) -> int:
+        if self.mode == MEM_MODE_PSS:
+            return process.memory_full_info().pss
+        return process.memory_info().rss
+
+    def measure(self) -> float:
+        processes = self._processes()
+        mem_in_b = 0
+        for process in processes:
+            try:
+                mem_in_b += self._memory(process)
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                pass
+        mem_in_mb = mem_in_b / 1024 / 1024
+        self.peak_memory_in_mb = max(self.peak_memory_in_mb, mem_in_mb)
+
+        if self.mem_in_mb is not None and mem_in_mb > self.mem_in_mb:
+            self.exceeded = True
+            for process in processes:
+                try:
+                    process.kill()
+                except psutil.NoSuchProcess:
+                    pass
+        return mem_in_mb
+
+    def run(self):
+        while not self._stopped.is_set() and not self.exceeded:
+            try:
+                self.measure()
+            except psutil.NoSuchProcess:
+                break
+            self._stopped.wait(self.interval_in_s)
+
+    def stop(self):
+        self._stopped.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join()
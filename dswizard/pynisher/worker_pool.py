@@ -0,0 +1,323 @@
+import atexit
+import importlib
+import logging
+import math
+import multiprocessing
+import os
+import queue
+import resource
+import signal
+import threading
+import time
+import traceback
+from multiprocessing import Pipe
+from typing import Callable, Set, List, Tuple, Any, Optional, Dict
+
+import psutil
+
+from dswizard.pynisher.limit_function_call import CpuTimeoutException, TimeoutException, MemorylimitException, \
+    SubprocessException, AnythingException, signal_handler, execute, kill_children, kill_process_group, \
+    dump_with_stats, get_context
+from dswizard.pynisher.shared_data import load_result, discard_result
+from dswizard.pynisher.threads import limited_threads
+from dswizard.pynisher.telemetry import child_stats, cpu_times
+from dswizard.pynisher.watchdog import MemoryWatchdog, MEM_MODE_RLIMIT
+
+# Exit status after which the state of a worker can not be trusted anymore
+RECYCLE_STATUS = (CpuTimeoutException, TimeoutException, MemorylimitException, SubprocessException)
+
+
+# the function a persistent worker process executes
+def worker_loop(pipe, preload: List[str]):
+    # run in a dedicated GID to allow killing the worker including all its children. Has to happen first, as the worker
+    # may be killed while it is still importing the preloaded modules
+    os.setsid()
+
+    # import heavy modules once for all function calls
+    for module in preload:
+        importlib.import_module(module)
+
+    signal.signal(signal.SIGALRM, signal_handler)
+    signal.signal(signal.SIGXCPU, signal_handler)
+    signal.signal(signal.SIGQUIT, signal_handler)
+
+    # only soft limits are adjusted per call as hard limits can not be raised again
+    default_mem = resource.getrlimit(resource.RLIMIT_AS)
+    default_cpu = resource.getrlimit(resource.RLIMIT_CPU)
+    default_affinity = os.sched_getaffinity(0)
+
+    while True:
+        try:
+            task = pipe.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if task is None:
+            break
+
+        func, args, kwargs, mem_in_mb, cpu_time_limit_in_s, wall_time_limit_in_s, affinity, n_threads = task
+
+        if mem_in_mb is not None:
+            mem_in_b = int(mem_in_mb * 1024 * 1024)
+            if default_mem[1] != resource.RLIM_INFINITY:
+                mem_in_b = min(mem_in_b, default_mem[1])
+            resource.setrlimit(resource.RLIMIT_AS, (mem_in_b, default_mem[1]))
+
+        if cpu_time_limit_in_s is not None:
+            # RLIMIT_CPU is accumulated over the lifetime of the process, the budget has to be added on top
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            cpu_in_s = int(math.ceil(usage.ru_utime + usage.ru_stime)) + cpu_time_limit_in_s
+            resource.setrlimit(resource.RLIMIT_CPU, (cpu_in_s, default_cpu[1]))
+
+        if affinity is not None:
+            os.sched_setaffinity(0, affinity)
+
+        started = time.monotonic()
+        before = cpu_times()
+        try:
+            # the timer is armed inside the try block, so it is always disarmed before the result is sent
+            if wall_time_limit_in_s is not None:
+                signal.setitimer(signal.ITIMER_REAL, wall_time_limit_in_s)
+            with limited_threads(n_threads):
+                return_value = execute(func, *args, **kwargs)
+        except (CpuTimeoutException, TimeoutException) as ex:
+            # limit exceeded after func already returned
+            return_value = None, type(ex)
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            resource.setrlimit(resource.RLIMIT_AS, default_mem)
+            resource.setrlimit(resource.RLIMIT_CPU, default_cpu)
+            os.sched_setaffinity(0, default_affinity)
+            kill_children()
+
+        # ru_maxrss covers the whole lifetime of the worker and not only this call
+        stats = child_stats(started, before)
+        stats['peak_rss_in_mb'] = None
+        try:
+            pipe.send(dump_with_stats(return_value, stats))
+        except Exception as ex:
+            # return value can not be pickled
+            pipe.send(dump_with_stats(((ex, traceback.format_exc()), AnythingException), stats))
+
+    pipe.close()
+
+
+class Worker(object):
+    """
+    A single pre-started sandbox process that executes function calls received via a pipe.
+    """
+
+    def __init__(self, preload: List[str], poll_interval_in_s: float = 0.1, start_method: str = None):
+        self.poll_interval_in_s = poll_interval_in_s
+        self.pipe, child_conn = Pipe()
+        context = get_context(start_method, preload if len(preload) > 0 else None)
+        self.process = context.Process(target=worker_loop, name='pynisher worker', args=(child_conn, preload))
+        self.process.start()
+        child_conn.close()
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    def call(self,
+             func: Callable,
+             args: tuple,
+             kwargs: dict,
+             mem_in_mb: float,
+             cpu_time_in_s: int,
+             wall_time_in_s: float,
+             grace_period_in_s: float,
+             affinity: Set[int],
+             mem_mode: str = MEM_MODE_RLIMIT,
+             mem_interval_in_s: float = 0.1,
+             n_threads: int = None,
+             details: Dict = None) -> Tuple[Any, Any]:
+        details = {} if details is None else details
+        details['sent'] = time.monotonic()
+        if mem_mode == MEM_MODE_RLIMIT or mem_in_mb is None:
+            self.pipe.send((func, args, kwargs, mem_in_mb, cpu_time_in_s, wall_time_in_s, affinity, n_threads))
+            return self._wait(cpu_time_in_s, wall_time_in_s, grace_period_in_s, details)
+
+        self.pipe.send((func, args, kwargs, None, cpu_time_in_s, wall_time_in_s, affinity, n_threads))
+        watchdog = MemoryWatchdog(self.pid, mem_in_mb, mem_interval_in_s, mem_mode)
+        watchdog.start()
+        try:
+            res = self._wait(cpu_time_in_s, wall_time_in_s, grace_period_in_s, details)
+        finally:
+            watchdog.stop()
+            details['peak_memory_in_mb'] = watchdog.peak_memory_in_mb
+        if watchdog.exceeded:
+            self.kill()
+            return None, MemorylimitException
+        return res
+
+    def _wait(self, cpu_time_in_s: int, wall_time_in_s: float, grace_period_in_s: float,
+              details: Dict) -> Tuple[Any, Any]:
+        start = time.monotonic()
+        if cpu_time_in_s is not None:
+            # Hard limits can not be used for persistent workers. Busy C libraries are killed from the outside
+            cpu_start = self._cpu_time()
+        while True:
+            if self.pipe.poll(self.poll_interval_in_s):
+                try:
+                    payload = self.pipe.recv()
+                    start = time.monotonic()
+                    res = load_result(payload)
+                    details['deserialization_time_in_s'] = time.monotonic() - start
+                    details['stats'] = payload.stats
+                    return res
+                except EOFError:
+                    return None, AnythingException
+
+            if not self.is_alive():
+                return None, AnythingException
+            if wall_time_in_s is not None and time.monotonic() - start > wall_time_in_s + grace_period_in_s:
+                self.kill(grace_period_in_s)
+                return None, TimeoutException
+            if cpu_time_in_s is not None and \
+                    self._cpu_time() - cpu_start > cpu_time_in_s + grace_period_in_s:
+                self.kill(grace_period_in_s)
+                return None, CpuTimeoutException
+
+    def _cpu_time(self) -> float:
+        try:
+            times = psutil.Process(self.pid).cpu_times()
+            return times.user + times.system
+        except psutil.NoSuchProcess:
+            return 0
+
+    def kill(self, grace_period_in_s: float = 0):
+        if self.is_alive():
+            kill_process_group(self.process, signal.SIGTERM)
+            self.process.join(grace_period_in_s)
+            if self.is_alive():
+                kill_process_group(self.process, signal.SIGKILL)
+        self.process.join()
+        self.pipe.close()
+        discard_result(self.pid)
+
+    def stop(self):
+        try:
+            self.pipe.send(None)
+            self.process.join(1)
+        except (BrokenPipeError, OSError):
+            pass
+        self.kill()
+
+
+class WorkerPool(object):
+    """
+    A fixed set of persistent, pre-started sandbox processes. Passing a pool to enforce_limits avoids spawning a new
+    process for each function call. Modules listed in preload are imported once in each worker. All function calls
+    still get their own memory, CPU and wall-clock time limits. Workers that exceeded a limit or crashed are replaced
+    transparently.
+
+    Functions and arguments are sent to the workers via a pipe, therefore they have to be pickleable.
+    """
+
+    def __init__(self,
+                 n_workers: int = 1,
+                 preload: List[str] = None,
+                 logger: logging.Logger = None,
+                 start_method: str = None):
+        """
+        :param n_workers: number of persistent workers
+        :param preload: modules imported once in each worker
+        :param start_method: multiprocessing start method used for the workers. For 'forkserver', preload is also
+        imported in the fork server, so replacing a recycled worker is cheap
+        """
+        self.n_workers = n_workers
+        self.preload = [] if preload is None else list(preload)
+        self.start_method = start_method
+        self.logger = logger if logger is not None else multiprocessing.get_logger()
+
+        self._lock = threading.Lock()
+        self._closed = False
+        self._idle = queue.Queue()
+        self._workers: List[Worker] = []
+        for i in range(n_workers):
+            worker = Worker(self.preload, start_method=self.start_method)
+            self._workers.append(worker)
+            self._idle.put(worker)
+
+        atexit.register(self.shutdown)
+
+    def execute(self,
+                func: Callable,
+                args: tuple = (),
+                kwargs: dict = None,
+                mem_in_mb: float = None,
+                cpu_time_in_s: int = None,
+                wall_time_in_s: float = None,
+                grace_period_in_s: float = 0,
+                affinity: Set[int] = None,
+                mem_mode: str = MEM_MODE_RLIMIT,
+                mem_interval_in_s: float = 0.1,
+                n_threads: int = None,
+                details: Dict = None) -> Tuple[Any, Any]:
+        """
+        Executes func in the next idle worker. Blocks until a worker is available and the function call finished.
+        :param details: optional dictionary that is filled with additional information about the call, e.g. the
+        peak_memory_in_mb for mem_mode 'rss' or 'pss' or the resource usage reported by the worker in stats
+        :param n_threads: maximum number of BLAS and OpenMP threads for this call
+        :return: tuple of return value and exit status with the same semantics as enforce_limits
+        """
+        if self._closed:
+            raise ValueError('WorkerPool is already shut down')
+        kwargs = {} if kwargs is None else kwargs
+        grace_period_in_s = 0 if grace_period_in_s is None else grace_period_in_s
+
+        worker = self._idle.get()
+        result, status = None, None
+        try:
+            if not worker.is_alive():
+                worker = self._replace(worker)
+                if worker is None:
+                    raise ValueError('WorkerPool is already shut down')
+            result, status = worker.call(func, args, kwargs, mem_in_mb, cpu_time_in_s, wall_time_in_s,
+                                         grace_period_in_s, affinity, mem_mode, mem_interval_in_s, n_threads,
+                                         details)
+            return result, status
+        finally:
+            if worker is not None:
+                # crashed workers do not return any result
+                crashed = status is AnythingException and result is None
+                if status is None or status in RECYCLE_STATUS or crashed or not worker.is_alive():
+                    self.logger.debug(f'Recycling worker {worker.pid} after exit status {status}')
+                    worker = self._replace(worker)
+                # workers are not replaced after the pool has been shut down
+                if worker is not None:
+                    self._idle.put(worker)
+
+    def _replace(self, worker: Worker) -> Optional[Worker]:
+        worker.kill()
+        with self._lock:
+            self._workers.remove(worker)
+            if self._closed:
+                return None
+            new_worker = Worker(self.preload, start_method=self.start_method)
+            self._workers.append(new_worker)
+        return new_worker
+
+    @property
+    def pids(self) -> List[int]:
+        with self._lock:
+            return [w.pid for w in self._workers]
+
+    def shutdown(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            workers = list(self._workers)
+        for worker in workers:
+            worker.stop()
+        atexit.unregister(self.shutdown)
+
+    def __enter__(self) -> 'WorkerPool':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
@@ -51,3 +51,15 @@ class TestImputation(base_test.BaseComponentTest):
         X_expected = expected.transform(X_test)
 
         assert np.allclose(X_actual, X_expected)
+
+    def test_schema(self):
+        # numeric strings are imputed like numbers, boolean columns like categorical columns
+        X_train = pd.DataFrame({'number': ['1', np.nan, '5'], 'flag': [True, False, True],
+                                'nominal': [np.nan, 'a', 'a']})
+        actual = ImputationComponent(strategy='mean')
+        X_actual = actual.fit(X_train).transform(X_train)
+
+        assert X_actual.shape == (3, 3)
+        assert list(X_actual[:, 0]) == [True, False, True]
+        assert list(X_actual[:, 1]) == ['a', 'a', 'a']
+        assert np.allclose(X_actual[:, 2].astype(float), [1., 3., 5.])
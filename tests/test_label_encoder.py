@@ -34,3 +34,11 @@ class TestLabelEncoderComponent(base_test.BaseComponentTest):
 
     def test_configured(self):
         pass
+
+    def test_schema(self):
+        # boolean columns are encoded like categorical columns, numeric strings are converted to numbers
+        X_before = pd.DataFrame({'flag': [True, False, True], 'number': ['1.5', '2', np.nan]})
+        X_after = MultiColumnLabelEncoderComponent().fit_transform(X_before).astype(float)
+
+        X_test = np.array([[1.0, 1.5], [0.0, 2.0], [1.0, np.nan]])
+        assert np.allclose(X_after, X_test, equal_nan=True)
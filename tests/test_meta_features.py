@@ -0,0 +1,279 @@
+import functools
+import os
+import tempfile
+import time
+from unittest import TestCase
+from unittest.mock import patch
+
+import numpy as np
+import scipy.sparse
+from pymfe.statistical import MFEStatistical
+from sklearn import datasets
+
+from dswizard import pynisher
+from dswizard.components.classification import ClassifierChoice
+from dswizard.components.meta_feature_accumulator import MetaFeatureAccumulator
+from dswizard.components.meta_features import MetaFeatureFactory, MetaFeatureCache, LazyMetaFeatures
+
+
+class TestMetaFeatures(TestCase):
+
+    def test_cache(self):
+        X, y = datasets.load_iris(return_X_y=True)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = MetaFeatureCache(tmp_dir)
+            expected, expected_array = MetaFeatureFactory.calculate(X, y, cache=cache)
+            self.assertEqual(len(cache), 1)
+
+            actual, actual_array = MetaFeatureFactory.calculate(X.copy(), y.copy(), cache=cache)
+            self.assertEqual(actual, expected)
+            assert np.array_equal(actual_array, expected_array)
+            self.assertEqual(len(cache), 1)
+
+            MetaFeatureFactory.calculate(X, y, random_state=0, cache=cache)
+            self.assertEqual(len(cache), 2)
+
+    def test_missing_values(self):
+        X, y = datasets.load_iris(return_X_y=True)
+        X = X.astype(object)
+        X[::7, 0] = np.nan
+        # constant column
+        X[:, 1] = 1.
+        X[:, 3] = np.where(X[:, 3].astype(float) > 1, 'a', 'b')
+        X[::5, 3] = np.nan
+
+        X.setflags(write=False)
+        mf, _ = MetaFeatureFactory.calculate(X, y)
+        self.assertEqual(mf['nr_missing_values'], 22 + 30)
+        self.assertEqual(mf['nr_cat'], 1)
+        self.assertEqual(mf['nr_num'], 2)
+        self.assertEqual(mf, MetaFeatureFactory.calculate(X, y)[0])
+
+    def test_read_only(self):
+        X, y = datasets.load_breast_cancer(return_X_y=True)
+        X[::4, 0] = np.nan
+        X.setflags(write=False)
+        expected = X.copy()
+        MetaFeatureFactory._calculate(X, y, groups=[])
+        np.testing.assert_array_equal(X, expected)
+
+    def test_sample_size(self):
+        X, y = datasets.load_breast_cancer(return_X_y=True)
+        X[::4, 0] = np.nan
+        expected, _ = MetaFeatureFactory.calculate(X, y)
+
+        details = {}
+        actual, _ = MetaFeatureFactory.calculate(X, y, sample_size=100, details=details)
+        self.assertEqual(actual.keys(), expected.keys())
+        for key in MetaFeatureFactory.EXACT_FEATURES:
+            self.assertAlmostEqual(actual[key], expected[key])
+        self.assertEqual(set(details['estimated']), set(expected.keys()) - set(MetaFeatureFactory.EXACT_FEATURES))
+
+        MetaFeatureFactory.calculate(X, y, sample_size=X.shape[0], details=details)
+        self.assertEqual(details['estimated'], [])
+
+    def test_parallel(self):
+        X, y = datasets.load_breast_cancer(return_X_y=True)
+        X[::4, 0] = np.nan
+        expected, expected_array = MetaFeatureFactory.calculate(X, y)
+
+        details = {}
+        actual, actual_array = MetaFeatureFactory.calculate(X, y, parallel=True, details=details)
+        self.assertEqual(actual.keys(), expected.keys())
+        # shared copies may use a different memory layout, resulting in minor rounding differences
+        np.testing.assert_allclose(actual_array, expected_array, rtol=1e-12)
+        self.assertEqual(details['failed'], [])
+
+    def test_parallel_group_timeout(self):
+        X, y = datasets.load_iris(return_X_y=True)
+
+        def slow_model_based(*args, **kwargs):
+            time.sleep(5)
+
+        details = {}
+        with patch.object(MetaFeatureFactory, '_model_based', slow_model_based):
+            actual, _ = MetaFeatureFactory.calculate(X, y, parallel=True, group_timeout=0.5, details=details)
+        self.assertEqual(actual['nr_inst'], 150)
+        self.assertEqual(actual['nodes'], 0)
+        self.assertIn('nodes', details['failed'])
+        self.assertNotIn('cor_mean', details['failed'])
+
+        # the groups only get the time remaining after the preparation
+        start = time.monotonic()
+        with patch.object(MetaFeatureFactory, '_model_based', slow_model_based):
+            MetaFeatureFactory.calculate(X, y, parallel=True, timeout=1, group_timeout=10, details=details)
+        self.assertLess(time.monotonic() - start, 4)
+        self.assertIn('nodes', details['failed'])
+
+        # with a single core, the groups run one after another and share the time until the deadline
+        def slow_group(*args, **kwargs):
+            time.sleep(3)
+            return {}
+
+        single_core = functools.partial(pynisher.LimitedExecutor, cores={min(os.sched_getaffinity(0))})
+        start = time.monotonic()
+        with patch.object(MetaFeatureFactory, '_statistical', slow_group), \
+                patch.object(MetaFeatureFactory, '_model_based', slow_group), \
+                patch.object(pynisher, 'LimitedExecutor', single_core):
+            actual, _ = MetaFeatureFactory.calculate(X, y, parallel=True, timeout=4, details=details)
+        self.assertLess(time.monotonic() - start, 5.5)
+        self.assertEqual(actual['nr_inst'], 150)
+        self.assertIn('nodes', details['failed'])
+
+    def test_landmarking_wide(self):
+        # wide data sets are projected before landmarking, so they still fit into the default timeout
+        rs = np.random.RandomState(0)
+        X, y = rs.rand(1500, 1500), rs.randint(0, 2, 1500)
+        mf, _ = MetaFeatureFactory.calculate(X, y)
+        self.assertIsNotNone(mf)
+        self.assertGreater(mf['linear_discr_mean'], 0)
+
+    def test_landmarking(self):
+        X, y = datasets.load_breast_cancer(return_X_y=True)
+
+        details = {}
+        mf, _ = MetaFeatureFactory.calculate(X, y, details=details)
+        for key in ('one_nn_mean', 'best_node_mean', 'linear_discr_mean', 'naive_bayes_mean'):
+            self.assertGreater(mf[key], 0.8)
+        self.assertEqual(details['estimated'], [])
+
+        capped, _ = MetaFeatureFactory.calculate(X, y, landmarking_rows=100, details=details)
+        self.assertEqual(details['estimated'], list(MetaFeatureFactory.LANDMARKING_FEATURES))
+        for key in MetaFeatureFactory.FEATURES:
+            if key not in MetaFeatureFactory.LANDMARKING_FEATURES:
+                self.assertEqual(capped[key], mf[key])
+
+    def test_calculate_selected(self):
+        X, y = datasets.load_wine(return_X_y=True)
+        X = X.astype(object)
+        X[:, 2] = np.where(X[:, 2].astype(float) > 2.3, 'a', 'b')
+        X[::6, 2] = np.nan
+        # constant columns
+        X[:, 4] = 'c'
+        X[1:, 5] = 1.
+        expected, _ = MetaFeatureFactory.calculate(X, y)
+
+        with patch('dswizard.pynisher.enforce_limits', side_effect=AssertionError('process spawned')):
+            actual = MetaFeatureFactory.calculate_selected(X, y, MetaFeatureFactory.EXACT_FEATURES)
+        self.assertEqual(actual, {key: expected[key] for key in MetaFeatureFactory.EXACT_FEATURES})
+
+        actual = MetaFeatureFactory.calculate_selected(X, y, ['nodes', 'nr_cat'])
+        self.assertEqual(actual, {'nr_cat': expected['nr_cat'], 'nodes': expected['nodes']})
+        self.assertRaises(ValueError, MetaFeatureFactory.calculate_selected, X, y, ['foo'])
+
+    def test_lazy_meta_features(self):
+        X, y = datasets.load_iris(return_X_y=True)
+        expected, _ = MetaFeatureFactory.calculate(X, y)
+
+        mf = LazyMetaFeatures(X, y)
+        with patch('dswizard.pynisher.enforce_limits', side_effect=AssertionError('process spawned')):
+            components = ClassifierChoice().get_available_components(mf=mf)
+        self.assertEqual(components.keys(), ClassifierChoice().get_available_components(mf=expected).keys())
+        self.assertEqual(mf['leaves'], expected['leaves'])
+        self.assertEqual(dict(mf), expected)
+
+    def test_sparse(self):
+        X, y = datasets.load_breast_cancer(return_X_y=True)
+        X = X - np.median(X, axis=0)
+        X[np.abs(X) < np.percentile(np.abs(X), 60, axis=0)] = 0
+        X[:, 5] = 0
+        X[::5, 0] = np.nan
+        expected, _ = MetaFeatureFactory.calculate(X, y)
+
+        details = {}
+        actual, _ = MetaFeatureFactory.calculate(scipy.sparse.csr_matrix(X), y, details=details)
+        self.assertEqual(details['failed'], [])
+        for key in MetaFeatureFactory.EXACT_FEATURES:
+            self.assertEqual(actual[key], expected[key])
+        # entropy features use a different discretization, missing values are filled differently
+        for key in ('skewness_mean', 'kurtosis_mean', 'sparsity_mean', 'one_nn_mean', 'naive_bayes_mean'):
+            self.assertAlmostEqual(actual[key], expected[key], delta=0.05 * abs(expected[key]))
+
+        X = X[:, 1:]
+        expected = MetaFeatureFactory._calculate(X, y, groups=['statistical'])
+        actual = MetaFeatureFactory._calculate(scipy.sparse.csc_matrix(X), y, groups=['statistical'])
+        self.assertEqual(actual.keys(), expected.keys())
+        for key in expected:
+            self.assertAlmostEqual(actual[key], expected[key], delta=1e-8 * abs(expected[key]))
+
+        self.assertEqual(MetaFeatureFactory.calculate_selected(scipy.sparse.csc_matrix(X), y, ['nr_num', 'nr_cat']),
+                         {'nr_num': 28, 'nr_cat': 0})
+
+    def test_streaming(self):
+        X, y = datasets.load_breast_cancer(return_X_y=True)
+        expected, _ = MetaFeatureFactory.calculate(X, y)
+        # discretization of numeric attributes is approximated by fine-grained histograms
+        approximated = MetaFeatureFactory.GROUPS['info_theory']
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            np.save(os.path.join(tmp_dir, 'X.npy'), X)
+            np.save(os.path.join(tmp_dir, 'y.npy'), y)
+            details = {}
+            actual, _ = MetaFeatureFactory.calculate_streaming(os.path.join(tmp_dir, 'X.npy'),
+                                                               os.path.join(tmp_dir, 'y.npy'), chunk_size=50,
+                                                               details=details)
+        self.assertEqual(details['estimated'], [])
+        self.assertEqual(actual.keys(), expected.keys())
+        for key in expected:
+            if key in approximated:
+                self.assertAlmostEqual(actual[key], expected[key], delta=max(0.05 * abs(expected[key]), 0.01))
+            else:
+                self.assertAlmostEqual(actual[key], expected[key], delta=1e-8 * abs(expected[key]))
+
+        chunks = ((X[i:i + 100], y[i:i + 100]) for i in range(0, X.shape[0], 100))
+        actual, _ = MetaFeatureFactory.calculate_streaming(chunks, sample_size=200, details=details)
+        self.assertIn('nodes', details['estimated'])
+        for key in MetaFeatureFactory.EXACT_FEATURES + ('skewness_mean', 'kurtosis_mean', 'var_mean', 'cor_mean'):
+            self.assertAlmostEqual(actual[key], expected[key], delta=1e-8 * abs(expected[key]))
+
+    def test_streaming_state(self):
+        X, y = datasets.load_breast_cancer(return_X_y=True)
+        expected, _ = MetaFeatureFactory.calculate_streaming(X, y, chunk_size=300, sample_size=200)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            state = os.path.join(tmp_dir, 'state.pkl')
+            MetaFeatureFactory.calculate_streaming(X[:300], y[:300], chunk_size=300, sample_size=200, state=state)
+            details = {}
+            actual, _ = MetaFeatureFactory.calculate_streaming(X[300:], y[300:], chunk_size=300, state=state,
+                                                               details=details)
+            self.assertEqual(MetaFeatureAccumulator.load(state).n, X.shape[0])
+
+        self.assertIn('nodes', details['estimated'])
+        self.assertEqual(actual.keys(), expected.keys())
+        for key in expected:
+            self.assertAlmostEqual(actual[key], expected[key], delta=1e-10 * abs(expected[key]))
+
+    def test_precision(self):
+        X, y = datasets.load_wine(return_X_y=True)
+        X = X.astype(object)
+        X[:, 2] = np.where(X[:, 2].astype(float) > 2.3, 'a', 'b')
+        expected = MetaFeatureFactory._calculate(X, y)
+        actual = MetaFeatureFactory._calculate(X, y, precision='float32')
+        for key in MetaFeatureFactory.GROUPS['statistical']:
+            self.assertAlmostEqual(actual[key], expected[key], delta=1e-5 * abs(expected[key]))
+        self.assertRaises(ValueError, MetaFeatureFactory.calculate, X, y, precision='float16')
+
+        N = np.random.RandomState(0).rand(100, 20)
+        cor, cov = MetaFeatureFactory._cor_cov_summary(N, max_block_size=30)
+        np.testing.assert_allclose(cor, (MFEStatistical.ft_cor(N).mean(), MFEStatistical.ft_cor(N).std(ddof=1)))
+        np.testing.assert_allclose(cov, (MFEStatistical.ft_cov(N).mean(), MFEStatistical.ft_cov(N).std(ddof=1)))
+
+    def test_cache_eviction(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            mf = {'nr_inst': 150, 'nr_attr': 4}
+            entry_size = len(str(mf).encode())
+            cache = MetaFeatureCache(tmp_dir, max_size_in_mb=2.5 * entry_size / 1024 / 1024)
+
+            cache.put('a', mf)
+            time.sleep(0.01)
+            cache.put('b', mf)
+            time.sleep(0.01)
+            # least recently used is b now
+            self.assertEqual(cache.get('a'), mf)
+            time.sleep(0.01)
+            cache.put('c', mf)
+
+            self.assertIn('a', cache)
+            self.assertNotIn('b', cache)
+            self.assertIn('c', cache)
+            self.assertEqual(len([f for f in os.listdir(tmp_dir) if f.endswith('.tmp')]), 0)
@@ -1,6 +1,7 @@
 import numpy as np
 import pandas as pd
 
+from dswizard.components.base import NoopComponent
 from dswizard.components.feature_preprocessing.one_hot_encoding import OneHotEncoderComponent
 from tests import base_test
 
@@ -43,3 +44,12 @@ class TestOneHotEncoderComponent(base_test.BaseComponentTest):
         X_expected = pd.get_dummies(X_test, **config)
 
         assert np.allclose(X_actual, X_expected)
+
+    def test_schema(self):
+        # neither numeric strings nor boolean columns are one-hot encoded
+        actual = OneHotEncoderComponent()
+        X_before = pd.DataFrame({'number': ['1.5', '2', '3'], 'flag': [True, False, True]})
+        actual.fit(X_before)
+
+        assert isinstance(actual.preprocessor, NoopComponent)
+        assert actual.transform(X_before).shape == (3, 2)
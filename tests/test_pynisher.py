@@ -1,11 +1,19 @@
 #! /bin/python
+import asyncio
+import json
 import logging
 import multiprocessing
 import os
 import signal
+import subprocess
+import sys
+import tempfile
+import threading
 import time
 import unittest
 
+import numpy as np
+import pandas as pd
 import psutil
 
 from dswizard import pynisher
@@ -91,6 +99,81 @@ def return_big_array(num_elements):
     return [1] * num_elements
 
 
+def describe_data(X, y=None):
+    return float(np.asarray(X, dtype=float).sum()), X.flags.writeable if isinstance(X, np.ndarray) else None, \
+           None if y is None else type(y).__name__
+
+
+def return_big_numpy_array(num_elements):
+    return {'array': np.arange(num_elements, dtype=float), 'small': np.ones(10)}
+
+
+def sleep_and_get_affinity(wall_time_in_s):
+    time.sleep(wall_time_in_s)
+    return os.sched_getaffinity(0)
+
+
+def allocate_and_sleep(size_in_mb, wall_time_in_s):
+    A = np.ones(size_in_mb * 1024 * 1024 // 8)
+    time.sleep(wall_time_in_s)
+    return A.size
+
+
+def print_lines(n_lines, wall_time_in_s=0):
+    for i in range(n_lines):
+        print(f'line {i}')
+    # bypasses sys.stdout like output of C extensions
+    os.write(2, b'raw output\n')
+    time.sleep(wall_time_in_s)
+
+
+def get_thread_budget():
+    from threadpoolctl import threadpool_info
+    return [pool['num_threads'] for pool in threadpool_info()], os.environ.get('OMP_NUM_THREADS')
+
+
+def count_anytime(wall_time_in_s):
+    state = {'count': 0}
+    pynisher.register_partial_result(lambda: state['count'])
+    end = time.monotonic() + wall_time_in_s
+    while time.monotonic() < end:
+        state['count'] += 1
+    return -1
+
+
+def ignore_timeout(path):
+    # only terminate via SIGTERM, cleaning up takes a moment
+    def handler(signum, frame):
+        time.sleep(0.5)
+        with open(path, 'w') as f:
+            f.write('terminated')
+        os._exit(0)
+
+    signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGALRM})
+    signal.signal(signal.SIGTERM, handler)
+    time.sleep(10)
+
+
+def return_and_linger(duration):
+    # the non-daemon thread delays the exit of the process after the result has been sent
+    threading.Thread(target=time.sleep, args=(duration,)).start()
+    return duration
+
+
+def share_transferred(n):
+    shared = pynisher.share(np.arange(n))
+    return shared.transfer()
+
+
+def store_result_and_hang(path):
+    # simulates being killed after storing the result but before the parent received it
+    from dswizard.pynisher.shared_data import dump_result, result_path
+    dump_result(np.ones(1024 * 1024))
+    with open(path, 'w') as fh:
+        fh.write(result_path())
+    time.sleep(10)
+
+
 def cpu_usage():
     i = 1
     while True:
@@ -284,5 +367,424 @@ class test_limit_resources_module(unittest.TestCase):
         self.assertTrue('0' in wrapped_function.stdout)
         self.assertTrue('RuntimeError' in wrapped_function.stderr)
 
+    @unittest.skipIf(not all_tests, "skipping worker pool test")
+    def test_pool(self):
+        print("Testing persistent worker pool.")
+        with pynisher.WorkerPool(n_workers=2, preload=['numpy']) as pool:
+            pids = set(pool.pids)
+            wrapped_function = pynisher.enforce_limits(wall_time_in_s=2, grace_period_in_s=1, pool=pool)(simulate_work)
+
+            for mem in [1, 2, 4, 8]:
+                self.assertEqual((mem, 0, 0), wrapped_function(mem, 0, 0))
+                self.assertEqual(wrapped_function.exit_status, 0)
+                self.assertIsNotNone(wrapped_function.wall_clock_time)
+            # workers are reused for successful calls
+            self.assertEqual(pids, set(pool.pids))
+
+            self.assertIsNone(wrapped_function(1, 5, 0))
+            self.assertEqual(wrapped_function.exit_status, pynisher.TimeoutException)
+            # worker exceeding a limit is recycled
+            self.assertEqual(len(pool.pids), 2)
+            self.assertNotEqual(pids, set(pool.pids))
+
+            wrapped_function = pynisher.enforce_limits(cpu_time_in_s=1, grace_period_in_s=1, pool=pool)(cpu_usage)
+            self.assertIsNone(wrapped_function())
+            self.assertEqual(wrapped_function.exit_status, pynisher.CpuTimeoutException)
+
+            wrapped_function = pynisher.enforce_limits(wall_time_in_s=5, pool=pool)(return_big_array)
+            self.assertEqual(len(wrapped_function(65536)), 65536)
+
+        # RLIMIT_AS covers the address space already mapped by the worker, so the limit is relative to a fresh worker
+        with pynisher.WorkerPool(n_workers=1) as pool:
+            mem_in_mb = psutil.Process(pool.pids[0]).memory_info().vms / 1024 / 1024 + 256
+            wrapped_function = pynisher.enforce_limits(mem_in_mb=mem_in_mb, pool=pool)(simulate_work)
+            # simulate_work allocates about 1 GiB
+            self.assertIsNone(wrapped_function(1024 * 1024, 0, 0))
+            self.assertEqual(wrapped_function.exit_status, pynisher.MemorylimitException)
+
+        p = psutil.Process()
+        self.assertEqual(len(p.children(recursive=True)), 0)
+
+    @unittest.skipIf(not all_tests, "skipping start up time out test")
+    def test_time_out_during_start_up(self):
+        print("Testing time out before the sandboxed process is ready.")
+        # spawned processes need longer than the time limit to start. A new session prevents killing the test runner
+        code = '\n'.join([
+            'import time',
+            'from dswizard import pynisher',
+            "wrapped_function = pynisher.enforce_limits(wall_time_in_s=0.2, start_method='spawn')(time.sleep)",
+            'wrapped_function(5)',
+            'assert wrapped_function.exit_status is pynisher.TimeoutException, wrapped_function.exit_status'
+        ])
+        process = subprocess.run([sys.executable, '-c', code], start_new_session=True, timeout=60)
+        self.assertEqual(process.returncode, 0)
+
+    @unittest.skipIf(not all_tests, "skipping pool shut down test")
+    def test_pool_shutdown_during_call(self):
+        print("Testing shutting down a busy pool.")
+        pool = pynisher.WorkerPool(n_workers=1)
+        wrapped_function = pynisher.enforce_limits(wall_time_in_s=5, pool=pool)(simulate_work)
+        thread = threading.Thread(target=wrapped_function, args=(1, 3, 0))
+        thread.start()
+        time.sleep(0.5)
+        pool.shutdown()
+        thread.join()
+
+        # the killed worker is not replaced and no placeholder is handed out
+        self.assertNotEqual(wrapped_function.exit_status, 0)
+        self.assertEqual(pool.pids, [])
+        self.assertTrue(pool._idle.empty())
+
+    @unittest.skipIf(not all_tests, "skipping pool start up test")
+    def test_pool_kill_during_start_up(self):
+        print("Testing killing workers that are still starting.")
+        # workers are killed while importing a slow module. A new session prevents killing the test runner on failure
+        code = '\n'.join([
+            'import os, sys, tempfile',
+            'from dswizard import pynisher',
+            'directory = tempfile.mkdtemp()',
+            "with open(os.path.join(directory, 'slow_module.py'), 'w') as fh:",
+            "    fh.write('import time\\ntime.sleep(2)\\n')",
+            'sys.path.insert(0, directory)',
+            "for start_method in (None, 'spawn'):",
+            "    pynisher.WorkerPool(n_workers=2, preload=['slow_module'], start_method=start_method).shutdown()"
+        ])
+        process = subprocess.run([sys.executable, '-c', code], start_new_session=True, timeout=60)
+        self.assertEqual(process.returncode, 0)
+
+    @unittest.skipIf(not all_tests, "skipping shared memory test")
+    def test_shared_args(self):
+        print("Testing shared memory arguments.")
+        X = np.random.rand(1000, 20)
+        df = pd.DataFrame({'a': np.arange(10), 'b': np.ones(10), 'c': ['x'] * 10})
+
+        with pynisher.share(X) as shared_X, pynisher.share(df['a']) as shared_y:
+            wrapped_function = pynisher.enforce_limits(wall_time_in_s=5)(describe_data)
+            for i in range(2):
+                self.assertEqual((X.sum(), False, 'Series'), wrapped_function(shared_X, y=shared_y))
+                self.assertEqual(wrapped_function.exit_status, 0)
+
+            with pynisher.WorkerPool(n_workers=1) as pool:
+                wrapped_function = pynisher.enforce_limits(wall_time_in_s=5, pool=pool)(describe_data)
+                self.assertEqual((X.sum(), False, 'Series'), wrapped_function(shared_X, y=shared_y))
+
+            path = shared_X.path
+            self.assertTrue(os.path.exists(path))
+        self.assertFalse(os.path.exists(path))
+
+        shared_df = pynisher.share(df)
+        pd.testing.assert_frame_equal(df, shared_df.view())
+        shared_df.release()
+
+        wrapped_function = pynisher.enforce_limits(wall_time_in_s=5, share_args=True)(describe_data)
+        self.assertEqual((X.sum(), False, 'ndarray'), wrapped_function(X, X[:, 0]))
+
+        # memory shared by the sandboxed process is owned by the caller after transferring it
+        with pynisher.enforce_limits(wall_time_in_s=5)(share_transferred)(10) as shared:
+            np.testing.assert_array_equal(shared.view(), np.arange(10))
+            path = shared.path
+        self.assertFalse(os.path.exists(path))
+
+    @unittest.skipIf(not all_tests, "skipping result clean up test")
+    def test_result_clean_up(self):
+        print("Testing clean up of results that were not received.")
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'result_path')
+            wrapped_function = pynisher.enforce_limits(wall_time_in_s=1)(store_result_and_hang)
+            self.assertIsNone(wrapped_function(path))
+            self.assertEqual(wrapped_function.exit_status, pynisher.TimeoutException)
+            with open(path) as fh:
+                self.assertFalse(os.path.exists(fh.read()))
+
+    @unittest.skipIf(not all_tests, "skipping out-of-band return test")
+    def test_big_numpy_return_data(self):
+        print("Testing big numpy return values")
+        wrapped_function = pynisher.enforce_limits(wall_time_in_s=10)(return_big_numpy_array)
+
+        for num_elements in [16, 65536, 1048576, 16777216]:
+            res = wrapped_function(num_elements)
+            self.assertEqual(wrapped_function.exit_status, 0)
+            np.testing.assert_array_equal(res['array'], np.arange(num_elements, dtype=float))
+            np.testing.assert_array_equal(res['small'], np.ones(10))
+            # result is writeable as before
+            res['array'][0] = 42
+
+    @unittest.skipIf(not all_tests, "skipping executor test")
+    def test_executor(self):
+        print("Testing concurrent execution.")
+        cores = set(sorted(os.sched_getaffinity(0))[:2])
+        limits = {'wall_time_in_s': 2}
+
+        with pynisher.LimitedExecutor(cores=cores) as executor:
+            start = time.time()
+            results = list(executor.map(sleep_and_get_affinity, [(0.5,), (0.5,), (0.5,), (0.5,), (5,)], limits=limits))
+            duration = time.time() - start
+
+        self.assertEqual(len(results), 5)
+        # runs up to two jobs at a time
+        self.assertTrue(duration < 2 / len(cores) + limits['wall_time_in_s'] + 0.5)
+        for res in results:
+            if res.job.args[0] > limits['wall_time_in_s']:
+                self.assertEqual(res.exit_status, pynisher.TimeoutException)
+                self.assertIsNone(res.result)
+            else:
+                self.assertEqual(res.exit_status, 0)
+                self.assertEqual(res.result, res.affinity)
+                self.assertEqual(len(res.affinity), 1)
+                self.assertTrue(res.affinity.issubset(cores))
+
+        with pynisher.LimitedExecutor(cores=cores) as executor:
+            self.assertRaises(ValueError, executor.submit, sleep_and_get_affinity, 0, limits=limits,
+                              n_cores=len(cores) + 1)
+            job = executor.submit(sleep_and_get_affinity, 0, limits=limits, n_cores=len(cores))
+            res = next(executor.as_completed())
+            self.assertEqual(res.job, job)
+            self.assertEqual(res.result, cores)
+
+        # queued jobs only get the time remaining until the deadline
+        with pynisher.LimitedExecutor(cores={min(cores)}) as executor:
+            start = time.time()
+            deadline = time.monotonic() + 1.5
+            for _ in range(3):
+                executor.submit(sleep_and_get_affinity, 1, limits=limits, deadline=deadline)
+            results = sorted(executor.as_completed(), key=lambda res: res.job.id)
+            duration = time.time() - start
+
+        self.assertEqual([res.exit_status for res in results],
+                         [0, pynisher.TimeoutException, pynisher.TimeoutException])
+        self.assertTrue(duration < 1.5 + 1)
+
+    @unittest.skipIf(not all_tests, "skipping asyncio test")
+    def test_async(self):
+        print("Testing asyncio interface.")
+
+        async def run():
+            wrappers = [pynisher.enforce_limits(wall_time_in_s=2, grace_period_in_s=1)(sleep_and_get_affinity)
+                        for _ in range(5)]
+            sleep = [0.5, 0.5, 0.5, 0.5, 5]
+            return wrappers, await asyncio.gather(*[w.call_async(t) for w, t in zip(wrappers, sleep)])
+
+        start = time.time()
+        wrappers, results = asyncio.run(run())
+        duration = time.time() - start
+
+        # all calls are executed concurrently
+        self.assertTrue(duration < 3)
+        for wrapper, res in zip(wrappers[:-1], results[:-1]):
+            self.assertEqual(wrapper.exit_status, 0)
+            self.assertEqual(res, os.sched_getaffinity(0))
+        self.assertIsNone(results[-1])
+        self.assertEqual(wrappers[-1].exit_status, pynisher.TimeoutException)
+
+        p = psutil.Process()
+        self.assertEqual(len(p.children(recursive=True)), 0)
+
+        # waiting for the process to exit does not block the event loop
+        async def heartbeat(task):
+            gaps, last = [], time.monotonic()
+            while not task.done():
+                await asyncio.sleep(0.05)
+                gaps.append(time.monotonic() - last)
+                last = time.monotonic()
+            return max(gaps)
+
+        async def run_lingering():
+            wrapper = pynisher.enforce_limits(wall_time_in_s=5, grace_period_in_s=1)(return_and_linger)
+            task = asyncio.ensure_future(wrapper.call_async(0.8))
+            max_gap = await heartbeat(task)
+            return task.result(), max_gap
+
+        result, max_gap = asyncio.run(run_lingering())
+        self.assertEqual(result, 0.8)
+        self.assertTrue(max_gap < 0.5)
+
+    @unittest.skipIf(not all_tests, "skipping rss memory test")
+    def test_rss_memory(self):
+        print("Testing resident memory constraint.")
+        for mode in ['rss', 'pss']:
+            wrapped_function = pynisher.enforce_limits(mem_in_mb=512, wall_time_in_s=5, mem_mode=mode,
+                                                        mem_interval_in_s=0.05)(allocate_and_sleep)
+            self.assertEqual(wrapped_function(8, 0.5), 8 * 1024 * 1024 // 8)
+            self.assertEqual(wrapped_function.exit_status, 0)
+            self.assertTrue(8 < wrapped_function.peak_memory_in_mb < 512)
+
+            self.assertIsNone(wrapped_function(1024, 0.5))
+            self.assertEqual(wrapped_function.exit_status, pynisher.MemorylimitException)
+
+        with pynisher.WorkerPool(n_workers=1) as pool:
+            wrapped_function = pynisher.enforce_limits(mem_in_mb=512, wall_time_in_s=5, mem_mode='rss',
+                                                        mem_interval_in_s=0.05, pool=pool)(allocate_and_sleep)
+            self.assertEqual(wrapped_function(8, 0.5), 8 * 1024 * 1024 // 8)
+            self.assertTrue(8 < wrapped_function.peak_memory_in_mb < 512)
+            self.assertIsNone(wrapped_function(1024, 0.5))
+            self.assertEqual(wrapped_function.exit_status, pynisher.MemorylimitException)
+
+        self.assertRaises(ValueError, pynisher.enforce_limits, mem_mode='foo')
+
+    @unittest.skipIf(not all_tests, "skipping telemetry test")
+    def test_telemetry(self):
+        print("Testing telemetry.")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            sink = os.path.join(tmp_dir, 'telemetry.jsonl')
+            wrapped_function = pynisher.enforce_limits(wall_time_in_s=1, telemetry_sink=sink)(cpu_usage)
+            wrapped_function()
+            telemetry = wrapped_function.telemetry
+            self.assertEqual(telemetry.exit_status, 'TimeoutException')
+            self.assertEqual(telemetry.termination_reason, 'wall_time')
+            self.assertTrue(telemetry.wall_clock_time_in_s >= 1)
+
+            wrapped_function = pynisher.enforce_limits(wall_time_in_s=5, telemetry_sink=sink)(return_big_numpy_array)
+            wrapped_function(1048576)
+            telemetry = wrapped_function.telemetry
+            self.assertEqual(telemetry.termination_reason, 'success')
+            self.assertFalse(telemetry.killed)
+            self.assertTrue(telemetry.startup_latency_in_s < telemetry.wall_clock_time_in_s)
+            self.assertIsNotNone(telemetry.user_time_in_s)
+            self.assertTrue(telemetry.peak_rss_in_mb > 8)
+            self.assertIsNotNone(telemetry.serialization_time_in_s)
+            self.assertIsNotNone(telemetry.deserialization_time_in_s)
+            self.assertIsNotNone(telemetry.overhead_in_s)
+
+            with pynisher.WorkerPool(n_workers=1) as pool:
+                wrapped_function = pynisher.enforce_limits(wall_time_in_s=5, telemetry_sink=sink,
+                                                            pool=pool)(crash_unexpectedly)
+                wrapped_function(signal.SIGKILL)
+                self.assertEqual(wrapped_function.telemetry.termination_reason, 'crash')
+                self.assertTrue(wrapped_function.telemetry.killed)
+
+            with open(sink) as fh:
+                records = [json.loads(line) for line in fh]
+            self.assertEqual([r['termination_reason'] for r in records], ['wall_time', 'success', 'crash'])
+
+    @unittest.skipIf(not all_tests, "skipping fractional time out test")
+    def test_fractional_time_out(self):
+        print("Testing fractional wall clock time constraint.")
+        wrapped_function = pynisher.enforce_limits(wall_time_in_s=0.3)(sleep_and_get_affinity)
+
+        self.assertIsNone(wrapped_function(2))
+        self.assertEqual(wrapped_function.exit_status, pynisher.TimeoutException)
+        self.assertTrue(wrapped_function.wall_clock_time < 1)
+
+        self.assertIsNotNone(wrapped_function(0.01))
+        self.assertEqual(wrapped_function.exit_status, 0)
+
+        with pynisher.WorkerPool(n_workers=1) as pool:
+            wrapped_function = pynisher.enforce_limits(wall_time_in_s=0.3, pool=pool)(sleep_and_get_affinity)
+            self.assertIsNone(wrapped_function(2))
+            self.assertEqual(wrapped_function.exit_status, pynisher.TimeoutException)
+            self.assertTrue(wrapped_function.wall_clock_time < 1)
+
+    @unittest.skipIf(not all_tests, "skipping start method test")
+    def test_start_method(self):
+        print("Testing start methods.")
+        for start_method in ['fork', 'spawn', 'forkserver']:
+            wrapped_function = pynisher.enforce_limits(wall_time_in_s=20, start_method=start_method,
+                                                        preload=['numpy'])(sleep_and_get_affinity)
+            self.assertEqual(wrapped_function(0), os.sched_getaffinity(0))
+            self.assertEqual(wrapped_function.exit_status, 0)
+
+            wrapped_function = pynisher.enforce_limits(wall_time_in_s=20, start_method=start_method,
+                                                        share_args=True)(describe_data)
+            X = np.random.rand(100, 10)
+            self.assertEqual(wrapped_function(X), (X.sum(), False, None))
+
+        with pynisher.WorkerPool(n_workers=1, start_method='spawn') as pool:
+            wrapped_function = pynisher.enforce_limits(wall_time_in_s=20, pool=pool)(sleep_and_get_affinity)
+            self.assertEqual(wrapped_function(0), os.sched_getaffinity(0))
+
+        # ignore helper processes like the fork server or the resource tracker
+        p = psutil.Process()
+        self.assertEqual(len([c for c in p.children() if 'from multiprocessing' not in ' '.join(c.cmdline())]), 0)
+
+    @unittest.skipIf(not all_tests, "skipping streaming output test")
+    def test_streaming_output(self):
+        print("Testing streaming of output.")
+        lines = []
+        wrapped_function = pynisher.enforce_limits(wall_time_in_s=1, grace_period_in_s=1,
+                                                    output_callback=lambda stream, line: lines.append((stream, line)))(
+            print_lines)
+        wrapped_function(3, 5)
+
+        self.assertEqual(wrapped_function.exit_status, pynisher.TimeoutException)
+        self.assertEqual(wrapped_function.stdout, 'line 0\nline 1\nline 2\n')
+        self.assertEqual(wrapped_function.stderr, 'raw output\n')
+        self.assertEqual([line for stream, line in lines if stream == 'stdout'], ['line 0', 'line 1', 'line 2'])
+        self.assertEqual([line for stream, line in lines if stream == 'stderr'], ['raw output'])
+
+        # only the tail of the output is retained
+        wrapped_function = pynisher.enforce_limits(wall_time_in_s=10, capture_output=True, max_output_in_kb=1)(
+            print_lines)
+        wrapped_function(10000)
+
+        self.assertEqual(wrapped_function.exit_status, 0)
+        self.assertEqual(len(wrapped_function.stdout), 1024)
+        self.assertTrue(wrapped_function.stdout.endswith('line 9999\n'))
+
+    @unittest.skipIf(not all_tests, "skipping thread budget test")
+    def test_thread_budget(self):
+        print("Testing thread budget.")
+        env = os.environ.get('OMP_NUM_THREADS')
+
+        wrapped_function = pynisher.enforce_limits(wall_time_in_s=10, n_threads=1)(get_thread_budget)
+        num_threads, omp_num_threads = wrapped_function()
+        self.assertTrue(all(n == 1 for n in num_threads))
+        self.assertEqual(omp_num_threads, '1')
+
+        # budget is derived from the affinity
+        affinity = set(sorted(os.sched_getaffinity(0))[:1])
+        with pynisher.WorkerPool(n_workers=1) as pool:
+            wrapped_function = pynisher.enforce_limits(wall_time_in_s=10, affinity=affinity, pool=pool)(
+                get_thread_budget)
+            num_threads, omp_num_threads = wrapped_function()
+            self.assertTrue(all(n == 1 for n in num_threads))
+            self.assertEqual(omp_num_threads, '1')
+
+            # limits are restored for the next call
+            wrapped_function = pynisher.enforce_limits(wall_time_in_s=10, pool=pool)(get_thread_budget)
+            self.assertEqual(wrapped_function()[1], env)
+
+    @unittest.skipIf(not all_tests, "skipping partial result test")
+    def test_partial_result(self):
+        print("Testing partial results.")
+        wrapped_function = pynisher.enforce_limits(wall_time_in_s=0.5, grace_period_in_s=1)(count_anytime)
+        self.assertTrue(wrapped_function(5) > 0)
+        self.assertEqual(wrapped_function.exit_status, pynisher.TimeoutException)
+        self.assertTrue(wrapped_function.partial)
+        self.assertTrue(wrapped_function.telemetry.partial)
+        self.assertTrue(wrapped_function.wall_clock_time < 1.5)
+
+        self.assertEqual(wrapped_function(0), -1)
+        self.assertEqual(wrapped_function.exit_status, 0)
+        self.assertFalse(wrapped_function.partial)
+
+        wrapped_function = pynisher.enforce_limits(cpu_time_in_s=1, grace_period_in_s=1)(count_anytime)
+        self.assertTrue(wrapped_function(5) > 0)
+        self.assertEqual(wrapped_function.exit_status, pynisher.CpuTimeoutException)
+        self.assertTrue(wrapped_function.partial)
+
+        with pynisher.WorkerPool(n_workers=1) as pool:
+            wrapped_function = pynisher.enforce_limits(wall_time_in_s=0.5, grace_period_in_s=1, pool=pool)(
+                count_anytime)
+            self.assertTrue(wrapped_function(5) > 0)
+            self.assertTrue(wrapped_function.partial)
+
+            # functions without partial results are not affected by previous calls
+            wrapped_function = pynisher.enforce_limits(wall_time_in_s=0.5, grace_period_in_s=1, pool=pool)(
+                sleep_and_get_affinity)
+            self.assertIsNone(wrapped_function(5))
+            self.assertFalse(wrapped_function.partial)
+
+    @unittest.skipIf(not all_tests, "skipping grace period test")
+    def test_grace_period(self):
+        print("Testing grace period after SIGTERM.")
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'terminated')
+            wrapped_function = pynisher.enforce_limits(wall_time_in_s=0.5, grace_period_in_s=2)(ignore_timeout)
+            self.assertIsNone(wrapped_function(path))
+            self.assertEqual(wrapped_function.exit_status, pynisher.TimeoutException)
+            self.assertTrue(os.path.exists(path))
+            self.assertTrue(wrapped_function.wall_clock_time < 0.5 + 2 + 0.1)
+
 
-unittest.main()
+if __name__ == '__main__':
+    unittest.main()
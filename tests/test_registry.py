@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+from unittest import TestCase
+
+from dswizard.components.base import PredictionAlgorithm, PreprocessingAlgorithm
+from dswizard.components.registry import load_components, resolve_components, component_modules, LazyComponent, \
+    _find_class
+
+
+class TestRegistry(TestCase):
+
+    def test_manifest(self):
+        import dswizard.components.feature_preprocessing as package
+        directory = os.path.dirname(package.__file__)
+        components = load_components(package.__name__, directory, PreprocessingAlgorithm)
+
+        self.assertGreater(len(components), 0)
+        for name, component in components.items():
+            self.assertIsInstance(component, LazyComponent)
+            clazz = _find_class(package.__name__, name, PreprocessingAlgorithm)
+            self.assertIs(component.load(), clazz)
+            self.assertEqual(component.get_properties(), clazz.get_properties())
+            self.assertEqual(component.name(), clazz.name())
+            self.assertFalse(hasattr(component, 'get_components'))
+            self.assertEqual(component.__name__, clazz.__name__)
+            self.assertEqual(component.__module__, clazz.__module__)
+
+    def test_resolve(self):
+        from dswizard.components.classification import ClassifierChoice
+
+        components = ClassifierChoice().get_components()
+        self.assertGreater(len(components), 0)
+        for clazz in components.values():
+            self.assertTrue(issubclass(clazz, PredictionAlgorithm))
+        for clazz in ClassifierChoice().get_available_components().values():
+            self.assertTrue(issubclass(clazz, PredictionAlgorithm))
+        self.assertEqual(resolve_components({'a': int}), {'a': int})
+
+    def test_component_modules(self):
+        modules = component_modules('dswizard.components.feature_preprocessing')
+        self.assertIn('dswizard.components.feature_preprocessing.pca', modules)
+
+    def test_lazy_import(self):
+        code = '\n'.join([
+            'import sys',
+            'from dswizard.components.data_preprocessing import DataPreprocessorChoice',
+            "mf = {'nr_cat': 0, 'nr_num': 3, 'nr_missing_values': 0}",
+            "components = DataPreprocessorChoice().get_available_components(mf=mf, include=['minmax'])",
+            "loaded = [m for m in sys.modules if m.startswith('dswizard.components.data_preprocessing.')]",
+            "assert loaded == ['dswizard.components.data_preprocessing.minmax'], loaded",
+            'from dswizard.components.base import PreprocessingAlgorithm',
+            "assert issubclass(components['minmax'], PreprocessingAlgorithm)",
+            "assert 'dswizard.components.classification' not in sys.modules"
+        ])
+        subprocess.run([sys.executable, '-c', code], check=True)
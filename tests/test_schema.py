@@ -0,0 +1,59 @@
+from unittest import TestCase
+
+import numpy as np
+import pandas as pd
+
+from dswizard.components.data_preprocessing.imputation import ImputationComponent
+from dswizard.components.schema import infer_schema, NUMERIC, CATEGORICAL, BOOLEAN, MISSING
+
+
+class TestSchema(TestCase):
+
+    def test_infer_schema(self):
+        X = np.array([[1.5, '1', 'a', True, np.nan, 1],
+                      [np.nan, '2.5', 'b', False, np.nan, 'x'],
+                      [3., np.nan, np.nan, True, np.nan, 2]], dtype=object)
+        schema = infer_schema(X)
+        self.assertEqual(list(schema.types), [NUMERIC, NUMERIC, CATEGORICAL, BOOLEAN, MISSING, CATEGORICAL])
+        self.assertIs(infer_schema(X), schema)
+
+        df = schema.apply(X)
+        self.assertEqual([str(t) for t in df.dtypes[:2]], ['float64', 'float64'])
+        self.assertEqual(df.iloc[1, 1], 2.5)
+        self.assertTrue(df[4].isna().all())
+
+        df = pd.DataFrame({'num': [1, 2, 3], 'cat': pd.Categorical(['a', 'b', 'a']), 'bool': [True, False, True]})
+        self.assertEqual(list(infer_schema(df).types), [NUMERIC, CATEGORICAL, BOOLEAN])
+
+        numeric = np.array([[1., np.nan], [2., np.nan]])
+        self.assertEqual(list(infer_schema(numeric).types), [NUMERIC, MISSING])
+
+    def test_copy(self):
+        X = np.array([[1., np.nan], [2., 3.]])
+        X.setflags(write=False)
+        df = infer_schema(X).apply(X, copy=True)
+        df.iloc[1, 1] = 0.
+        self.assertEqual(X[1, 1], 3.)
+
+        # without copy, only converted columns are new arrays
+        self.assertTrue(np.shares_memory(infer_schema(X).apply(X)[0].to_numpy(), X))
+        df = pd.DataFrame({'a': ['1', '2'], 'b': [1., 2.]})
+        converted = infer_schema(df).apply(df)
+        self.assertEqual(str(converted['a'].dtype), 'int64')
+        self.assertEqual(df['a'].tolist(), ['1', '2'])
+        self.assertTrue(np.shares_memory(converted['b'].to_numpy(), df['b'].to_numpy()))
+
+        converted = infer_schema(df).apply(df, copy=True)
+        converted.iloc[0, 1] = 0.
+        self.assertEqual(df.iloc[0, 1], 1.)
+
+        X = np.array([[1.], [2.]])
+        self.assertIs(infer_schema(X), infer_schema(X))
+        self.assertIsNot(infer_schema(X, cache=False), infer_schema(X))
+
+    def test_imputation(self):
+        X = np.array([[1., 'a'], [np.nan, 'a'], ['5', np.nan], [2., 'b']], dtype=object)
+        X_new = ImputationComponent(strategy='mean').fit(X).transform(X)
+        self.assertEqual(X_new.shape, (4, 2))
+        self.assertEqual(list(X_new[:, 0]), ['a', 'a', 'a', 'b'])
+        np.testing.assert_allclose(X_new[:, 1].astype(float), [1., 8 / 3, 5., 2.])